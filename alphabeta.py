@@ -0,0 +1,417 @@
+"""内置的轻量 alpha-beta 引擎：纯 Python 实现，不启动子进程，走法生成使用 python-chess。
+
+迭代加深的 negamax alpha-beta 搜索，叶子节点做只吃子的静态搜索（quiescence）；置换表以 Polyglot 的 Zobrist 键索引
+（走子时增量更新），大小固定，按深度优先、旧搜索的条目可被覆盖的策略替换；走法排序依次为置换表走法、
+MVV-LVA 排序的吃子、升变和杀手走法（killer moves）；局面评估为子力加棋子位置表（PST），王的位置表按剩余子力在中局和残局之间插值。
+
+搜索只在节点数（以及可选的 movetime）用完时停止。只限制节点数时，同样的对局总是得到同样的走法，与机器快慢无关，
+适合在不能附带引擎二进制文件的环境中作为可复现的陪练对手；用 python alphabeta.py --bench 测量本机的每秒节点数，
+再按希望的每步用时选择节点数。
+"""
+import argparse
+import time
+
+import chess
+import chess.polyglot
+
+# 每步默认的节点数上限和最大深度
+DEFAULT_NODES = 20000
+MAX_DEPTH = 64
+
+# 置换表默认的条目数（2 的幂）
+DEFAULT_TT_SIZE = 1 << 16
+
+MATE_VALUE = 100000
+MAX_PLY = 128
+INFINITY = MATE_VALUE + 1
+
+# 置换表条目中分数的类型
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# 子力价值（厘兵），按 chess.PAWN ... chess.KING 索引
+PIECE_VALUES = [0, 100, 320, 330, 500, 900, 0]
+
+# 棋子位置表（Simplified Evaluation Function），白方视角，第一行为第 8 横线
+PST_ROWS = {
+    chess.PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    chess.KNIGHT: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    chess.BISHOP: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    chess.ROOK: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    chess.QUEEN: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    chess.KING: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+KING_ENDGAME_ROWS = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+# 各子力对局面阶段的权重，满值 24 为开局，0 为只剩王和兵的残局
+PHASE_WEIGHTS = [0, 0, 1, 1, 2, 4, 0]
+MAX_PHASE = 24
+
+
+def square_table(rows, color):
+    """把白方视角、第 8 横线在前的表转换为按 chess 格子编号索引的表"""
+    return [rows[square ^ 56] if color == chess.WHITE else rows[square] for square in range(64)]
+
+
+# PST[颜色][棋子类型][格子]：子力价值加位置分；王的中局分在 PST 中，残局分在 KING_ENDGAME 中
+PST = {
+    color: [None] + [[PIECE_VALUES[piece_type] + value for value in square_table(PST_ROWS[piece_type], color)]
+                     for piece_type in chess.PIECE_TYPES]
+    for color in chess.COLORS
+}
+KING_ENDGAME = {color: square_table(KING_ENDGAME_ROWS, color) for color in chess.COLORS}
+
+ZOBRIST = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+ZOBRIST_HASHER = chess.polyglot.ZobristHasher(ZOBRIST)
+
+
+def evaluate(board):
+    """静态评估（厘兵），从轮到走子的一方看"""
+    score = 0
+    phase = 0
+    for color in chess.COLORS:
+        sign = 1 if color == chess.WHITE else -1
+        pst = PST[color]
+        occupied = board.occupied_co[color]
+        for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN):
+            table = pst[piece_type]
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color) & occupied):
+                score += sign * table[square]
+                phase += PHASE_WEIGHTS[piece_type]
+    phase = min(phase, MAX_PHASE)
+    for color in chess.COLORS:
+        king = board.king(color)
+        if king is not None:
+            sign = 1 if color == chess.WHITE else -1
+            score += sign * (PST[color][chess.KING][king] * phase + KING_ENDGAME[color][king] * (MAX_PHASE - phase)) \
+                // MAX_PHASE
+    return score if board.turn == chess.WHITE else -score
+
+
+def piece_key(board, square):
+    """square 上棋子的 Zobrist 键，空格为 0"""
+    piece_type = board.piece_type_at(square)
+    if not piece_type:
+        return 0
+    color = bool(board.occupied_co[chess.WHITE] & chess.BB_SQUARES[square])
+    return ZOBRIST[64 * ((piece_type - 1) * 2 + color) + square]
+
+
+def push_with_key(board, key, move):
+    """走子并增量更新 Zobrist 键，结果与 chess.polyglot.zobrist_hash 相同；只用于标准国际象棋"""
+    squares = [move.from_square, move.to_square]
+    if board.is_en_passant(move):
+        squares.append(chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square)))
+    elif board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        if chess.square_file(move.to_square) > chess.square_file(move.from_square):
+            squares += [chess.square(7, rank), chess.square(5, rank)]
+        else:
+            squares += [chess.square(0, rank), chess.square(3, rank)]
+    for square in squares:
+        key ^= piece_key(board, square)
+    key ^= ZOBRIST_HASHER.hash_castling(board) ^ ZOBRIST_HASHER.hash_ep_square(board)
+    board.push(move)
+    for square in squares:
+        key ^= piece_key(board, square)
+    return key ^ ZOBRIST_HASHER.hash_castling(board) ^ ZOBRIST_HASHER.hash_ep_square(board) ^ ZOBRIST[780]
+
+
+class SearchAborted(Exception):
+    """节点数或时间用完"""
+
+
+class Searcher:
+    """alpha-beta 搜索器：置换表和杀手走法在同一盘棋的多次搜索之间保留"""
+
+    def __init__(self, tt_size=DEFAULT_TT_SIZE):
+        if tt_size & (tt_size - 1):
+            raise ValueError(f"置换表大小应为 2 的幂：{tt_size}")
+        self.table = [None] * tt_size  # 条目：(键, 深度, 分数, 分数类型, 走法, 代数)
+        self.mask = tt_size - 1
+        self.generation = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.nodes = 0
+
+    def clear(self):
+        """新的一盘棋：清空置换表和杀手走法"""
+        self.table = [None] * len(self.table)
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+
+    def search(self, position, nodes=DEFAULT_NODES, depth=MAX_DEPTH, movetime=None):
+        """在 position 上迭代加深搜索，返回 {"move", "score", "depth", "nodes", "seconds", "nps"}。
+
+        nodes 为节点数上限，depth 为最大深度，movetime 为可选的用时上限（毫秒，设置后结果不再可复现）；
+        没有合法走法时 move 为 None。score 为轮到走子一方的厘兵分数。
+        """
+        board = position.copy()
+        start = time.perf_counter()
+        self.generation += 1
+        self.nodes = 0
+        self.max_nodes = nodes or DEFAULT_NODES
+        self.deadline = start + movetime / 1000 if movetime else None
+        key = chess.polyglot.zobrist_hash(board)
+        self.path = self.history_keys(board)
+
+        best_score, completed = 0, 0
+        legal_moves = list(board.legal_moves)
+        best_move = legal_moves[0] if legal_moves else None
+        if len(legal_moves) > 1:
+            for iteration in range(1, min(depth or MAX_DEPTH, MAX_DEPTH) + 1):
+                self.root_best = None
+                try:
+                    best_score = self.negamax(board, key, iteration, -INFINITY, INFINITY, 0)
+                except SearchAborted:
+                    # 本轮已完整搜索过的根走法中最好的一步（第一步是上一轮的最佳走法），分数至少不比上一轮差
+                    if self.root_best is not None:
+                        best_move, best_score = self.root_best
+                    break
+                best_move, completed = self.root_best[0], iteration
+                if abs(best_score) >= MATE_VALUE - MAX_PLY:
+                    break
+        seconds = time.perf_counter() - start
+        return {"move": best_move, "score": best_score, "depth": completed, "nodes": self.nodes,
+                "seconds": seconds, "nps": round(self.nodes / seconds) if seconds > 0 else 0}
+
+    @staticmethod
+    def history_keys(board):
+        """上一次吃子或走兵之后出现过的局面的键，用于判断重复局面"""
+        keys = set()
+        board = board.copy()
+        for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+            board.pop()
+            keys.add(chess.polyglot.zobrist_hash(board))
+        return keys
+
+    def count_node(self):
+        self.nodes += 1
+        if self.nodes >= self.max_nodes:
+            raise SearchAborted
+        if self.deadline is not None and not self.nodes & 1023 and time.perf_counter() >= self.deadline:
+            raise SearchAborted
+
+    def probe(self, key):
+        entry = self.table[key & self.mask]
+        return entry if entry is not None and entry[0] == key else None
+
+    def store(self, key, depth, score, flag, move, ply):
+        """写入置换表：空位、同一局面、旧搜索留下的条目或深度不大于新结果的条目可被覆盖"""
+        index = key & self.mask
+        entry = self.table[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            # 将杀分数按到当前节点的距离保存，读取时再换算回到根节点的距离
+            if score >= MATE_VALUE - MAX_PLY:
+                score += ply
+            elif score <= -MATE_VALUE + MAX_PLY:
+                score -= ply
+            self.table[index] = (key, depth, score, flag, move, self.generation)
+
+    def ordered_moves(self, board, tt_move, ply, captures_only=False):
+        """走法排序：置换表走法，MVV-LVA（先吃价值高的子，再用价值低的子吃），升变，杀手走法，其余走法"""
+        killers = self.killers[ply]
+        scored = []
+        moves = board.generate_legal_captures() if captures_only else board.generate_legal_moves()
+        for move in moves:
+            if move == tt_move:
+                order = 1000000
+            elif board.is_capture(move):
+                victim = board.piece_type_at(move.to_square) or chess.PAWN
+                order = 100000 + victim * 10 - board.piece_type_at(move.from_square)
+            elif move.promotion:
+                order = 90000 + move.promotion
+            elif move == killers[0]:
+                order = 80001
+            elif move == killers[1]:
+                order = 80000
+            else:
+                order = 0
+            scored.append((order, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+
+    def negamax(self, board, key, depth, alpha, beta, ply):
+        self.count_node()
+        if ply and (key in self.path or board.halfmove_clock >= 100):
+            return 0
+        in_check = board.is_check()
+        if in_check and ply < MAX_PLY:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiesce(board, alpha, beta, ply)
+
+        tt_move = None
+        entry = self.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if ply and entry[1] >= depth:
+                score = entry[2]
+                if score >= MATE_VALUE - MAX_PLY:
+                    score -= ply
+                elif score <= -MATE_VALUE + MAX_PLY:
+                    score += ply
+                flag = entry[3]
+                if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                    return score
+
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, None
+        self.path.add(key)
+        try:
+            for move in self.ordered_moves(board, tt_move, ply):
+                child_key = push_with_key(board, key, move)
+                try:
+                    score = -self.negamax(board, child_key, depth - 1, -beta, -alpha, ply + 1)
+                finally:
+                    board.pop()
+                if score > best_score:
+                    best_score, best_move = score, move
+                    if ply == 0:
+                        self.root_best = (move, score)
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    if not board.is_capture(move) and move.promotion is None and move != self.killers[ply][0]:
+                        self.killers[ply] = [move, self.killers[ply][0]]
+                    break
+        finally:
+            self.path.discard(key)
+
+        if best_move is None:
+            # 没有合法走法：被将杀（越早被将杀分数越低）或逼和
+            return -MATE_VALUE + ply if in_check else 0
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.store(key, depth, best_score, flag, best_move, ply)
+        return best_score
+
+    def quiesce(self, board, alpha, beta, ply):
+        """只搜索吃子，避免在交换的中途评估局面"""
+        self.count_node()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        for move in self.ordered_moves(board, None, ply, captures_only=True):
+            board.push(move)
+            try:
+                score = -self.quiesce(board, -beta, -alpha, ply + 1)
+            finally:
+                board.pop()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+
+# 测速局面：开局、中局和残局
+BENCH_FENS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+
+def bench(nodes=DEFAULT_NODES):
+    """在 BENCH_FENS 上各搜索 nodes 个节点，返回每个局面的结果"""
+    results = []
+    for fen in BENCH_FENS:
+        results.append((fen, Searcher().search(chess.Board(fen), nodes)))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="内置 alpha-beta 引擎：搜索一个局面或测量每秒节点数")
+    parser.add_argument("--fen", default=chess.STARTING_FEN, help="要搜索的局面")
+    parser.add_argument("--nodes", type=int, default=DEFAULT_NODES, help="节点数上限")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="最大深度")
+    parser.add_argument("--movetime", type=int, help="用时上限（毫秒）")
+    parser.add_argument("--bench", action="store_true", help="在几个固定局面上测量每秒节点数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.bench:
+        results = bench(args.nodes)
+        for fen, result in results:
+            print(f"{result['nps']:>8} nps  深度 {result['depth']:>2}  {result['move']}  {fen}")
+        total_nodes = sum(result["nodes"] for _, result in results)
+        total_seconds = sum(result["seconds"] for _, result in results)
+        print(f"合计：{total_nodes} 个节点，{total_seconds:.2f} 秒，{total_nodes / total_seconds:.0f} nps")
+        return
+    board = chess.Board(args.fen)
+    result = Searcher().search(board, args.nodes, args.depth, args.movetime)
+    move = board.san(result["move"]) if result["move"] else "(无)"
+    print(f"最佳走法 {move}  分数 {result['score']}  深度 {result['depth']}  "
+          f"{result['nodes']} 个节点  {result['seconds']:.2f} 秒  {result['nps']} nps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""后台 Stockfish 分析服务：在对局进行中（或对局结束后）分析每个局面，不阻塞走子和界面。
+
+分析线程独占一个引擎，按提交顺序逐个分析局面，把引擎的 info 输出（分数、深度、主要变例、多 PV）
+整理成字典放入队列，界面每帧取出显示在侧栏；每个局面的最终评估用于计算每步的厘兵损失（centipawn loss），
+写入保存的对局记录。
+"""
+import math
+import queue
+import threading
+from collections import deque
+
+import chess
+import chess.engine
+
+# 评估的上下限（厘兵），将杀按此值计算，避免一步将杀带来过大的损失
+MAX_EVAL = 1000
+MATE_SCORE = 100000
+
+# 最多保留的未取出的 info 更新：无界面的批量对局没有人调用 poll()，超出时丢弃最旧的更新
+MAX_PENDING_UPDATES = 256
+
+
+# 按厘兵损失划分的走法评价：(下限, 名称)，从高到低匹配
+JUDGEMENTS = ((300, "blunder"), (100, "mistake"), (50, "inaccuracy"))
+
+
+def clamp_eval(cp):
+    return max(-MAX_EVAL, min(MAX_EVAL, cp))
+
+
+def win_percent(cp):
+    """把走子方视角的评估（厘兵）换算为胜率百分比，系数与 Lichess 相同"""
+    return 50 + 50 * (2 / (1 + math.exp(-0.00368208 * cp)) - 1)
+
+
+def move_accuracy(before, after):
+    """由走子方视角走子前后的评估计算这一步的准确度（0-100），公式与 Lichess 相同"""
+    drop = win_percent(clamp_eval(before)) - win_percent(clamp_eval(after))
+    return max(0.0, min(100.0, 103.1668 * math.exp(-0.04354 * drop) - 3.1669))
+
+
+def judge_loss(loss):
+    """返回 "blunder" / "mistake" / "inaccuracy"，损失较小或未知时返回空字符串"""
+    if loss is None:
+        return ""
+    for threshold, name in JUDGEMENTS:
+        if loss >= threshold:
+            return name
+    return ""
+
+
+class AnalysisService:
+    """后台分析服务；engine 为 engine_pool.UciEngine，depth / movetime（毫秒）为每个局面的分析限制；
+    notify 在每次有新的 info 更新时在分析线程中调用，界面用它唤醒事件循环"""
+
+    def __init__(self, engine, depth=18, movetime=None, multipv=3, notify=None):
+        if not depth and not movetime:
+            raise ValueError("分析需要设置 depth 或 movetime。")
+        self.engine = engine
+        self.limit = chess.engine.Limit(depth=depth or None, time=movetime / 1000 if movetime else None)
+        self.multipv = multipv
+        self.notify = notify
+        self.jobs = queue.Queue()
+        self.updates = deque(maxlen=MAX_PENDING_UPDATES)
+        self.evaluations = {}  # 半回合数 -> 该局面的最终评估
+        self.latest = None     # 最近一次 info 更新后的局面评估，用于侧栏显示
+        self._lock = threading.Lock()  # 保护 _current 和 _closed，close() 与分析线程之间不会错过正在进行的分析
+        self._current = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, board):
+        """提交当前局面，分析结果按半回合数（len(board.move_stack)）保存"""
+        if not self._closed:
+            self.jobs.put(board.copy())
+
+    def analyse_game(self, board):
+        """提交一盘棋从开局到当前的所有局面"""
+        replay = chess.Board(board.root().fen()) if board.move_stack else board.copy()
+        self.submit(replay)
+        for move in board.move_stack:
+            replay.push(move)
+            self.submit(replay)
+
+    def _run(self):
+        while True:
+            board = self.jobs.get()
+            try:
+                if board is None:
+                    return
+                self._analyse(board)
+            except (chess.engine.EngineError, TimeoutError) as e:
+                self.updates.append({"error": str(e)})
+            finally:
+                self.jobs.task_done()
+
+    def _analyse(self, board):
+        ply = len(board.move_stack)
+        if board.is_game_over():
+            outcome = board.outcome()
+            cp = 0 if outcome.winner is None else (MATE_SCORE if outcome.winner else -MATE_SCORE)
+            self.evaluations[ply] = {"ply": ply, "depth": 0, "cp": cp, "mate": None, "lines": []}
+            return
+        lines = {}
+        with self.engine.analysis(board, self.limit, multipv=self.multipv) as analysis:
+            with self._lock:
+                self._current = analysis
+                closed = self._closed
+            if closed:
+                analysis.stop()  # close() 已经开始，它看不到这次分析，由分析线程自己中止
+            for info in analysis:
+                if "score" not in info or "pv" not in info:
+                    continue
+                score = info["score"].white()
+                line = {
+                    "multipv": info.get("multipv", 1),
+                    "depth": info.get("depth", 0),
+                    "cp": score.score(mate_score=MATE_SCORE),
+                    "mate": score.mate(),
+                    "pv": board.variation_san(info["pv"][:8]),
+                }
+                lines[line["multipv"]] = line
+                best = lines.get(1, line)
+                update = {"ply": ply, "depth": best["depth"], "cp": best["cp"], "mate": best["mate"],
+                          "lines": [lines[key] for key in sorted(lines)]}
+                self.latest = update
+                self.updates.append(update)
+                if self.notify is not None:
+                    self.notify()
+            with self._lock:
+                self._current = None
+        if lines:
+            self.evaluations[ply] = self.latest
+
+    def poll(self):
+        """取出自上次调用以来的所有 info 更新，不阻塞"""
+        updates = []
+        while True:
+            try:
+                updates.append(self.updates.popleft())
+            except IndexError:
+                return updates
+
+    def wait(self):
+        """等待已提交的局面全部分析完毕"""
+        self.jobs.join()
+
+    def close(self):
+        """停止分析线程；当前正在进行的分析会被中止"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            current = self._current
+        # 丢弃尚未开始的局面，只等待当前这一个停止
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            self.jobs.task_done()
+        if current is not None:
+            current.stop()
+        self.jobs.put(None)
+        self._thread.join()
+
+
+def format_score(evaluation):
+    """把评估格式化为白方视角的 "+0.35" 或 "#3" / "#-2" """
+    if evaluation["mate"] is not None:
+        return f"#{evaluation['mate']}"
+    return f"{evaluation['cp'] / 100:+.2f}"
+
+
+def centipawn_losses(board, evaluations):
+    """根据走子前后两个局面的评估计算每步的厘兵损失，返回 [(半回合数, 颜色, SAN, 损失)]；缺少评估的走法损失为 None"""
+    losses = []
+    replay = chess.Board(board.root().fen()) if board.move_stack else board.copy()
+    for ply, move in enumerate(board.move_stack):
+        color = 'white' if replay.turn else 'black'
+        san = replay.san(move)
+        replay.push(move)
+        before, after = evaluations.get(ply), evaluations.get(ply + 1)
+        loss = None
+        if before and after:
+            sign = 1 if color == 'white' else -1
+            loss = max(0, sign * (clamp_eval(before["cp"]) - clamp_eval(after["cp"])))
+        losses.append((ply, color, san, loss))
+    return losses
+
+
+def summarize_losses(losses):
+    """每方的平均厘兵损失（ACPL），没有可用评估时为 None"""
+    summary = {}
+    for color in ('white', 'black'):
+        values = [loss for _, move_color, _, loss in losses if move_color == color and loss is not None]
+        summary[color] = {"moves": len(values), "acpl": round(sum(values) / len(values), 1) if values else None}
+    return summary
+
+
+def format_analysis(board, evaluations):
+    """生成写入对局记录的分析部分：每步的评估和厘兵损失，以及双方的平均损失"""
+    losses = centipawn_losses(board, evaluations)
+    lines = []
+    for ply, color, san, loss in losses:
+        after = evaluations.get(ply + 1)
+        number = f"{ply // 2 + 1}." if color == 'white' else f"{ply // 2 + 1}..."
+        evaluation = f"{format_score(after)} (d{after['depth']})" if after else "?"
+        lines.append(f"{number} {san}  {evaluation}  CPL {loss if loss is not None else '?'}")
+    for color, stats in summarize_losses(losses).items():
+        acpl = stats["acpl"] if stats["acpl"] is not None else "?"
+        lines.append(f"{color.capitalize()} ACPL: {acpl}（{stats['moves']} 步）")
+    return "\n".join(lines)
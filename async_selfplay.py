@@ -0,0 +1,280 @@
+"""基于 asyncio 的对局执行：多盘棋共用一个事件循环和一个异步 OpenAI 客户端，
+通过信号量限制同时在途的请求数，HTTP 连接在所有对局之间复用。
+
+由 batch_selfplay.py 的 --async 选项调用，也可以直接使用 run_games_async。
+"""
+import asyncio
+import contextlib
+import os
+import sys
+import time
+from datetime import datetime
+
+import chess
+
+import batch_selfplay
+import game_log
+import gpt_chess_gui as game
+import metrics
+import move_cache
+
+
+class AsyncMoveProvider:
+    """共享的异步 OpenAI 客户端，所有对局通过它发送请求"""
+
+    def __init__(self, max_concurrency=32, max_retries=5):
+        # 与 get_openai 相同，openai 和 httpx 只在创建客户端时导入，导入本模块不会载入整个 HTTP 客户端
+        import httpx
+        openai = game.get_openai()
+        self.max_retries = max_retries
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = openai.AsyncOpenAI(
+            api_key=game.OPENAI_API_KEY,
+            base_url=game.base_url or None,
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+            ),
+        )
+
+    async def request(self, settings, messages, n=1):
+        """发送请求并返回响应，n 大于 1 时一次请求多个回复；达到最大重试次数时返回 None"""
+        extra_params = {"n": n} if n > 1 else {}
+        openai = game.get_openai()
+        for retries in range(1, self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    with metrics.timer("api_request_seconds", model=settings["model"]):
+                        response = await self.client.chat.completions.create(
+                            model=settings["model"],
+                            messages=messages,
+                            temperature=0.7,
+                            **extra_params,
+                        )
+                # 检查回复是否为空或 None
+                if response is None:
+                    raise ValueError("响应为 None")
+                if not response.choices[0].message.content.strip():
+                    raise ValueError("响应为空")
+                return response
+            except openai.APIConnectionError as e:
+                print(f"无法连接到服务器：{e}")
+            except openai.RateLimitError as e:
+                print(f"收到 429 状态码，已达到 API 速率限制：{e}")
+            except openai.APIError as e:
+                print(f"API 请求出错：{e}")
+            except (ValueError, AttributeError, IndexError) as e:
+                print(f"错误：{e}")
+            metrics.incr("api_retries", model=settings["model"])
+            if retries < self.max_retries:
+                print(f"发生错误，正在重试...({retries}/{self.max_retries})")
+                await asyncio.sleep(retries)  # 退避，避免在限流时持续请求
+        print("已达到最大重试次数。")
+        return None
+
+    async def close(self):
+        await self.client.close()
+
+
+async def request_candidates_async(provider, settings, messages, on_unused=None):
+    """按设置请求 num_candidates 个候选回复，按到达顺序逐个产出 (回复, 延迟秒数, 响应)；
+    提前结束时已经完成但未被取用的响应交给 on_unused(response)，用于补记用量"""
+    num_candidates = settings.get("num_candidates", 1)
+    start_time = time.perf_counter()
+    if num_candidates <= 1 or settings.get("candidate_mode", "n") == "n":
+        response = await provider.request(settings, messages, n=num_candidates)
+        if response is None:
+            return
+        latency = time.perf_counter() - start_time
+        for choice in response.choices:
+            yield (choice.message.content or "").strip(), latency, response
+        return
+
+    tasks = [asyncio.create_task(provider.request(settings, messages)) for _ in range(num_candidates)]
+    consumed = set()  # 已产出的响应的 id
+    try:
+        for finished in asyncio.as_completed(tasks):
+            response = await finished
+            consumed.add(id(response))
+            if response is not None:
+                yield response.choices[0].message.content.strip(), time.perf_counter() - start_time, response
+    finally:
+        # 已经得到合法走法时取消其余请求；已经完成的请求仍会计费，补记用量
+        for task in tasks:
+            if task.done():
+                if on_unused is not None and not task.cancelled() and task.exception() is None \
+                        and task.result() is not None and id(task.result()) not in consumed:
+                    on_unused(task.result())
+            else:
+                task.cancel()
+
+
+async def choose_legal_candidate_async(provider, board, settings, messages, player_name, fuzzy=False, on_unused=None):
+    """异步版本的 choose_legal_candidate：返回第一个合法候选，都不合法时返回第一个候选；on_unused 见 request_candidates_async"""
+    candidate_log = []
+    first = (None, None, None)
+    previous_response = None
+    candidates = request_candidates_async(provider, settings, messages, on_unused)
+    try:
+        async for reply, latency, response in candidates:
+            move_str, legal, fuzzy_from = game.check_candidate(board, reply, player_name, fuzzy)
+            usage = game.candidate_usage(response, previous_response, reply, messages, settings["model"])
+            previous_response = response
+            candidate_log.append({"move": move_str, "legal": legal, "latency": latency, "fuzzy_from": fuzzy_from,
+                                  "usage": usage})
+            if first[2] is None:
+                first = (reply, move_str, response)
+            if legal:
+                return reply, move_str, response, candidate_log
+    finally:
+        await candidates.aclose()
+    return (*first, candidate_log)
+
+
+async def chatgpt_move(provider, board, player_color, settings, attempt, tried_moves, chat_history, record,
+                       log_files, max_attempts, stats, book_hint=None):
+    """向 ChatGPT 请求一步走法，返回 SAN 字符串或 None；book_hint 为开局库的提示"""
+    prompt_text, _, _ = game.generate_prompt_text(
+        settings, board, attempt, tried_moves, player_color, None, max_attempts, chat_history, record, book_hint
+    )
+    messages = game.build_messages(settings, prompt_text, chat_history[player_color])
+    game.log_prompt(log_files, player_color, messages, attempt, max_attempts)
+
+    # 查询走法缓存，命中时不发送请求
+    cache = game.MOVE_CACHE
+    cache_key = cache.make_key(settings, board, messages) if cache is not None else None
+    cached_reply = cache.get(cache_key) if cache_key else None
+    if cached_reply is not None:
+        move_str, legal, fuzzy_from = game.check_candidate(
+            board, cached_reply, player_color.capitalize(), settings.get("fuzzy_match_moves", False)
+        )
+        reply, response = cached_reply, move_cache.CachedResponse(cached_reply)
+        candidate_log = [{"move": move_str, "legal": legal, "latency": 0.0, "fuzzy_from": fuzzy_from,
+                          "usage": (0, 0)}]
+    else:
+        reply, move_str, response, candidate_log = await choose_legal_candidate_async(
+            provider, board, settings, messages, player_color.capitalize(), settings.get("fuzzy_match_moves", False),
+            on_unused=lambda late: game.record_unused_usage(log_files, player_color, settings["model"], messages, late,
+                                                            stats)
+        )
+    if response is None:
+        return None
+    if cache_key and cached_reply is None:
+        cache.put(cache_key, settings["model"], reply, candidate_log[-1]["legal"])
+    game.log_response(log_files, player_color, response, reply, candidate_log)
+    game.record_usage(log_files, player_color, settings["model"], messages, candidate_log, stats)
+    if len(candidate_log) > 1:
+        game.log_candidates(log_files, player_color, candidate_log)
+        for candidate in candidate_log:
+            if candidate["move"] and not candidate["legal"] and candidate["move"] != move_str:
+                tried_moves.append(candidate["move"])
+    if candidate_log and candidate_log[-1]["fuzzy_from"]:
+        game.note_fuzzy_match(log_files, player_color, candidate_log[-1]["fuzzy_from"], move_str, stats)
+
+    if settings["provide_chat_history"]:
+        chat_history[player_color].append({"role": "user", "content": prompt_text})
+        chat_history[player_color].append({"role": "assistant", "content": reply})
+    return move_str
+
+
+async def play_game_async(provider, player_types, settings, stockfish=None,
+                          max_attempts=10, max_plies=300, log_files=None, stats=None, search_settings=None,
+                          analysis_service=None, board=None, engines=None):
+    """运行一盘异步对局，每盘棋拥有自己的棋盘、聊天记录、对局记录、统计和棋钟，返回 (board, record, result, termination)；
+    analysis_service 不为 None 时每步之后提交局面分析，分析在后台线程中进行，不阻塞事件循环；board 为起始棋盘，默认为初始局面；
+    engines 为每方本地 UCI 引擎的路径"""
+    board = board if board is not None else chess.Board()
+    record = game.GameRecord()
+    stats = stats if stats is not None else game.new_round_trip_stats()
+    seats = game.create_players(
+        player_types, stockfish, engines, settings, search_settings, log_files=log_files, max_attempts=max_attempts,
+        prompt_on_failure=False, provider=provider, chat_history={"white": [], "black": []}, record=record, stats=stats
+    )
+    try:
+        result, termination = await batch_selfplay.play_players(seats, board, record, {}, max_plies, analysis_service)
+    finally:
+        for player in seats.values():
+            player.close()
+    return board, record, result, termination
+
+
+async def run_games_async(config, on_result=None):
+    """在一个事件循环中并发运行 config["games"] 盘对局，最多同时进行 config["parallel_games"] 盘"""
+    provider = AsyncMoveProvider(max_concurrency=config["concurrency"])
+    seats = {color: batch_selfplay.player_seat(config, color) for color in ('white', 'black')}
+    pool = game.get_engine_pool(config["stockfish_path"]) if 'Stockfish' in (config["white"], config["black"]) else None
+    game_slots = asyncio.Semaphore(config["parallel_games"])
+    analysis_settings = batch_selfplay.analysis_settings(config)
+
+    async def run_one(index):
+        swap = config["alternate_colors"] and index % 2 == 0
+        (white_type, white_model, white_search, white_engine), (black_type, black_model, black_search, black_engine) = (
+            (seats['black'], seats['white']) if swap else (seats['white'], seats['black'])
+        )
+        player_types = {'white': white_type, 'black': black_type}
+        search_settings = {
+            'white': dict(batch_selfplay.DEFAULT_SEARCH['white'], **(white_search or {})),
+            'black': dict(batch_selfplay.DEFAULT_SEARCH['black'], **(black_search or {})),
+        }
+        settings = {
+            'white': dict(game.PLAYER_SETTINGS['white'], model=white_model or game.PLAYER_SETTINGS['white']["model"]),
+            'black': dict(game.PLAYER_SETTINGS['black'], model=black_model or game.PLAYER_SETTINGS['black']["model"]),
+        }
+        for color in settings:
+            batch_selfplay.apply_player_options(settings[color], config)
+        game_timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{index}"
+        log_files = batch_selfplay.make_log_files(config["log_dir"], game_timestamp, config.get("log_compression"))
+        stats = game.new_round_trip_stats()
+        async with game_slots:
+            # 同时进行的每盘棋各借出一个引擎，结束后归还给下一盘
+            stockfish = await asyncio.to_thread(pool.acquire) if pool else None
+            analysis_service = None
+            evaluations = None
+            start_time = time.perf_counter()
+            board = batch_selfplay.start_board(config)
+            try:
+                if analysis_settings:
+                    analysis_service = await asyncio.to_thread(
+                        game.start_analysis, board, analysis_settings, config["stockfish_path"]
+                    )
+                board, record, result, termination = await play_game_async(
+                    provider, player_types, settings, stockfish,
+                    config["max_attempts"], config["max_plies"], log_files, stats, search_settings, analysis_service,
+                    board, {'white': white_engine, 'black': black_engine}
+                )
+                if analysis_service is not None:
+                    await asyncio.to_thread(analysis_service.wait)
+                    evaluations = dict(analysis_service.evaluations)
+            finally:
+                if stockfish is not None:
+                    pool.release(stockfish)
+                if analysis_service is not None:
+                    await asyncio.to_thread(game.stop_analysis, analysis_service)
+        chatgpt_models = batch_selfplay.chatgpt_models(player_types, settings)
+        if config["save_games"]:
+            game.save_game(board, termination, white_type, black_type, game_timestamp, evaluations, result,
+                           chatgpt_models, record)
+        game.log_usage_totals(log_files, player_types, stats)
+        game_log.close(log_files)
+        models = {color: settings[color]["model"] for color in ('white', 'black')}
+        entry = batch_selfplay.build_result_entry(
+            index, board, player_types, models, result, termination, record, start_time, stats, evaluations
+        )
+        if config["pgn"]:
+            entry["pgn"] = batch_selfplay.export_pgn(
+                index, board, player_types, chatgpt_models, result, termination, record, evaluations
+            )
+        return entry
+
+    results = []
+    output = open(os.devnull, 'w') if config["quiet"] else contextlib.nullcontext(sys.stdout)
+    try:
+        with output as stream, contextlib.redirect_stdout(stream):
+            tasks = [asyncio.create_task(run_one(index + 1)) for index in range(config["games"])]
+            for finished in asyncio.as_completed(tasks):
+                entry = await finished
+                results.append(entry)
+                if on_result:
+                    on_result(entry)
+    finally:
+        await provider.close()
+    return results
@@ -0,0 +1,241 @@
+"""批量粗评估：用 NumPy 一次评估大量局面，在耗时的 Stockfish 评分（score_games.py）之前快速找出疑似失误。
+
+对局（save_game 保存的 .txt、PGN 文件或 board.move_stack）逐步回放，每个局面记录 12 个位棋盘（白方兵马象车后王、黑方兵马象车后王），
+整批局面编码为 (N, 12, 64) 的位平面数组，子力、棋子位置表（PST，与 alphabeta.py 相同）和机动性在一次向量化计算中完成。
+机动性按位棋盘平移计算：每方马、象（含后）和车（含后）攻击到的非己方格子数，同类棋子的攻击格合并计算，是粗略的近似。
+
+评估为白方视角的厘兵数，和 score_games.py 一样限制在 ±analysis.MAX_EVAL；静态评估看不到对方的回应，
+所以一步的损失按走子前的评估与对方回应之后的评估之差计算（走子方视角），损失超过阈值的走法标记为疑似失误。
+
+用法示例：
+    python batch_eval.py games/ archive.pgn --output triage.npz --top 20
+    python batch_eval.py archive.pgn --threshold 200
+"""
+import argparse
+
+import chess
+import numpy as np
+
+import alphabeta
+import analysis
+import score_games
+
+# 位平面的顺序：白方 P N B R Q K，黑方 p n b r q k
+PLANES = [(color, piece_type) for color in (chess.WHITE, chess.BLACK) for piece_type in chess.PIECE_TYPES]
+
+# 每个被攻击到的非己方格子的分数（厘兵）
+MOBILITY_WEIGHT = 3
+
+# 粗评估判定为疑似失误的默认损失阈值，与 analysis.JUDGEMENTS 中 blunder 的阈值相同
+BLUNDER_THRESHOLD = analysis.JUDGEMENTS[0][0]
+
+# 每步一行的结果：对局序号（对应 games 列表）、走子后的半回合数、走子方（0 白 1 黑）、走子前、走子后和对方回应后的评估、
+# 损失和是否疑似失误
+MOVE_DTYPE = np.dtype([
+    ("game", np.int32), ("ply", np.int16), ("color", np.int8), ("eval_before", np.int16),
+    ("eval_after", np.int16), ("eval_reply", np.int16), ("loss", np.int16), ("blunder", np.bool_),
+])
+
+
+def signed_tables():
+    """(12,) 的子力价值和 (12, 64) 的中局、残局位置分，黑方棋子取负值"""
+    material = np.zeros(12, dtype=np.int32)
+    middlegame = np.zeros((12, 64), dtype=np.int32)
+    endgame = np.zeros((12, 64), dtype=np.int32)
+    for index, (color, piece_type) in enumerate(PLANES):
+        sign = 1 if color == chess.WHITE else -1
+        material[index] = sign * alphabeta.PIECE_VALUES[piece_type]
+        middlegame[index] = sign * np.array(alphabeta.square_table(alphabeta.PST_ROWS[piece_type], color))
+        rows = alphabeta.KING_ENDGAME_ROWS if piece_type == chess.KING else alphabeta.PST_ROWS[piece_type]
+        endgame[index] = sign * np.array(alphabeta.square_table(rows, color))
+    return material, middlegame, endgame
+
+
+MATERIAL, PST_MIDDLEGAME, PST_ENDGAME = signed_tables()
+PHASE_WEIGHTS = np.array([alphabeta.PHASE_WEIGHTS[piece_type] for _, piece_type in PLANES], dtype=np.int32)
+
+FILE_A = np.uint64(chess.BB_FILE_A)
+FILE_H = np.uint64(chess.BB_FILE_H)
+NOT_A = ~FILE_A
+NOT_H = ~FILE_H
+NOT_AB = ~(FILE_A | np.uint64(chess.BB_FILE_B))
+NOT_GH = ~(FILE_H | np.uint64(chess.BB_FILE_G))
+
+
+def board_bitboards(board):
+    """board 的 12 个位棋盘，顺序同 PLANES"""
+    return [board.pieces_mask(piece_type, color) for color, piece_type in PLANES]
+
+
+def bitplanes(bitboards):
+    """(N, 12) 的 uint64 位棋盘展开为 (N, 12, 64) 的 0/1 位平面，第 k 个格子对应 chess 的格子编号 k"""
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    return ((bitboards[..., None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)).astype(np.uint8)
+
+
+def encode_positions(boards):
+    """把多个 chess.Board 编码为 (N, 12, 64) 的位平面"""
+    return bitplanes([board_bitboards(board) for board in boards])
+
+
+def popcount(bitboards):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitboards).astype(np.int32)
+    return np.unpackbits(bitboards.view(np.uint8).reshape(*bitboards.shape, 8), axis=-1).sum(axis=-1, dtype=np.int32)
+
+
+def knight_attacks(knights):
+    return (((knights << np.uint64(17)) & NOT_A) | ((knights << np.uint64(15)) & NOT_H)
+            | ((knights << np.uint64(10)) & NOT_AB) | ((knights << np.uint64(6)) & NOT_GH)
+            | ((knights >> np.uint64(17)) & NOT_H) | ((knights >> np.uint64(15)) & NOT_A)
+            | ((knights >> np.uint64(10)) & NOT_GH) | ((knights >> np.uint64(6)) & NOT_AB))
+
+
+# 滑动方向：(平移位数，正数为左移，走到的格子须满足的掩码)
+ORTHOGONAL = [(8, None), (-8, None), (1, NOT_A), (-1, NOT_H)]
+DIAGONAL = [(9, NOT_A), (7, NOT_H), (-7, NOT_A), (-9, NOT_H)]
+
+
+def shift(bitboards, amount, mask):
+    shifted = bitboards << np.uint64(amount) if amount > 0 else bitboards >> np.uint64(-amount)
+    return shifted if mask is None else shifted & mask
+
+
+def slider_attacks(sliders, empty, directions):
+    """沿各方向填充到第一个阻挡的棋子为止（包括该棋子所在的格子）"""
+    attacks = np.zeros_like(sliders)
+    for amount, mask in directions:
+        ray = sliders
+        for _ in range(7):
+            ray = shift(ray, amount, mask)
+            attacks |= ray
+            ray &= empty
+    return attacks
+
+
+def mobility(bitboards):
+    """(N, 12) 位棋盘 -> (N,) 白方与黑方机动性之差（格子数）"""
+    occupied = np.bitwise_or.reduce(bitboards, axis=1)
+    empty = ~occupied
+    result = np.zeros(len(bitboards), dtype=np.int32)
+    for offset, sign in ((0, 1), (6, -1)):
+        own = np.bitwise_or.reduce(bitboards[:, offset:offset + 6], axis=1)
+        queens = bitboards[:, offset + 4]
+        attacks = (popcount(knight_attacks(bitboards[:, offset + 1]) & ~own)
+                   + popcount(slider_attacks(bitboards[:, offset + 2] | queens, empty, DIAGONAL) & ~own)
+                   + popcount(slider_attacks(bitboards[:, offset + 3] | queens, empty, ORTHOGONAL) & ~own))
+        result += sign * attacks
+    return result
+
+
+def evaluate_batch(bitboards):
+    """评估 (N, 12) 位棋盘表示的局面，返回 (N, 3) 的 int32 数组：子力、位置分、机动性（白方视角厘兵），三列之和为总评估"""
+    bitboards = np.asarray(bitboards, dtype=np.uint64).reshape(-1, 12)
+    planes = bitplanes(bitboards).astype(np.int32)
+    counts = planes.sum(axis=2)
+    phase = np.minimum(counts @ PHASE_WEIGHTS, alphabeta.MAX_PHASE)
+    flat = planes.reshape(len(planes), -1)
+    middlegame = flat @ PST_MIDDLEGAME.reshape(-1)
+    endgame = flat @ PST_ENDGAME.reshape(-1)
+    scores = np.empty((len(planes), 3), dtype=np.int32)
+    scores[:, 0] = counts @ MATERIAL
+    scores[:, 1] = (middlegame * phase + endgame * (alphabeta.MAX_PHASE - phase)) // alphabeta.MAX_PHASE
+    scores[:, 2] = MOBILITY_WEIGHT * mobility(bitboards)
+    return scores
+
+
+def game_bitboards(fen, moves):
+    """回放一盘棋，返回 (位棋盘数组 (plies + 1, 12), 最终局面的评估覆盖值)。
+
+    最终局面被将杀时覆盖值为 ±analysis.MAX_EVAL，逼和时为 0，否则为 None。"""
+    board = chess.Board(fen)
+    rows = [board_bitboards(board)]
+    for move in moves:
+        board.push(move if isinstance(move, chess.Move) else chess.Move.from_uci(move))
+        rows.append(board_bitboards(board))
+    final = None
+    if board.is_checkmate():
+        final = -analysis.MAX_EVAL if board.turn == chess.WHITE else analysis.MAX_EVAL
+    elif board.is_stalemate():
+        final = 0
+    return np.array(rows, dtype=np.uint64), final
+
+
+def board_game(board):
+    """把对局中的 board 转换为 (起始 FEN, 走法列表)，用于评估 board.move_stack"""
+    return board.root().fen(), list(board.move_stack)
+
+
+def evaluate_games(games, threshold=BLUNDER_THRESHOLD):
+    """games 为 (起始 FEN, 走法列表) 的序列，走法为 chess.Move 或 UCI 字符串；所有局面拼成一批评估，返回 MOVE_DTYPE 数组。
+
+    第 i 步的损失 = 走子前的评估 - 对方回应之后的评估（最后一步为走子之后），均为走子方视角。"""
+    blocks, offsets, finals, first_colors = [], [0], [], []
+    for fen, moves in games:
+        bitboards, final = game_bitboards(fen, moves)
+        blocks.append(bitboards)
+        offsets.append(offsets[-1] + len(bitboards))
+        finals.append(final)
+        first_colors.append(0 if chess.Board(fen).turn == chess.WHITE else 1)
+    if not blocks:
+        return np.zeros(0, dtype=MOVE_DTYPE)
+    evals = np.clip(evaluate_batch(np.concatenate(blocks)).sum(axis=1), -analysis.MAX_EVAL, analysis.MAX_EVAL)
+    for index, final in enumerate(finals):
+        if final is not None:
+            evals[offsets[index + 1] - 1] = final
+
+    results = []
+    for index in range(len(blocks)):
+        start, end = offsets[index], offsets[index + 1]
+        moves = end - start - 1
+        if moves == 0:
+            continue
+        game_evals = evals[start:end]
+        rows = np.zeros(moves, dtype=MOVE_DTYPE)
+        rows["game"] = index
+        rows["ply"] = np.arange(1, moves + 1)
+        rows["color"] = (np.arange(moves) + first_colors[index]) % 2
+        rows["eval_before"] = game_evals[:-1]
+        rows["eval_after"] = game_evals[1:]
+        # 对方回应之后的评估：最后一步没有回应，用走子之后的评估
+        rows["eval_reply"] = np.append(game_evals[2:], game_evals[-1])
+        sign = np.where(rows["color"] == 0, 1, -1)
+        rows["loss"] = np.maximum(0, sign * (game_evals[:-1] - rows["eval_reply"]))
+        rows["blunder"] = rows["loss"] >= threshold
+        results.append(rows)
+    return np.concatenate(results) if results else np.zeros(0, dtype=MOVE_DTYPE)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="用 NumPy 批量粗评估对局，快速标记疑似失误")
+    parser.add_argument("inputs", nargs="+", help="对局记录（.txt）、PGN 文件或目录，支持通配符")
+    parser.add_argument("--threshold", type=int, default=BLUNDER_THRESHOLD, help="判定为疑似失误的损失（厘兵）")
+    parser.add_argument("--output", help="把结果保存为 .npz（moves 为每步的结果，games / white / black 为对局信息）")
+    parser.add_argument("--top", type=int, default=10, help="列出损失最大的疑似失误数量")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = [job for path in score_games.find_input_files(args.inputs) for job in score_games.iter_games(path)]
+    moves = evaluate_games([(fen, uci_moves) for _, _, _, fen, uci_moves in jobs], args.threshold)
+    game_ids = [job[0] for job in jobs]
+    names = np.array([[job[1], job[2]] for job in jobs]).reshape(-1, 2)
+    if args.output:
+        np.savez_compressed(args.output, moves=moves, games=np.array(game_ids), white=names[:, 0], black=names[:, 1])
+
+    flagged = moves[moves["blunder"]]
+    print(f"{len(jobs)} 盘对局，{len(moves)} 步，{len(flagged)} 步疑似失误（损失 ≥ {args.threshold}）")
+    players = {}
+    for row in flagged:
+        player = names[row["game"], row["color"]]
+        players[player] = players.get(player, 0) + 1
+    for player, count in sorted(players.items(), key=lambda item: -item[1]):
+        print(f"  {player}: {count}")
+    for row in np.sort(flagged, order="loss")[::-1][:args.top]:
+        print(f"  {game_ids[row['game']]} 第 {row['ply']} 步（{names[row['game'], row['color']]}）："
+              f"{row['eval_before']} -> {row['eval_after']} -> {row['eval_reply']}，损失 {row['loss']}")
+
+
+if __name__ == "__main__":
+    main()
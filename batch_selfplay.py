@@ -0,0 +1,489 @@
+"""无界面批量对局：按指定的对阵（ChatGPT / Stockfish / Random / Greedy / AlphaBeta / UCI）连续运行 N 盘棋，全程不导入 pygame 和 tkinter。
+
+用法示例：
+    python batch_selfplay.py --white ChatGPT --black Stockfish --games 20 --output results.jsonl
+    python batch_selfplay.py --config batch.json --games 50
+
+配置文件为 JSON，键名与命令行参数相同（例如 "white_model"、"max_plies"），命令行参数优先。
+每盘棋结束后立即向结果文件追加一行 JSON，中途中断也不会丢失已完成的对局。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import chess
+
+import analysis
+import board_diagram
+import game_log
+import gpt_chess_gui as game
+import metrics
+import move_cache
+import opening_book
+import pgn_io
+import players
+import token_usage
+
+# 无界面对局可用的玩家类型（不包括需要人类操作的玩家）
+PLAYER_TYPES = players.player_types(interactive=False)
+
+DEFAULT_CONFIG = {
+    "white": "ChatGPT",
+    "black": "Stockfish",
+    "games": 1,
+    "white_model": None,
+    "black_model": None,
+    "white_search": None,
+    "black_search": None,
+    "white_engine": None,
+    "black_engine": None,
+    "stockfish_path": None,
+    "max_attempts": 10,
+    "max_plies": 300,
+    "alternate_colors": False,
+    "output": "batch_results.jsonl",
+    "log_dir": None,
+    "log_compression": None,
+    "save_games": False,
+    "pgn": None,
+    "start_pgn": None,
+    "start_index": 0,
+    "start_ply": None,
+    "quiet": False,
+    "metrics": None,
+    "use_async": False,
+    "parallel_games": 8,
+    "concurrency": 32,
+    "candidates": None,
+    "candidate_mode": None,
+    "legal_moves": None,
+    "fuzzy_match": None,
+    "diagram_format": None,
+    "history_token_budget": None,
+    "history_trim": None,
+    "cache": None,
+    "cache_key": "position",
+    "cache_eviction": "lru",
+    "cache_max_entries": 100000,
+    "replay": False,
+    "analysis": False,
+    "analysis_depth": 12,
+    "analysis_multipv": 1,
+    "book": None,
+    "book_plies": 20,
+    "book_selection": "weighted",
+    "white_book": "always",
+    "black_book": "always",
+}
+
+
+# 启动时的 Stockfish 搜索设置，每盘棋在此基础上应用该席位的搜索限制
+DEFAULT_SEARCH = {color: dict(settings) for color, settings in game.STOCKFISH_SETTINGS.items()}
+SEARCH_KEYS = {"depth": int, "nodes": int, "movetime": int, "clock": float, "increment": float}
+
+
+def parse_search_spec(spec):
+    """解析 "depth=12,movetime=100,ponder" 形式的 Stockfish 搜索限制；未出现的限制清空，只使用指定的限制"""
+    search = {key: None for key in SEARCH_KEYS}
+    search["ponder"] = False
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        key, _, value = item.partition('=')
+        if key == "ponder":
+            search["ponder"] = value.lower() not in ("0", "false", "no") if value else True
+        elif key in SEARCH_KEYS and value:
+            try:
+                search[key] = SEARCH_KEYS[key](value)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"搜索限制的取值无效：{item}")
+        else:
+            raise argparse.ArgumentTypeError(f"未知的搜索限制：{item}")
+    return search
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批量运行对局")
+    parser.add_argument("--config", help="JSON 配置文件路径")
+    parser.add_argument("--white", choices=PLAYER_TYPES, help="白方玩家类型")
+    parser.add_argument("--black", choices=PLAYER_TYPES, help="黑方玩家类型")
+    parser.add_argument("--games", type=int, help="对局数量")
+    parser.add_argument("--white-model", dest="white_model", help="白方使用的模型")
+    parser.add_argument("--black-model", dest="black_model", help="黑方使用的模型")
+    parser.add_argument("--white-search", dest="white_search", type=parse_search_spec,
+                        help="白方 Stockfish / AlphaBeta / UCI 引擎的搜索限制，例如 depth=12 或 movetime=100 或 clock=60,increment=1,ponder")
+    parser.add_argument("--black-search", dest="black_search", type=parse_search_spec,
+                        help="黑方引擎的搜索限制，格式同 --white-search")
+    parser.add_argument("--white-engine", dest="white_engine", help="白方为 UCI 玩家时使用的本地 UCI 引擎路径")
+    parser.add_argument("--black-engine", dest="black_engine", help="黑方为 UCI 玩家时使用的本地 UCI 引擎路径")
+    parser.add_argument("--stockfish-path", dest="stockfish_path", help="Stockfish 可执行文件路径")
+    parser.add_argument("--max-attempts", dest="max_attempts", type=int, help="每步允许的最大尝试次数，超过判负")
+    parser.add_argument("--max-plies", dest="max_plies", type=int, help="每盘棋的最大半回合数，超过记为未完成")
+    parser.add_argument("--alternate-colors", dest="alternate_colors", action="store_const", const=True,
+                        help="每盘棋交换双方执子颜色")
+    parser.add_argument("--output", help="结果文件（JSONL，每盘一行）")
+    parser.add_argument("--log-dir", dest="log_dir", help="保存 ChatGPT 提示日志（JSONL）的目录")
+    parser.add_argument("--log-compression", dest="log_compression", choices=("gzip", "zstd"), help="提示日志的压缩方式")
+    parser.add_argument("--save-games", dest="save_games", action="store_const", const=True,
+                        help="每盘棋结束后同时用 save_game 保存对局记录")
+    parser.add_argument("--pgn", help="把所有对局依次追加到这个 PGN 文件（含每步用时和评估注释）")
+    parser.add_argument("--start-pgn", dest="start_pgn", help="从这个 PGN 文件中的对局继续，而不是从初始局面开始")
+    parser.add_argument("--start-index", dest="start_index", type=int, help="--start-pgn 中的第几盘（从 0 开始）")
+    parser.add_argument("--start-ply", dest="start_ply", type=int, help="从 --start-pgn 对局的第几个半回合继续，默认为最后")
+    parser.add_argument("--quiet", action="store_const", const=True, help="不输出每步的详细信息")
+    parser.add_argument("--metrics", help="每盘棋结束后把计时和计数指标以 Prometheus 文本格式写入该文件")
+    parser.add_argument("--async", dest="use_async", action="store_const", const=True,
+                        help="在一个 asyncio 事件循环中并发运行多盘对局")
+    parser.add_argument("--parallel-games", dest="parallel_games", type=int, help="--async 模式下同时进行的对局数")
+    parser.add_argument("--concurrency", type=int, help="--async 模式下同时在途的 OpenAI 请求数上限")
+    parser.add_argument("--candidates", type=int, help="ChatGPT 每次请求的候选走法数量，取第一个合法走法")
+    parser.add_argument("--candidate-mode", dest="candidate_mode", choices=("n", "concurrent"),
+                        help="候选的请求方式：使用 n 参数或并发多个请求")
+    parser.add_argument("--legal-moves", dest="legal_moves", action="store_const", const=True,
+                        help="在提示中附上当前局面的全部合法走法")
+    parser.add_argument("--fuzzy-match", dest="fuzzy_match", action="store_const", const=True,
+                        help="在本地模糊匹配近似的走法，减少重试请求")
+    parser.add_argument("--diagram-format", dest="diagram_format", choices=board_diagram.DIAGRAM_FORMATS,
+                        help="提示中棋盘图的格式")
+    parser.add_argument("--history-token-budget", dest="history_token_budget", type=int,
+                        help="聊天记录的 token 上限，超出时从最旧的回合开始裁剪")
+    parser.add_argument("--history-trim", dest="history_trim", choices=("drop", "summarize"),
+                        help="聊天记录超出预算时的处理方式：丢弃或概括为走法列表")
+    parser.add_argument("--cache", help="LLM 走法缓存文件（SQLite），相同局面直接复用之前的走法")
+    parser.add_argument("--cache-key", dest="cache_key", choices=("position", "prompt"),
+                        help="缓存键：按局面和走法历史，或按发送的完整消息")
+    parser.add_argument("--cache-eviction", dest="cache_eviction", choices=("lru", "lfu", "fifo"), help="缓存淘汰策略")
+    parser.add_argument("--cache-max-entries", dest="cache_max_entries", type=int, help="缓存条目数量上限")
+    parser.add_argument("--replay", action="store_const", const=True,
+                        help="确定性回放：只使用缓存，未命中时报错，不访问网络")
+    parser.add_argument("--analysis", action="store_const", const=True,
+                        help="用单独的 Stockfish 引擎在后台分析每个局面，结果中记录每步的厘兵损失")
+    parser.add_argument("--analysis-depth", dest="analysis_depth", type=int, help="分析每个局面的深度")
+    parser.add_argument("--analysis-multipv", dest="analysis_multipv", type=int, help="分析时的 PV 条数")
+    parser.add_argument("--book", help="Polyglot 开局库（.bin），在询问玩家之前查询")
+    parser.add_argument("--book-plies", dest="book_plies", type=int, help="只在前多少个半回合查询开局库")
+    parser.add_argument("--book-selection", dest="book_selection", choices=opening_book.SELECTIONS,
+                        help="库内走法的选择方式：按权重随机，或总是选权重最高的走法")
+    parser.add_argument("--white-book", dest="white_book", choices=opening_book.MODES,
+                        help="白方使用开局库的方式：不使用、直接走、只替引擎玩家走、作为提示附在 ChatGPT 的提示中")
+    parser.add_argument("--black-book", dest="black_book", choices=opening_book.MODES,
+                        help="黑方使用开局库的方式，取值同 --white-book")
+    return parser.parse_args(argv)
+
+
+def load_config(args):
+    """合并默认配置、配置文件和命令行参数"""
+    config = dict(DEFAULT_CONFIG)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"配置文件中有未知的选项：{', '.join(sorted(unknown))}")
+        config.update(file_config)
+    for key in DEFAULT_CONFIG:
+        value = getattr(args, key, None)
+        if value is not None:
+            config[key] = value
+    for color in ('white', 'black'):
+        if config[color] not in PLAYER_TYPES:
+            raise ValueError(f"未知的玩家类型：{config[color]}")
+    return config
+
+
+def setup_move_cache(config):
+    """按配置为当前进程打开走法缓存"""
+    if config.get("replay") and not config.get("cache"):
+        raise ValueError("回放模式需要通过 --cache 指定缓存文件。")
+    if config.get("cache") and game.MOVE_CACHE is None:
+        game.MOVE_CACHE = move_cache.MoveCache(
+            path=config["cache"],
+            key=config["cache_key"],
+            max_entries=config["cache_max_entries"],
+            eviction=config["cache_eviction"],
+            replay=config["replay"],
+        )
+    return game.MOVE_CACHE
+
+
+def setup_opening_book(config):
+    """按配置设置当前进程的开局库，未指定开局库时返回 None"""
+    game.OPENING_BOOK_SETTINGS.update(
+        path=config.get("book"),
+        max_plies=config.get("book_plies"),
+        selection=config.get("book_selection") or "weighted",
+        white=config.get("white_book") or "always",
+        black=config.get("black_book") or "always",
+    )
+    return game.get_opening_book()
+
+
+def apply_player_options(settings, config):
+    """把批量配置中的候选采样、合法走法、模糊匹配、棋盘图格式和聊天记录预算选项写入玩家设置"""
+    if config.get("candidates"):
+        settings["num_candidates"] = config["candidates"]
+    if config.get("candidate_mode"):
+        settings["candidate_mode"] = config["candidate_mode"]
+    if config.get("legal_moves"):
+        settings["provide_legal_moves"] = True
+    if config.get("fuzzy_match"):
+        settings["fuzzy_match_moves"] = True
+    if config.get("diagram_format"):
+        settings["diagram_format"] = config["diagram_format"]
+    if config.get("history_token_budget"):
+        settings["history_token_budget"] = config["history_token_budget"]
+    if config.get("history_trim"):
+        settings["history_trim_mode"] = config["history_trim"]
+
+
+def analysis_settings(config):
+    """由配置生成分析服务的设置，未启用分析时返回 None"""
+    if not config.get("analysis"):
+        return None
+    return {"depth": config["analysis_depth"], "movetime": None, "multipv": config["analysis_multipv"]}
+
+
+def start_board(config):
+    """每盘棋的起始棋盘：设置了 start_pgn 时为 PGN 对局中指定半回合的局面（保留之前的走法），否则为初始局面"""
+    if not config.get("start_pgn"):
+        return chess.Board()
+    board, _ = pgn_io.load_game(config["start_pgn"], config["start_index"], config["start_ply"])
+    return board
+
+
+async def play_players(seats, board, record, clocks=None, max_plies=300, analysis_service=None):
+    """由双方的玩家（{颜色: players.MovePlayer}）在 board 上走完一盘棋，返回 (result, termination)；
+    record 为对局记录，clocks 为棋钟，analysis_service 不为 None 时每步之后提交局面分析"""
+    while True:
+        game_over_message = game.check_game_over(board)
+        if game_over_message:
+            return board.result(claim_draw=True), game_over_message
+        if len(board.move_stack) >= max_plies:
+            return "*", f"Reached the {max_plies}-ply limit."
+
+        player_color = 'white' if board.turn else 'black'
+        player = seats[player_color]
+        turn_start = time.perf_counter()
+        move = game.book_move(player, board)
+        source = "Book" if move is not None else player.name
+        if move is None:
+            move = await player.choose_move(board, clocks)
+        if move is None or not board.is_legal(move):
+            result = "0-1" if board.turn else "1-0"
+            return result, f"{player_color.capitalize()} failed to provide a legal move in {player.attempts} attempts."
+        record.push(board, move, time.perf_counter() - turn_start)
+        game.record_move_metrics(source, record.move_times[-1], player.attempts)
+        if analysis_service is not None:
+            analysis_service.submit(board)
+
+
+def play_game(player_types, stockfish=None, max_attempts=10, max_plies=300, log_files=None, analysis_service=None,
+              board=None, engines=None):
+    """运行一盘无界面对局，返回 (board, result, termination)；analysis_service 不为 None 时每步之后提交局面分析；
+    board 为起始棋盘，默认为初始局面；engines 为每方本地 UCI 引擎的路径"""
+    board = board if board is not None else chess.Board()
+    for history in game.CHAT_HISTORY.values():
+        history.clear()
+    game.ROUND_TRIP_STATS.update(game.new_round_trip_stats())
+    game.STOCKFISH_CLOCKS.clear()
+
+    seats = game.create_players(player_types, stockfish, engines, log_files=log_files, max_attempts=max_attempts,
+                                prompt_on_failure=False)
+    try:
+        result, termination = asyncio.run(
+            play_players(seats, board, game.GAME_RECORD, game.STOCKFISH_CLOCKS, max_plies, analysis_service)
+        )
+    finally:
+        for player in seats.values():
+            player.close()
+    return board, result, termination
+
+
+def player_seat(config, color):
+    """配置中一方的 (玩家类型, 模型, 搜索限制, 本地 UCI 引擎路径)"""
+    return config[color], config[f"{color}_model"], config[f"{color}_search"], config[f"{color}_engine"]
+
+
+def run_configured_game(index, white, black, config, default_models=None, names=None):
+    """按 (玩家类型, 模型, 搜索限制, 本地 UCI 引擎路径) 设置双方并运行一盘对局，返回写入结果文件的字典；
+    需要时从引擎池借出 Stockfish，对局结束后归还。names 为写入 PGN 的双方名称，默认为玩家类型"""
+    white_type, white_model, white_search, white_engine = white
+    black_type, black_model, black_search, black_engine = black
+    default_models = default_models or {}
+    player_types = {'white': white_type, 'black': black_type}
+    for color, model, search in (('white', white_model, white_search), ('black', black_model, black_search)):
+        if model or color in default_models:
+            game.PLAYER_SETTINGS[color]["model"] = model or default_models[color]
+        apply_player_options(game.PLAYER_SETTINGS[color], config)
+        game.STOCKFISH_SETTINGS[color] = dict(DEFAULT_SEARCH[color], **(search or {}))
+
+    game_timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{index}"
+    log_files = make_log_files(config["log_dir"], game_timestamp, config.get("log_compression"))
+
+    pool = game.get_engine_pool(config["stockfish_path"]) if 'Stockfish' in player_types.values() else None
+    stockfish = pool.acquire() if pool else None
+    settings = analysis_settings(config)
+    analysis_service = None
+    evaluations = None
+    start_time = time.perf_counter()
+    output = open(os.devnull, 'w') if config["quiet"] else contextlib.nullcontext(sys.stdout)
+    board = start_board(config)
+    try:
+        if settings:
+            analysis_service = game.start_analysis(board, settings, config["stockfish_path"])
+        with output as stream, contextlib.redirect_stdout(stream):
+            board, result, termination = play_game(
+                player_types, stockfish, config["max_attempts"], config["max_plies"], log_files, analysis_service,
+                board, {'white': white_engine, 'black': black_engine}
+            )
+            if analysis_service is not None:
+                analysis_service.wait()
+                evaluations = dict(analysis_service.evaluations)
+            if config["save_games"]:
+                game.save_game(board, termination, white_type, black_type, game_timestamp, evaluations, result,
+                               chatgpt_models(player_types, game.PLAYER_SETTINGS))
+            game.log_usage_totals(log_files, player_types)
+    finally:
+        game_log.close(log_files)
+        if stockfish is not None:
+            pool.release(stockfish)
+        if analysis_service is not None:
+            game.stop_analysis(analysis_service)
+
+    models = {color: game.PLAYER_SETTINGS[color]["model"] for color in ('white', 'black')}
+    entry = build_result_entry(
+        index, board, player_types, models, result, termination, game.GAME_RECORD, start_time, game.ROUND_TRIP_STATS,
+        evaluations
+    )
+    if config.get("pgn"):
+        entry["pgn"] = export_pgn(index, board, names or player_types, chatgpt_models(player_types, game.PLAYER_SETTINGS),
+                                  result, termination, game.GAME_RECORD, evaluations)
+    return entry
+
+
+def chatgpt_models(player_types, settings):
+    """ChatGPT 玩家的模型名，写入 PGN 的 WhiteModel / BlackModel 标签"""
+    return {color: settings[color]["model"] for color in ('white', 'black') if player_types[color] == 'ChatGPT'}
+
+
+def export_pgn(index, board, names, models, result, termination, record, evaluations=None):
+    """把一盘对局导出为 PGN 文本，放在结果中由主进程统一追加到 PGN 文件"""
+    pgn_game = pgn_io.build_game(board, names['white'], names['black'], result, termination, models,
+                                 record.sync(board).move_times, evaluations, round_number=index)
+    return str(pgn_game)
+
+
+def write_result(out, entry, pgn_writer=None, metrics_path=None):
+    """向结果文件追加一行 JSON；结果中带有 PGN 时写入 PGN 文件，带有工作进程的指标时合并到本进程，都不写入 JSON；
+    指定了 metrics_path 时更新 Prometheus 指标文件"""
+    pgn_text = entry.pop("pgn", None)
+    if pgn_writer is not None and pgn_text:
+        pgn_writer.write(pgn_text)
+    worker_metrics = entry.pop("metrics", None)
+    if worker_metrics:
+        metrics.METRICS.merge(worker_metrics)
+    out.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    out.flush()
+    if metrics_path:
+        metrics.METRICS.write_prometheus(metrics_path)
+
+
+def make_log_files(log_dir, game_timestamp, compression=None):
+    """为一盘对局生成双方的提示日志路径，未指定目录时不记录日志"""
+    if not log_dir:
+        return None
+    os.makedirs(log_dir, exist_ok=True)
+    return {
+        color: game_log.log_path(os.path.join(log_dir, f'{color}_{game_timestamp}'), compression)
+        for color in ('white', 'black')
+    }
+
+
+def build_result_entry(index, board, player_types, models, result, termination, record, start_time, stats=None,
+                       evaluations=None):
+    """整理一盘对局的结果，作为结果文件中的一行；stats 为该盘的走子统计，用于记录 ChatGPT 的 token、费用和延迟；
+    evaluations 为分析结果，用于记录每步的厘兵损失和双方的平均损失"""
+    usage = token_usage.usage_totals(stats) if stats else {}
+    entry = {
+        "game": index,
+        "white": player_types['white'],
+        "black": player_types['black'],
+        "white_model": models['white'] if player_types['white'] == 'ChatGPT' else None,
+        "black_model": models['black'] if player_types['black'] == 'ChatGPT' else None,
+        "result": result,
+        "termination": termination,
+        "plies": len(board.move_stack),
+        "moves": list(record.sync(board).san_moves),
+        "duration": round(time.perf_counter() - start_time, 3),
+        "finished_at": datetime.now().isoformat(timespec='seconds'),
+        "white_usage": usage.get('white') if player_types['white'] == 'ChatGPT' else None,
+        "black_usage": usage.get('black') if player_types['black'] == 'ChatGPT' else None,
+    }
+    if evaluations is not None:
+        losses = analysis.centipawn_losses(board, evaluations)
+        summary = analysis.summarize_losses(losses)
+        entry["cpl"] = [loss for _, _, _, loss in losses]
+        entry["white_acpl"] = summary['white']["acpl"]
+        entry["black_acpl"] = summary['black']["acpl"]
+    return entry
+
+
+def run_batch_async(config):
+    """在一个事件循环中并发运行对局，每盘结束后立即写入结果"""
+    import asyncio
+    import async_selfplay
+
+    progress = sys.stdout  # 静默模式下对局输出被重定向，进度仍输出到原终端
+    pgn_writer = pgn_io.PgnWriter(config["pgn"]) if config["pgn"] else None
+    with open(config["output"], 'a', encoding='utf-8') as out, pgn_writer or contextlib.nullcontext():
+        def on_result(entry):
+            write_result(out, entry, pgn_writer, config["metrics"])
+            print(f"第 {entry['game']}/{config['games']} 盘：{entry['white']} vs {entry['black']} "
+                  f"{entry['result']}（{entry['termination']}）", file=progress)
+
+        return asyncio.run(async_selfplay.run_games_async(config, on_result))
+
+
+def run_batch(config):
+    """按配置连续运行对局，每盘结束后立即写入结果，返回结果列表"""
+    if config["use_async"]:
+        return run_batch_async(config)
+    seats = {color: player_seat(config, color) for color in ('white', 'black')}
+    default_models = {color: game.PLAYER_SETTINGS[color]["model"] for color in ('white', 'black')}
+
+    results = []
+    pgn_writer = pgn_io.PgnWriter(config["pgn"]) if config["pgn"] else None
+    with open(config["output"], 'a', encoding='utf-8') as out, pgn_writer or contextlib.nullcontext():
+        for index in range(config["games"]):
+            # 交换颜色时，奇数盘由黑方配置执白
+            swap = config["alternate_colors"] and index % 2 == 1
+            white = seats['black' if swap else 'white']
+            black = seats['white' if swap else 'black']
+            entry = run_configured_game(index + 1, white, black, config, default_models)
+            write_result(out, entry, pgn_writer, config["metrics"])
+            results.append(entry)
+            print(f"第 {index + 1}/{config['games']} 盘：{entry['white']} vs {entry['black']} "
+                  f"{entry['result']}（{entry['termination']}）")
+
+    return results
+
+
+def main(argv=None):
+    config = load_config(parse_args(argv))
+    cache = setup_move_cache(config)
+    setup_opening_book(config)
+    results = run_batch(config)
+    print(f"共完成 {len(results)} 盘，结果已写入 {config['output']}")
+    game_log.flush()
+    print(metrics.METRICS.summary_table())
+    if config["metrics"]:
+        metrics.METRICS.write_prometheus(config["metrics"])
+    if cache is not None:
+        print(cache.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""棋盘图的文本表示：Markdown 表格、ASCII、Unicode 棋子符号以及 FEN / EPD，不依赖 pandas 和 tabulate。
+
+棋盘格直接由各类棋子的位棋盘（bitboard）填充；同一局面的渲染结果按位棋盘缓存，重复出现的局面无需再次生成。
+"""
+from collections import OrderedDict
+
+import chess
+
+# 棋子符号映射，用于显示棋盘
+PIECE_SYMBOLS = {
+    "P": "♙", "N": "♘", "B": "♗", "R": "♖", "Q": "♕", "K": "♔",  # 白棋
+    "p": "♟", "n": "♞", "b": "♝", "r": "♜", "q": "♛", "k": "♚"   # 黑棋
+}
+
+DIAGRAM_FORMATS = ("markdown", "ascii", "unicode", "fen", "epd")
+
+# 提示中对每种格式的说明
+DIAGRAM_LEGENDS = {
+    "markdown": "Uppercase for White and lowercase for Black.",
+    "ascii": "Uppercase for White and lowercase for Black.",
+    "unicode": "White pieces are ♔♕♖♗♘♙ and Black pieces are ♚♛♜♝♞♟.",
+    "fen": "The position is given in Forsyth-Edwards Notation (FEN).",
+    "epd": "The position is given in Extended Position Description (EPD).",
+}
+
+# 按 (位棋盘, 格式) 缓存渲染结果
+DIAGRAM_CACHE = OrderedDict()
+DIAGRAM_CACHE_SIZE = 1024
+
+
+def piece_grid(board):
+    """由位棋盘生成 64 格的棋子字母列表（a1 为下标 0），空格为 "."""
+    grid = ["."] * 64
+    for color in chess.COLORS:
+        for piece_type in chess.PIECE_TYPES:
+            symbol = chess.piece_symbol(piece_type)
+            symbol = symbol.upper() if color == chess.WHITE else symbol
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                grid[square] = symbol
+    return grid
+
+
+def render_markdown(grid):
+    """与 pandas 的 DataFrame.to_markdown() 输出相同的表格"""
+    lines = [
+        "|    | " + " | ".join(f"{file:<3}" for file in "abcdefgh") + " |",
+        "|---:|" + "|".join([":----"] * 8) + "|",
+    ]
+    for rank in range(7, -1, -1):
+        row = grid[rank * 8:rank * 8 + 8]
+        lines.append(f"|  {rank + 1} | " + " | ".join(f"{symbol:<3}" for symbol in row) + " |")
+    return "\n".join(lines)
+
+
+def render_ascii(grid):
+    lines = ["  +-----------------+"]
+    for rank in range(7, -1, -1):
+        lines.append(f"{rank + 1} | " + " ".join(grid[rank * 8:rank * 8 + 8]) + " |")
+    lines.append("  +-----------------+")
+    lines.append("    a b c d e f g h")
+    return "\n".join(lines)
+
+
+def render_unicode(grid):
+    lines = []
+    for rank in range(7, -1, -1):
+        row = [PIECE_SYMBOLS.get(symbol, "·") for symbol in grid[rank * 8:rank * 8 + 8]]
+        lines.append(f"{rank + 1} " + " ".join(row))
+    lines.append("  a b c d e f g h")
+    return "\n".join(lines)
+
+
+RENDERERS = {
+    "markdown": render_markdown,
+    "ascii": render_ascii,
+    "unicode": render_unicode,
+}
+
+
+def render_diagram(board, diagram_format="markdown"):
+    """按指定格式生成棋盘图；FEN 和 EPD 包含行棋方等信息，直接由 python-chess 生成"""
+    if diagram_format == "fen":
+        return board.fen()
+    if diagram_format == "epd":
+        return board.epd()
+    if diagram_format not in RENDERERS:
+        raise ValueError(f"未知的棋盘图格式：{diagram_format}")
+
+    key = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+           board.occupied_co[chess.WHITE], diagram_format)
+    diagram = DIAGRAM_CACHE.get(key)
+    if diagram is None:
+        diagram = RENDERERS[diagram_format](piece_grid(board))
+        DIAGRAM_CACHE[key] = diagram
+        if len(DIAGRAM_CACHE) > DIAGRAM_CACHE_SIZE:
+            DIAGRAM_CACHE.popitem(last=False)
+    else:
+        DIAGRAM_CACHE.move_to_end(key)
+    return diagram
@@ -0,0 +1,122 @@
+"""长期存在的 Stockfish 引擎池：引擎只启动一次，按对局借出和归还，多盘棋和重新开始之间复用。
+
+引擎通过 python-chess 的 chess.engine 以 UCI 协议通信。同一盘棋内每次搜索发送
+position startpos moves ...（完整的走法历史），引擎保留置换表并能正确判断三次重复；
+借出时开始新的对局（下一次搜索前发送 ucinewgame），并用 isready 检查引擎是否仍然响应，无响应的引擎会被终止并替换。
+进程退出时（包括 sys.exit、pygame.QUIT 和多进程的工作进程退出）自动关闭所有引擎，不留下孤立的子进程。
+"""
+import atexit
+import multiprocessing.util
+import threading
+
+import chess.engine
+
+
+class UciEngine:
+    """池中的一个 UCI 引擎，包装 chess.engine.SimpleEngine 并记录当前对局"""
+
+    def __init__(self, path, options=None):
+        self.path = path
+        self.engine = chess.engine.SimpleEngine.popen_uci(path)
+        self.game = object()
+        if options:
+            self.configure(options)
+
+    def configure(self, options):
+        """设置引擎支持的 UCI 选项，忽略不支持的选项（例如新版 Stockfish 已移除的 Minimum Thinking Time）"""
+        supported = {name: value for name, value in options.items() if name in self.engine.options}
+        if supported:
+            self.engine.configure(supported)
+
+    def new_game(self):
+        """开始新的对局：下一次搜索前 python-chess 会发送 ucinewgame"""
+        self.game = object()
+
+    def play(self, board, limit, **kwargs):
+        """在 board 的局面上搜索，同一对局内只增量发送走法历史，不重置引擎"""
+        return self.engine.play(board, limit, game=self.game, **kwargs)
+
+    def analysis(self, board, limit, **kwargs):
+        """开始分析 board 的局面，返回逐条产出 info 的 chess.engine.SimpleAnalysisResult"""
+        return self.engine.analysis(board, limit, game=self.game, **kwargs)
+
+    def alive(self):
+        """检查引擎进程是否存活并能响应 isready"""
+        try:
+            self.engine.ping()
+            return True
+        except (chess.engine.EngineError, TimeoutError):
+            return False
+
+    def quit(self):
+        """发送 quit 并关闭进程"""
+        try:
+            self.engine.quit()
+        except (chess.engine.EngineError, TimeoutError):
+            pass
+        finally:
+            self.engine.close()
+
+
+class EnginePool:
+    """线程安全的引擎池；factory 为无参函数，返回一个新启动的 UciEngine"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.idle = []
+        self.in_use = set()
+        self.started = 0
+        self.closed = False
+        # chess.engine 的后台线程不是守护线程，解释器退出时会先等待这些线程，之后才执行 atexit，
+        # 因此在 threading 的退出钩子中关闭引擎（concurrent.futures 也使用这个钩子）
+        getattr(threading, "_register_atexit", atexit.register)(self.close)
+        # 多进程的工作进程退出时不会执行 atexit，用 multiprocessing 的终结器关闭引擎
+        multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def acquire(self, parameters=None):
+        """借出一个已重置的引擎，没有空闲的健康引擎时启动新引擎；parameters 为要设置的 UCI 选项"""
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("引擎池已关闭。")
+            engine = self.idle.pop() if self.idle else None
+        while engine is not None and not engine.alive():
+            print("Stockfish 引擎无响应，已替换。")
+            engine.quit()
+            with self.lock:
+                engine = self.idle.pop() if self.idle else None
+        if engine is None:
+            engine = self.factory()
+            with self.lock:
+                self.started += 1
+        else:
+            engine.new_game()
+        if parameters:
+            engine.configure(parameters)
+        with self.lock:
+            self.in_use.add(engine)
+        return engine
+
+    def release(self, engine):
+        """归还引擎，供下一盘棋使用"""
+        with self.lock:
+            self.in_use.discard(engine)
+            if not self.closed:
+                self.idle.append(engine)
+                return
+        engine.quit()
+
+    def close(self):
+        """终止池中所有引擎，可重复调用"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            engines = self.idle + list(self.in_use)
+            self.idle.clear()
+            self.in_use.clear()
+        for engine in engines:
+            engine.quit()
+
+    def summary(self):
+        return f"引擎池：共启动 {self.started} 个引擎，空闲 {len(self.idle)} 个，使用中 {len(self.in_use)} 个"
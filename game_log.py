@@ -0,0 +1,194 @@
+"""结构化的对局日志：每条记录为一行 JSON（JSONL），由进程内共用的后台线程写入。
+
+每个日志文件在一盘棋内只打开一次，记录先放入队列，后台线程批量序列化后写入缓冲的文件对象，
+对局结束时（或进程退出时）关闭文件。日志路径以 .gz 结尾时用 gzip 压缩，以 .zst 结尾时用 zstd 压缩（需要安装 zstandard）。
+
+提示只记录增量：每条消息按内容取哈希，同一日志中第一次出现的消息才写出全文，之后只写哈希，
+按 message_hashes 的顺序即可还原每次发送的完整消息列表。
+"""
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing.util
+import queue
+import threading
+import time
+
+import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def log_path(base, compression=None):
+    """由不带扩展名的路径生成日志路径，例如 white_20240101_120000 -> white_20240101_120000.jsonl.gz"""
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"未知的日志压缩方式：{compression}")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd 压缩需要安装 zstandard。")
+    return f"{base}.jsonl{COMPRESSION_SUFFIXES[compression]}"
+
+
+def open_log_file(path):
+    """以追加方式打开日志文件；压缩文件追加写入新的 gzip 成员或 zstd 帧，仍可整体解压"""
+    if path.endswith(".gz"):
+        return gzip.open(path, 'at', encoding='utf-8')
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError("zstd 压缩需要安装 zstandard。")
+        writer = zstandard.ZstdCompressor().stream_writer(open(path, 'ab'))
+        return io.TextIOWrapper(writer, encoding='utf-8')
+    return open(path, 'a', encoding='utf-8', buffering=1 << 16)
+
+
+def message_hash(message):
+    return hashlib.sha256(f"{message['role']}\n{message['content']}".encode('utf-8')).hexdigest()[:16]
+
+
+class LogWriter:
+    """后台日志线程：调用方只把记录放入队列，序列化和文件读写都在后台线程中完成"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.files = {}          # 路径 -> 已打开的文件对象（只在后台线程中访问）
+        self.seen_messages = {}  # 路径 -> 已写出全文的消息哈希
+        self.failed = set()      # 写入出错的路径：错误只报告一次，之后的记录丢弃，直到关闭该文件
+        self.bytes_written = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                # 与引擎池相同：进程退出前写完队列中的记录，多进程的工作进程用 multiprocessing 的终结器
+                atexit.register(self.flush)
+                multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+    def write(self, path, record):
+        self._ensure_thread()
+        self.queue.put((path, record))
+
+    def close_file(self, path):
+        """在队列中已有的记录写完后关闭该文件"""
+        with self.lock:
+            self.seen_messages.pop(path, None)
+        if self._thread is not None:
+            self.queue.put((path, None))
+
+    def flush(self):
+        """等待队列中的记录全部写入文件"""
+        if self._thread is not None:
+            self.queue.join()
+            self.queue.put((None, None))
+            self.queue.join()
+
+    def new_messages(self, path, messages):
+        """返回 (全部消息的哈希, 该日志中第一次出现的消息)"""
+        hashes = [message_hash(message) for message in messages]
+        with self.lock:
+            seen = self.seen_messages.setdefault(path, set())
+            new = [dict(message, hash=h) for h, message in zip(hashes, messages) if h not in seen]
+            seen.update(hashes)
+        return hashes, new
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            # 一次取出队列中的所有记录，批量写入
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for path, record in items:
+                # 单条记录出错（目录不可写、缺少压缩库等）只影响该日志，后台线程继续运行，flush() 不会卡住
+                try:
+                    self._handle(path, record)
+                except Exception as e:
+                    if path not in self.failed:
+                        self.failed.add(path)
+                        print(f"写入日志 {path} 失败，该日志之后的记录将被丢弃：{e}")
+                finally:
+                    self.queue.task_done()
+
+    def _handle(self, path, record):
+        if path is None:
+            # flush：把所有打开的文件缓冲写入磁盘
+            for f in self.files.values():
+                f.flush()
+            return
+        if record is None:
+            self.failed.discard(path)
+            f = self.files.pop(path, None)
+            if f is not None:
+                f.close()
+            return
+        if path in self.failed:
+            return
+        f = self.files.get(path)
+        if f is None:
+            f = self.files[path] = open_log_file(path)
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        f.write(line)
+        size = len(line.encode('utf-8'))
+        self.bytes_written += size
+        metrics.incr("log_bytes", size)
+
+
+# 进程内共用的日志线程
+WRITER = LogWriter()
+
+
+def write(path, event, **fields):
+    """追加一条记录：{"time", "event", ...fields}"""
+    if path:
+        WRITER.write(path, {"time": round(time.time(), 3), "event": event, **fields})
+
+
+def write_prompt(path, messages, **fields):
+    """记录一次发送的提示：完整消息列表的哈希、各消息的哈希以及新出现的消息"""
+    if not path:
+        return
+    hashes, new = WRITER.new_messages(path, messages)
+    prompt_hash = hashlib.sha256("".join(hashes).encode('ascii')).hexdigest()[:16]
+    write(path, "prompt", prompt_hash=prompt_hash, message_hashes=hashes, new_messages=new, **fields)
+
+
+def close(paths):
+    """对局结束时关闭日志文件；paths 为 {颜色: 路径}，可以为 None"""
+    for path in (paths or {}).values():
+        if path:
+            WRITER.close_file(path)
+
+
+def flush():
+    WRITER.flush()
+
+
+def read_log(path):
+    """读取日志中的全部记录，并为每条 prompt 记录还原完整的 messages"""
+    if path.endswith(".gz"):
+        f = gzip.open(path, 'rt', encoding='utf-8')
+    elif path.endswith(".zst"):
+        f = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True),
+                             encoding='utf-8')
+    else:
+        f = open(path, 'r', encoding='utf-8')
+    records, messages = [], {}
+    with f:
+        for line in f:
+            record = json.loads(line)
+            if record["event"] == "prompt":
+                for message in record["new_messages"]:
+                    messages[message["hash"]] = {"role": message["role"], "content": message["content"]}
+                record["messages"] = [messages[h] for h in record["message_hashes"]]
+            records.append(record)
+    return records
@@ -1,32 +1,51 @@
+import asyncio
 import threading
 import chess
-import pandas as pd
-import openai
+import chess.engine
 import re
-import pygame
 import sys
 import os
-import tkinter as tk
-from tkinter import simpledialog
+import time
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from stockfish import Stockfish
+import analysis
+import board_diagram
+import engine_pool
+import game_log
+import metrics
+import move_cache
+import opening_book
+import pgn_io
+import players
+import token_usage
 
 # 设置 OpenAI API 密钥
-openai.api_key = 'sk-'
+OPENAI_API_KEY = 'sk-'
 
 # 设置 OpenAI API 基础 URL（可选）
 base_url = 'https://api.openai.com/v1/'
-if base_url:
-    openai.base_url = base_url
+
+# openai 导入较慢（约 0.7 秒），在第一次发送请求时才由 get_openai 导入，只有 Stockfish、随机或人类玩家时不会导入
+openai = None
+
+def get_openai():
+    """导入 openai 并应用上面的密钥和基础 URL，返回 openai 模块"""
+    global openai
+    if openai is None:
+        import openai as module
+        module.api_key = OPENAI_API_KEY
+        if base_url:
+            module.base_url = base_url
+        openai = module
+    return openai
 
 # Stockfish 引擎的路径（请根据实际情况修改路径）
 STOCKFISH_PATH = r"D:\软件\stockfish\stockfish-windows-x86-64-avx2.exe"
 
 # 棋子符号映射，用于显示棋盘
-PIECE_SYMBOLS = {
-    "P": "♙", "N": "♘", "B": "♗", "R": "♖", "Q": "♕", "K": "♔",  # 白棋
-    "p": "♟", "n": "♞", "b": "♝", "r": "♜", "q": "♛", "k": "♚"   # 黑棋
-}
+PIECE_SYMBOLS = board_diagram.PIECE_SYMBOLS
 
 # 配置每方的设置，包括模型、提示信息等
 COT = (
@@ -107,6 +126,20 @@ PLAYER_SETTINGS = {
         "post_content": (
             "Please provide your best move in standard algebraic notation (e.g., e4, Nf3, Bb5), and write it on a separate line surrounded by triple hashes (###), like this:\n###\ne4\n###"
         ),
+        # 每次请求的候选走法数量：大于 1 时同时请求多个回复，取第一个合法的走法
+        "num_candidates": 1,
+        # 候选的请求方式："n" 使用 API 的 n 参数一次返回多个回复，"concurrent" 并发发送多个请求
+        "candidate_mode": "n",
+        # 棋盘图的格式："markdown"、"ascii"、"unicode"、"fen" 或 "epd"
+        "diagram_format": "markdown",
+        # 在提示中附上当前局面的全部合法走法（SAN）
+        "provide_legal_moves": False,
+        # 在本地把近似的走法（如 "Nf3+"、"0-0"、"xd5"）模糊匹配到唯一的合法走法，避免额外的 API 请求
+        "fuzzy_match_moves": False,
+        # 聊天记录的 token 上限（None 为不限制，只保留最近 20 条）；超出时从最旧的回合开始裁剪
+        "history_token_budget": None,
+        # 裁剪方式："drop" 直接丢弃，"summarize" 用一条消息概括被丢弃回合中给出的走法
+        "history_trim_mode": "drop",
     },
     "black": {
         "model": "chatgpt-4o-latest",
@@ -121,9 +154,90 @@ PLAYER_SETTINGS = {
         "post_content": (
             "Please provide your best move in standard algebraic notation (e.g., e4, Nf3, Bb5), and write it on a separate line surrounded by triple hashes (###), like this:\n###\ne4\n###"
         ),
+        # 每次请求的候选走法数量：大于 1 时同时请求多个回复，取第一个合法的走法
+        "num_candidates": 1,
+        # 候选的请求方式："n" 使用 API 的 n 参数一次返回多个回复，"concurrent" 并发发送多个请求
+        "candidate_mode": "n",
+        # 棋盘图的格式："markdown"、"ascii"、"unicode"、"fen" 或 "epd"
+        "diagram_format": "markdown",
+        # 在提示中附上当前局面的全部合法走法（SAN）
+        "provide_legal_moves": False,
+        # 在本地把近似的走法（如 "Nf3+"、"0-0"、"xd5"）模糊匹配到唯一的合法走法，避免额外的 API 请求
+        "fuzzy_match_moves": False,
+        # 聊天记录的 token 上限（None 为不限制，只保留最近 20 条）；超出时从最旧的回合开始裁剪
+        "history_token_budget": None,
+        # 裁剪方式："drop" 直接丢弃，"summarize" 用一条消息概括被丢弃回合中给出的走法
+        "history_trim_mode": "drop",
     }
 }
 
+# LLM 走法缓存设置
+MOVE_CACHE_SETTINGS = {
+    "enabled": False,
+    "path": "move_cache.sqlite3",
+    "key": "position",     # "position"：按模型、系统提示、FEN 和走法历史；"prompt"：按发送的完整消息
+    "max_entries": 100000,
+    "eviction": "lru",     # "lru" / "lfu" / "fifo"
+    "replay": False,       # 确定性回放：缓存未命中时报错，不访问网络
+}
+
+# 当前使用的走法缓存（move_cache.MoveCache），未启用时为 None
+MOVE_CACHE = None
+
+# 每方 Stockfish 的搜索限制：depth（层数）、nodes（节点数）、movetime（每步毫秒数）可任意组合，以先达到的为准；
+# clock（秒）和 increment（每步加秒）模拟真实棋钟，由引擎自行分配每步用时；
+# ponder 为 True 时引擎在对方思考期间继续搜索。内置的 AlphaBeta 玩家只使用 depth、nodes 和 movetime，
+# 未设置 nodes 时每步搜索 alphabeta.DEFAULT_NODES 个节点
+STOCKFISH_SETTINGS = {
+    "white": {"depth": 20, "nodes": None, "movetime": None, "clock": None, "increment": 0, "ponder": False},
+    "black": {"depth": 20, "nodes": None, "movetime": None, "clock": None, "increment": 0, "ponder": False},
+}
+
+# 当前对局中 Stockfish 棋钟的剩余时间（秒），每盘棋开始时清空
+STOCKFISH_CLOCKS = {}
+
+# 本地 UCI 引擎（玩家类型 UCI，例如 Lc0 或其他版本的 Stockfish）的路径，搜索限制使用该方的 STOCKFISH_SETTINGS
+UCI_ENGINE_PATH = None
+
+# Polyglot 开局库（.bin）：path 为空时不使用；只在前 max_plies 个半回合内、询问玩家之前查询。
+# white / black 为每方的使用方式：off、always（直接走库内走法）、engine（只替 Stockfish / UCI / AlphaBeta 走）、
+# hint（不直接走，把库内走法附在 ChatGPT 的提示中）；selection 为 weighted（按权重随机）或 best（权重最高的走法）
+OPENING_BOOK_SETTINGS = {
+    "path": None,
+    "max_plies": 20,
+    "selection": "weighted",
+    "white": "always",
+    "black": "always",
+}
+
+# 当前打开的开局库，首次查询时按 OPENING_BOOK_SETTINGS 打开
+OPENING_BOOK = None
+
+# Stockfish 分析设置：启用后用单独的引擎在后台分析每个局面，评估和多 PV 显示在侧栏，
+# 保存对局时写入每步的评估和厘兵损失；depth / movetime（毫秒）为每个局面的分析限制
+ANALYSIS_SETTINGS = {
+    "enabled": False,
+    "depth": 18,
+    "movetime": None,
+    "multipv": 3,
+}
+
+# 当前对局的分析服务（analysis.AnalysisService），未启用时为 None
+ANALYSIS = None
+
+# 提示日志的压缩方式：None（不压缩）、"gzip" 或 "zstd"（需要安装 zstandard）
+LOG_COMPRESSION = None
+
+# 从 PGN 继续对局：path 为 PGN 文件，index 为文件中的第几盘（从 0 开始），ply 为从第几个半回合继续（None 表示最后）
+RESUME_SETTINGS = {
+    "path": None,
+    "index": 0,
+    "ply": None,
+}
+
+# 对局结束时把计时和计数指标以 Prometheus 文本格式写入该文件，None 表示不写入
+METRICS_PATH = None
+
 # 用于存储聊天记录
 CHAT_HISTORY = {
     "white": [],
@@ -132,10 +246,14 @@ CHAT_HISTORY = {
 
 # 全局变量，用于判断是否启用GUI
 ENABLE_GUI = False
+pygame = None  # 仅在启用GUI时由 initialize_gui 导入，无界面批量运行不依赖 pygame
 PIECE_IMAGES = {}
 SCREEN = None
 CLOCK = None
 FPS = 60
+# 自定义事件：后台线程算出走法、分析服务有新的输出时发送，唤醒阻塞在 pygame.event.wait 上的事件循环
+MOVE_READY_EVENT = None
+ANALYSIS_EVENT = None
 SQUARE_SIZE = 80  # 棋盘格大小
 
 # 新增：用于跟踪棋盘是否被翻转
@@ -173,6 +291,63 @@ class RestartGameException(Exception):
     """自定义异常，用于重新启动游戏"""
     pass
 
+# 进程内共享的字体注册表，按 (字体名, 字号) 缓存，避免每帧进行系统字体查找
+FONT_CACHE = {}
+
+# 已渲染文本表面的 LRU 缓存，按 (文本, 字体名, 字号, 颜色) 缓存
+TEXT_CACHE = OrderedDict()
+TEXT_CACHE_SIZE = 512  # 缓存的文本表面数量上限
+
+def get_font(name, size):
+    """从注册表中获取字体，首次使用时才调用 SysFont"""
+    font = FONT_CACHE.get((name, size))
+    if font is None:
+        font = pygame.font.SysFont(name, size)
+        FONT_CACHE[(name, size)] = font
+    return font
+
+def render_text(text, name, size, color=TEXT_COLOR):
+    """渲染文本并缓存结果，相同的走法字符串和按钮文字只渲染一次"""
+    key = (text, name, size, color)
+    surface = TEXT_CACHE.get(key)
+    if surface is not None:
+        TEXT_CACHE.move_to_end(key)
+        return surface
+    surface = get_font(name, size).render(text, True, color)
+    TEXT_CACHE[key] = surface
+    if len(TEXT_CACHE) > TEXT_CACHE_SIZE:
+        TEXT_CACHE.popitem(last=False)
+    return surface
+
+def clear_font_caches():
+    """pygame.quit() 之后字体对象失效，需要清空缓存"""
+    FONT_CACHE.clear()
+    TEXT_CACHE.clear()
+
+class FrameTimeCounter:
+    """统计每帧的绘制耗时，用于衡量渲染优化的效果"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        if not self.count:
+            return "尚未绘制任何帧。"
+        return (f"绘制 {self.count} 帧，平均 {self.total / self.count * 1000:.3f} ms/帧，"
+                f"最长 {self.max * 1000:.3f} ms")
+
+FRAME_STATS = FrameTimeCounter()
+
 # 定义按钮类
 class Button:
     def __init__(self, rect, color, text, text_color=BUTTON_TEXT_COLOR, font_size=24):
@@ -180,8 +355,8 @@ class Button:
         self.color = color
         self.text = text
         self.text_color = text_color
-        self.font = pygame.font.SysFont("Arial", font_size)
-        self.text_surface = self.font.render(text, True, self.text_color)
+        self.font_size = font_size
+        self.text_surface = render_text(text, "Arial", font_size, self.text_color)
         self.text_rect = self.text_surface.get_rect(center=self.rect.center)
         self.hovered = False
 
@@ -195,17 +370,24 @@ class Button:
     def update_text(self, new_text):
         """更新按钮的文本"""
         self.text = new_text
-        self.text_surface = self.font.render(self.text, True, self.text_color)
+        self.text_surface = render_text(self.text, "Arial", self.font_size, self.text_color)
         self.text_rect = self.text_surface.get_rect(center=self.rect.center)
 
     def check_hover(self, mouse_pos):
         self.hovered = self.rect.collidepoint(mouse_pos)
 
 def initialize_gui():
-    global PIECE_IMAGES, SCREEN, CLOCK, SQUARE_SIZE, restart_button, pause_button, stop_button, flip_button, status_bar
+    global pygame, PIECE_IMAGES, SCREEN, CLOCK, SQUARE_SIZE, RENDERER, restart_button, pause_button, stop_button, flip_button, status_bar
+    global MOVE_READY_EVENT, ANALYSIS_EVENT
+    import pygame
     pygame.init()
+    if MOVE_READY_EVENT is None:
+        MOVE_READY_EVENT = pygame.event.custom_type()
+        ANALYSIS_EVENT = pygame.event.custom_type()
+    clear_font_caches()
     WIDTH, HEIGHT = 1100, 720  # 增加宽度以容纳游戏历史记录
     SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+    RENDERER = None  # 新的窗口需要重新建立渲染缓存
     pygame.display.set_caption('Chess Game')
     CLOCK = pygame.time.Clock()
 
@@ -256,38 +438,175 @@ def initialize_gui():
         font_size=26
     )
 
-def generate_game_record(board):
-    """生成对局记录，格式为每步的标准代数记谱法（SAN）"""
-    moves = board.move_stack
-    move_list = []
-    temp_board = chess.Board()
-    for i, move in enumerate(moves):
-        san_move = temp_board.san(move)
-        if i % 2 == 0:
-            move_list.append(f"{i // 2 + 1}. {san_move}")
+class GameRecord:
+    """增量维护的对局记录：随走法推入/撤销同步更新 SAN 列表和格式化文本，避免每次重放整盘棋"""
+
+    def __init__(self):
+        self.board = None     # 当前跟踪的棋盘
+        self.moves = []       # 与 board.move_stack 对应的走法
+        self.san_moves = []   # 每步走法的 SAN
+        self.move_times = []  # 每步用时（秒），未知时为 None
+        self._lines = []      # 每回合一行，例如 "1. e4 e5"
+        self._text = ""       # 缓存的格式化文本
+        self.version = 0      # 每次追加或删除走法时加一，相同的版本号意味着相同的记录，可用作缓存键
+
+    def __len__(self):
+        return len(self.moves)
+
+    @property
+    def text(self):
+        """格式化后的对局记录"""
+        if self._text is None:
+            self._text = "\n".join(self._lines)
+        return self._text
+
+    def push(self, board, move, elapsed=None):
+        """在棋盘上走一步并同步追加记录，返回该步的 SAN；elapsed 为这一步的用时（秒）"""
+        self.sync(board)
+        san_move = board.san(move)
+        board.push(move)
+        self._append(move, san_move, elapsed)
+        return san_move
+
+    def pop(self, board):
+        """撤销棋盘上的最后一步并同步删除记录"""
+        self.sync(board)
+        move = board.pop()
+        self._truncate(len(self.moves) - 1)
+        return move
+
+    def sync(self, board):
+        """与 board.move_stack 对齐，只补齐不一致的部分"""
+        stack = board.move_stack
+        if board is not self.board:
+            # 换了一盘新棋，从头建立记录
+            self.board = board
+            self._truncate(0)
+        elif self.moves == stack:
+            # 逐步比较完整历史：长度和最后一步相同而中间不同的历史也能发现；
+            # 经 push 走的棋与棋盘共用同一个 Move 对象，列表比较先比较对象身份，已同步时开销很小
+            return self
+
+        # 从头找到与棋盘一致的公共前缀（中间的走法可能不同而末尾恰好相同），丢弃之后的记录
+        common = next((i for i, (a, b) in enumerate(zip(self.moves, stack)) if a != b),
+                      min(len(self.moves), len(stack)))
+        self._truncate(common)
+
+        # 只重放新增的走法
+        if len(stack) > common:
+            temp_board = board.copy()
+            for _ in range(len(stack) - common):
+                temp_board.pop()
+            for move in stack[common:]:
+                self._append(move, temp_board.san(move))
+                temp_board.push(move)
+        return self
+
+    def _append(self, move, san_move, elapsed=None):
+        ply = len(self.moves)
+        self.moves.append(move)
+        self.san_moves.append(san_move)
+        self.move_times.append(elapsed)
+        self.version += 1
+        if ply % 2 == 0:
+            self._lines.append(f"{ply // 2 + 1}. {san_move}")
         else:
-            move_list[-1] += f" {san_move}"
-        temp_board.push(move)
-    return "\n".join(move_list)
-
-def generate_board_diagram(board):
-    """生成棋盘的 Markdown 表格表示，使用棋子符号"""
-    board_matrix = []
-    for rank in range(8, 0, -1):
-        row = []
-        for file in 'abcdefgh':
-            square = chess.parse_square(f"{file}{rank}")
-            piece = board.piece_at(square)
-            symbol = piece.symbol() if piece else "."
-            row.append(symbol)
-        board_matrix.append(row)
-    df = pd.DataFrame(board_matrix, index=range(8, 0, -1), columns=list('abcdefgh'))
-    return df.to_markdown()
-
-def generate_prompt_text(settings, board, attempt, tried_moves, player_color, additional_prompt, max_attempts):
-    """生成 AI 或人类玩家的提示文本"""
-    game_record = generate_game_record(board) if settings["provide_game_history"] else ""
-    board_diagram = generate_board_diagram(board) if settings["provide_game_diagram"] else ""
+            self._lines[-1] += f" {san_move}"
+        self._text = None
+
+    def _truncate(self, length):
+        while len(self.moves) > length:
+            ply = len(self.moves) - 1
+            self.moves.pop()
+            self.san_moves.pop()
+            self.move_times.pop()
+            self.version += 1
+            if ply % 2 == 0:
+                self._lines.pop()
+            else:
+                self._lines[-1] = self._lines[-1].rsplit(' ', 1)[0]
+            self._text = None
+
+# 全局对局记录，GUI、提示和存档共用
+GAME_RECORD = GameRecord()
+
+def generate_game_record(board, record=None):
+    """生成对局记录，格式为每步的标准代数记谱法（SAN），从增量记录中读取而不重放整盘棋"""
+    record = record if record is not None else GAME_RECORD
+    return record.sync(board).text
+
+def generate_board_diagram(board, diagram_format="markdown"):
+    """生成棋盘图，格式为 "markdown"（默认）、"ascii"、"unicode"、"fen" 或 "epd"，详见 board_diagram 模块"""
+    return board_diagram.render_diagram(board, diagram_format)
+
+# 每个局面的合法走法及其模糊匹配索引，按 FEN 缓存，同一局面的多次尝试只生成一次
+LEGAL_MOVES_CACHE = OrderedDict()
+LEGAL_MOVES_CACHE_SIZE = 256
+
+def normalize_move_text(move_text):
+    """规范化走法文本：去掉将军/评注符号、吃子符号和连字符，统一王车易位写法"""
+    move_text = move_text.strip().replace('e.p.', '').strip().rstrip('+#!?')
+    castling = move_text.replace('0', 'O').upper()
+    if castling in ('O-O', 'O-O-O'):
+        return castling
+    move_text = re.sub(r'[xX:=\-]', '', move_text)
+    if move_text[:1] == 'P' and len(move_text) > 2:
+        move_text = move_text[1:]  # 兵不写字母
+    if move_text[:1] in ('n', 'r', 'q', 'k'):
+        move_text = move_text[0].upper() + move_text[1:]  # 小写 b 可能是 b 线的兵，不做转换
+    return move_text
+
+def get_legal_moves(board):
+    """返回 (合法走法的 SAN 列表, 规范化走法索引, 按棋子和目标格的索引)"""
+    key = board.fen()
+    entry = LEGAL_MOVES_CACHE.get(key)
+    if entry is not None:
+        LEGAL_MOVES_CACHE.move_to_end(key)
+        return entry
+
+    san_moves = []
+    index = {}
+    destination_index = {}
+    for move in board.legal_moves:
+        san_move = board.san(move)
+        san_moves.append(san_move)
+        piece = board.piece_at(move.from_square).symbol().upper()
+        piece = '' if piece == 'P' else piece
+        index[normalize_move_text(san_move)] = san_move
+        index[move.uci()] = san_move
+        index[piece + move.uci()] = san_move
+        destination = piece + chess.square_name(move.to_square)
+        if move.promotion:
+            destination += chess.piece_symbol(move.promotion).upper()
+        destination_index.setdefault(destination, []).append(san_move)
+
+    entry = (san_moves, index, destination_index)
+    LEGAL_MOVES_CACHE[key] = entry
+    if len(LEGAL_MOVES_CACHE) > LEGAL_MOVES_CACHE_SIZE:
+        LEGAL_MOVES_CACHE.popitem(last=False)
+    return entry
+
+def match_legal_move(board, move_str):
+    """将近似的走法（如 "Nf3+"、"0-0"、"xd5"）匹配到唯一的合法走法，返回其 SAN，无法唯一匹配时返回 None"""
+    _, index, destination_index = get_legal_moves(board)
+    is_capture = 'x' in move_str.lower()
+    key = normalize_move_text(move_str)
+    san_move = index.get(key)
+    if san_move and (not is_capture or 'x' in san_move):
+        return san_move
+    # 只给出目标格时（如 "xd5" 或 "Nd2"），只有唯一的走法符合才接受
+    matches = destination_index.get(key, [])
+    if is_capture:
+        matches = [san for san in matches if 'x' in san]
+    return matches[0] if len(matches) == 1 else None
+
+@metrics.timer("prompt_build_seconds")
+def generate_prompt_text(settings, board, attempt, tried_moves, player_color, additional_prompt, max_attempts, chat_history=None, record=None, book_hint=None):
+    """生成 AI 或人类玩家的提示文本；chat_history 和 record 默认使用全局的聊天记录和对局记录，book_hint 为开局库的提示"""
+    chat_history = chat_history if chat_history is not None else CHAT_HISTORY
+    game_record = generate_game_record(board, record) if settings["provide_game_history"] else ""
+    diagram_format = settings.get("diagram_format", "markdown")
+    diagram = generate_board_diagram(board, diagram_format) if settings["provide_game_diagram"] else ""
 
     prompt_text = f"{settings['pre_content']}\n\n"
 
@@ -297,8 +616,16 @@ def generate_prompt_text(settings, board, attempt, tried_moves, player_color, ad
 
     if settings["provide_game_diagram"]:
         prompt_text += "Chessboard Diagram:\n"
-        prompt_text += f"*Uppercase for White and lowercase for Black. You are {player_color}.*\n"
-        prompt_text += f"{board_diagram}\n\n"
+        prompt_text += f"*{board_diagram.DIAGRAM_LEGENDS[diagram_format]} You are {player_color}.*\n"
+        prompt_text += f"{diagram}\n\n"
+
+    if settings.get("provide_legal_moves"):
+        prompt_text += "Legal Moves:\n"
+        prompt_text += f"{', '.join(get_legal_moves(board)[0])}\n\n"
+
+    if book_hint:
+        prompt_text += "Opening Book:\n"
+        prompt_text += f"{book_hint}\n\n"
 
     if attempt > 1:
         prompt_text += f"Your previous move was illegal. Attempt {attempt}/{max_attempts}.\n"
@@ -311,9 +638,9 @@ def generate_prompt_text(settings, board, attempt, tried_moves, player_color, ad
         else:
             prompt_text += "Please reconsider your move step by step based on the feedback.\n"
         if not settings["provide_chat_history"]:
-            if CHAT_HISTORY[player_color]:
-                last_user_message = CHAT_HISTORY[player_color][-2]['content'] if len(CHAT_HISTORY[player_color]) >= 2 else ""
-                last_assistant_reply = CHAT_HISTORY[player_color][-1]['content'] if len(CHAT_HISTORY[player_color]) >= 1 else ""
+            if chat_history[player_color]:
+                last_user_message = chat_history[player_color][-2]['content'] if len(chat_history[player_color]) >= 2 else ""
+                last_assistant_reply = chat_history[player_color][-1]['content'] if len(chat_history[player_color]) >= 1 else ""
                 prompt_text += f"Previous interaction:\nUser: {last_user_message}\nAssistant: {last_assistant_reply}\n\n"
 
         if tried_moves:
@@ -321,20 +648,59 @@ def generate_prompt_text(settings, board, attempt, tried_moves, player_color, ad
 
     prompt_text += f"{settings['post_content']}\n"
 
-    return prompt_text, game_record, board_diagram
+    return prompt_text, game_record, diagram
+
+def build_messages(settings, prompt_text, chat_history):
+    """构建与 OpenAI 的对话消息，chat_history 为该方的聊天记录列表"""
+    messages = [{"role": "system", "content": settings["system_prompt"]}]
+    if settings["provide_chat_history"]:
+        messages.extend(token_usage.trim_chat_history(
+            chat_history,
+            budget=settings.get("history_token_budget"),
+            mode=settings.get("history_trim_mode", "drop"),
+            model=settings["model"],
+        ))
+    messages.append({"role": "user", "content": prompt_text})
+    return messages
+
+def log_path(log_files, player_color):
+    """返回该方的日志路径，未记录日志时返回 None"""
+    return log_files.get(player_color) if log_files else None
+
+def log_prompt(log_files, player_color, messages, attempt, max_attempts):
+    """将 prompt 写入日志文件：只写出之前没有出现过的消息，其余消息以哈希引用"""
+    game_log.write_prompt(log_path(log_files, player_color), messages, attempt=attempt, max_attempts=max_attempts)
+
+def log_response(log_files, player_color, response, reply=None, candidate_log=None):
+    """将回复、每个候选的走法、合法性、延迟和用量写入日志文件"""
+    game_log.write(
+        log_path(log_files, player_color), "response",
+        id=getattr(response, "id", None),
+        model=getattr(response, "model", None),
+        cached=getattr(response, "cached", False),
+        reply=reply,
+        candidates=[
+            {key: candidate[key] for key in ("move", "legal", "latency", "fuzzy_from", "usage")}
+            for candidate in candidate_log or []
+        ],
+    )
 
-def send_openai_request(settings, messages):
-    """发送请求到 OpenAI API 并返回响应"""
+def send_openai_request(settings, messages, interactive=True, n=1):
+    """发送请求到 OpenAI API 并返回响应；n 大于 1 时一次请求多个回复；非交互模式下达到最大重试次数时返回 None"""
     max_retries = 5
     retries = 0
+    extra_params = {"n": n} if n > 1 else {}
+    get_openai()
 
     while True:
         try:
-            response = openai.chat.completions.create(
-                model=settings["model"],
-                messages=messages,
-                temperature=0.7,
-            )
+            with metrics.timer("api_request_seconds", model=settings["model"]):
+                response = openai.chat.completions.create(
+                    model=settings["model"],
+                    messages=messages,
+                    temperature=0.7,
+                    **extra_params,
+                )
             # 检查回复是否为空或 None
             if response is None:
                 raise ValueError("响应为 None")
@@ -356,16 +722,20 @@ def send_openai_request(settings, messages):
             print(f"错误：{e}")
 
         retries += 1
+        metrics.incr("api_retries", model=settings["model"])
         if retries >= max_retries:
             print("已达到最大重试次数。")
+            if not interactive:
+                return None
             input("按 Enter 键继续重试...")
             retries = 0  # 重置重试计数
         else:
             print(f"发生错误，正在重试...({retries}/{max_retries})")
 
-def extract_move_from_reply(reply, player_color):
-    """从 AI 的回复中提取走法"""
-    match = re.search(r'###\n([A-Za-z0-9 ]+)\n###', reply, re.DOTALL)
+def extract_move_from_reply(reply, player_color, lenient=False):
+    """从 AI 的回复中提取走法；lenient 为 True 时也接受 "+"、"="、"-" 等符号，交给模糊匹配处理"""
+    pattern = r'###\s*\n\s*([^\n#]+?)\s*\n\s*###' if lenient else r'###\n([A-Za-z0-9 ]+)\n###'
+    match = re.search(pattern, reply, re.DOTALL)
     if match:
         move_str = match.group(1).strip()
         return move_str
@@ -373,235 +743,468 @@ def extract_move_from_reply(reply, player_color):
         print(f"{player_color.capitalize()} 没有提供正确格式的走法。")
         return None
 
-def prompt_output(board, player_color, attempt=1, tried_moves=[], current_player_type='Human', stockfish=None, log_files=None, additional_prompt=None, gui_enabled=True, max_attempts=10):
-    """生成并处理 AI、人类或 Stockfish 的走法"""
+def request_candidates(settings, messages, interactive=True, on_unused=None):
+    """按设置请求 num_candidates 个候选回复，按到达顺序逐个产出 (回复, 延迟秒数, 响应)；
+    并发模式下提前结束时，仍完成的其余响应交给 on_unused(response)（可能在工作线程中调用），用于补记用量"""
+    num_candidates = settings.get("num_candidates", 1)
+    start_time = time.perf_counter()
+    if num_candidates <= 1 or settings.get("candidate_mode", "n") == "n":
+        response = send_openai_request(settings, messages, interactive, n=num_candidates)
+        if response is None:
+            return
+        latency = time.perf_counter() - start_time
+        for choice in response.choices:
+            yield (choice.message.content or "").strip(), latency, response
+        return
+
+    # 工作线程不能在终端等待输入，达到最大重试次数时该候选按失败处理
+    executor = ThreadPoolExecutor(max_workers=num_candidates)
+    futures = [executor.submit(send_openai_request, settings, messages, False) for _ in range(num_candidates)]
+    pending = set(futures)
+    try:
+        for future in as_completed(futures):
+            pending.discard(future)
+            response = future.result()
+            if response is not None:
+                yield response.choices[0].message.content.strip(), time.perf_counter() - start_time, response
+    finally:
+        # 已经得到合法走法时不再等待其余请求；已发出的请求仍会计费，完成后补记用量
+        executor.shutdown(wait=False, cancel_futures=True)
+        if on_unused is not None:
+            for future in pending:
+                future.add_done_callback(lambda f: report_unused(f, on_unused))
+
+def report_unused(future, on_unused):
+    """并发候选请求的完成回调：请求未被取消且得到了响应时交给 on_unused"""
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        on_unused(future.result())
+
+def check_candidate(board, reply, player_name, fuzzy=False):
+    """从候选回复中提取走法并检查是否合法，返回 (走法, 是否合法, 模糊匹配前的原始走法)"""
+    move_str = extract_move_from_reply(reply, player_name, lenient=fuzzy)
+    if not move_str:
+        return None, False, None
+    try:
+        board.parse_san(move_str)
+        return move_str, True, None
+    except ValueError:
+        pass
+    if fuzzy:
+        matched = match_legal_move(board, move_str)
+        if matched:
+            return matched, True, move_str
+    return move_str, False, None
+
+def candidate_usage(response, previous_response, reply, messages=None, model=None):
+    """候选的 token 用量；使用 n 参数时多个候选共用一个响应，用量只计一次"""
+    if response is previous_response:
+        return 0, 0
+    return token_usage.response_usage(response, reply, messages, model)
+
+def choose_legal_candidate(board, candidates, player_name, fuzzy=False, messages=None, model=None):
+    """依次检查候选回复，返回 (回复, 走法, 响应, 候选记录)；优先取第一个合法走法，都不合法时返回第一个候选"""
+    candidate_log = []
+    first = (None, None, None)
+    previous_response = None
+    with contextlib.closing(candidates):
+        for reply, latency, response in candidates:
+            move_str, legal, fuzzy_from = check_candidate(board, reply, player_name, fuzzy)
+            usage = candidate_usage(response, previous_response, reply, messages, model)
+            previous_response = response
+            candidate_log.append({"move": move_str, "legal": legal, "latency": latency, "fuzzy_from": fuzzy_from,
+                                  "usage": usage})
+            if first[2] is None:
+                first = (reply, move_str, response)
+            if legal:
+                return reply, move_str, response, candidate_log
+    return (*first, candidate_log)
+
+def new_round_trip_stats():
+    """每方的走子统计：已完成的步数、API 请求（往返）次数、模糊匹配接受的次数，以及 token、费用和延迟的累计"""
+    return {
+        color: {
+            "plies": 0, "requests": 0, "fuzzy_matches": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "history_tokens": 0,
+            "latency": 0.0, "cost": 0.0, "cost_known": False,
+        }
+        for color in ("white", "black")
+    }
+
+ROUND_TRIP_STATS = new_round_trip_stats()
+# 未被取用的并发候选在工作线程中补记用量，与主线程的累计共用这把锁
+USAGE_LOCK = threading.Lock()
+
+def note_fuzzy_match(log_files, player_color, original, matched, stats=None):
+    """记录一次被模糊匹配接受的走法"""
+    stats = stats if stats is not None else ROUND_TRIP_STATS
+    stats[player_color]["fuzzy_matches"] += 1
+    line = f"模糊匹配：{original} -> {matched}"
+    print(line)
+    game_log.write(log_path(log_files, player_color), "fuzzy_match", original=original, matched=matched)
+
+def log_round_trips(log_files, player_color, requests, stats=None):
+    """记录一步棋用掉的请求次数，并把累计的平均往返次数写入日志"""
+    stats = (stats if stats is not None else ROUND_TRIP_STATS)[player_color]
+    stats["plies"] += 1
+    stats["requests"] += requests
+    line = (f"本步请求 {requests} 次；累计 {stats['plies']} 步，平均 {stats['requests'] / stats['plies']:.2f} 次/步，"
+            f"模糊匹配接受 {stats['fuzzy_matches']} 次")
+    print(line)
+    game_log.write(log_path(log_files, player_color), "round_trips", requests=requests, plies=stats["plies"],
+                   total_requests=stats["requests"], fuzzy_matches=stats["fuzzy_matches"])
+
+def record_usage(log_files, player_color, model, messages, candidate_log, stats=None):
+    """累计一次请求的 token 用量、费用和延迟，并输出本次请求中聊天记录所占的 token 数"""
+    stats = (stats if stats is not None else ROUND_TRIP_STATS)[player_color]
+    prompt_tokens = sum(candidate["usage"][0] for candidate in candidate_log)
+    completion_tokens = sum(candidate["usage"][1] for candidate in candidate_log)
+    history_tokens = token_usage.count_message_tokens(messages[1:-1], model) if prompt_tokens else 0
+    latency = candidate_log[-1]["latency"] if candidate_log else 0.0
+    cost = token_usage.estimate_cost(model, prompt_tokens, completion_tokens)
+    with USAGE_LOCK:
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["history_tokens"] += history_tokens
+        stats["latency"] += latency
+        if cost is not None:
+            stats["cost"] += cost
+            stats["cost_known"] = True
+    line = (f"本次请求：输入 {prompt_tokens} tokens（其中聊天记录 {history_tokens}），输出 {completion_tokens} tokens，"
+            f"延迟 {latency * 1000:.0f} ms" + (f"，费用 ${cost:.4f}" if cost is not None else ""))
+    print(line)
+    game_log.write(log_path(log_files, player_color), "usage", prompt_tokens=prompt_tokens,
+                   completion_tokens=completion_tokens, history_tokens=history_tokens, latency=latency, cost=cost)
+
+def record_unused_usage(log_files, player_color, model, messages, response, stats=None):
+    """补记一个未被取用的候选响应（已取得合法走法后才返回）的 token 用量和费用，不计入延迟"""
+    stats = (stats if stats is not None else ROUND_TRIP_STATS)[player_color]
+    reply = (response.choices[0].message.content or "").strip()
+    prompt_tokens, completion_tokens = token_usage.response_usage(response, reply, messages, model)
+    cost = token_usage.estimate_cost(model, prompt_tokens, completion_tokens)
+    with USAGE_LOCK:
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        if cost is not None:
+            stats["cost"] += cost
+            stats["cost_known"] = True
+    game_log.write(log_path(log_files, player_color), "unused_usage", prompt_tokens=prompt_tokens,
+                   completion_tokens=completion_tokens, cost=cost)
+
+def record_move_metrics(player_type, elapsed, attempts):
+    """记录一步棋的用时和尝试次数，按玩家类型统计"""
+    metrics.observe("move_latency_seconds", elapsed, player=player_type)
+    metrics.observe("ply_attempts", attempts, player=player_type)
+    if attempts > 1:
+        metrics.incr("ply_retries", attempts - 1, player=player_type)
+
+def log_usage_totals(log_files, player_types, stats=None):
+    """在对局结束时输出并记录每个 ChatGPT 玩家整盘棋的 token、费用和延迟合计"""
+    stats = stats if stats is not None else ROUND_TRIP_STATS
+    for color in ("white", "black"):
+        if player_types[color] != 'ChatGPT':
+            continue
+        print(token_usage.format_usage_totals(color, stats[color]))
+        game_log.write(log_path(log_files, color), "usage_totals", **token_usage.usage_totals(stats)[color])
+
+def log_candidates(log_files, player_color, candidate_log):
+    """输出每个候选走法的延迟和合法性（日志中随 response 记录一起写入）"""
+    lines = [
+        f"候选 {i}: {c['move'] or '无'} {'合法' if c['legal'] else '非法'} {c['latency'] * 1000:.0f} ms"
+        for i, c in enumerate(candidate_log, 1)
+    ]
+    print("\n".join(lines))
+
+def request_chatgpt_move(board, player_color, attempt=1, tried_moves=None, log_files=None, additional_prompt=None,
+                         max_attempts=10, interactive=True, book_hint=None):
+    """向 ChatGPT 发送一次提示并返回它给出的走法（SAN 字符串，可能不合法），请求失败时返回 None"""
     settings = PLAYER_SETTINGS[player_color]
     current_player = "White" if board.turn else "Black"
+    tried_moves = tried_moves if tried_moves is not None else []
 
-    global is_paused, board_flipped  # 引入全局变量 is_paused 和 board_flipped
+    prompt_text, _, _ = generate_prompt_text(
+        settings, board, attempt, tried_moves, player_color, additional_prompt, max_attempts, book_hint=book_hint
+    )
 
-    if current_player_type == 'Human':
-        print(f"\n===== {current_player} 的回合 =====")
-        if gui_enabled:
-            move_input = human_player_move_gui(board)
-            if move_input is None:
-                raise RestartGameException()
-        else:
-            move_input = human_player_move_cli(board)
-        return move_input.strip(), False  # is_uci=False
+    # 构建与 OpenAI 的对话消息
+    messages = build_messages(settings, prompt_text, CHAT_HISTORY[player_color])
 
-    elif current_player_type == 'ChatGPT':
-        prompt_text, _, _ = generate_prompt_text(
-            settings, board, attempt, tried_moves, player_color, additional_prompt, max_attempts
-        )
+    # 输出到终端
+    print(f"\n===== {current_player} 的回合 (尝试 {attempt}/{max_attempts}) =====")
+    print("发送到 OpenAI 的消息:")
+    for message in messages:
+        print(f"{message['role'].capitalize()}: {message['content']}")
 
-        # 构建与 OpenAI 的对话消息
-        messages = [{"role": "system", "content": settings["system_prompt"]}]
-        chat_count = len(CHAT_HISTORY[player_color])
-        if settings["provide_chat_history"]:
-            chat_history = CHAT_HISTORY[player_color][-20:] if chat_count > 20 else CHAT_HISTORY[player_color]
-            messages.extend(chat_history)
-        messages.append({"role": "user", "content": prompt_text})
-
-        # 输出到终端
-        print(f"\n===== {current_player} 的回合 (尝试 {attempt}/{max_attempts}) =====")
-        print("发送到 OpenAI 的消息:")
-        for message in messages:
-            print(f"{message['role'].capitalize()}: {message['content']}")
-
-        # 将 prompt 写入日志文件
-        if log_files and log_files[player_color]:
-            with open(log_files[player_color], 'a', encoding='utf-8') as f:
-                f.write(f"\n===== Prompt (Attempt {attempt}/{max_attempts}) =====\n")
-                f.write(str(messages) + '\n')
-
-        # 使用线程来发送请求到 OpenAI API
-        response = None
-
-        def get_response():
-            nonlocal response
-            response = send_openai_request(settings, messages)
-
-        thread = threading.Thread(target=get_response, daemon=True)
-        thread.start()
-
-        # 在等待响应期间，保持 GUI 响应
-        while thread.is_alive():
-            thread.join(timeout=0.1)
-            # 处理 Pygame 事件
-            if gui_enabled:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                    elif event.type == pygame.MOUSEBUTTONDOWN:
-                        x, y = event.pos
-                        if restart_button.is_clicked((x, y)):
-                            restart_game(board)
-                        elif pause_button.is_clicked((x, y)):
-                            is_paused = not is_paused
-                            pause_button.update_text("Resume" if is_paused else "Pause")
-                        elif stop_button.is_clicked((x, y)):
-                            save_game(board, game_over_message='stopped')
-                            pygame.quit()
-                            sys.exit()
-                        elif flip_button.is_clicked((x, y)):  # 检测Flip按钮点击
-                            board_flipped = not board_flipped
-                            print("棋盘已翻转。")
-                    elif event.type == pygame.MOUSEBUTTONUP:
-                        pass
-                    elif event.type == pygame.MOUSEMOTION:
-                        pass
-                    elif event.type == pygame.MOUSEWHEEL:
-                        handle_mouse_wheel(event)
-                # 如果游戏暂停，则暂停线程
-                if is_paused:
-                    thread.join(timeout=0)  # 不再等待线程
-                    while is_paused:
-                        # 绘制棋盘并处理事件
-                        draw_board(board)
-                        pygame.display.flip()
-                        CLOCK.tick(FPS)
-                        for event in pygame.event.get():
-                            if event.type == pygame.QUIT:
-                                pygame.quit()
-                                sys.exit()
-                            elif event.type == pygame.MOUSEBUTTONDOWN:
-                                x, y = event.pos
-                                if pause_button.is_clicked((x, y)):
-                                    is_paused = not is_paused
-                                    pause_button.update_text("Resume" if is_paused else "Pause")
-                                elif restart_button.is_clicked((x, y)):
-                                    restart_game(board)
-                                elif stop_button.is_clicked((x, y)):
-                                    save_game(board, game_over_message='stopped')
-                                    pygame.quit()
-                                    sys.exit()
-                                elif flip_button.is_clicked((x, y)):
-                                    board_flipped = not board_flipped
-                                    print("棋盘已翻转。")
-                            elif event.type == pygame.MOUSEWHEEL:
-                                handle_mouse_wheel(event)
-                    # 重新启动线程
-                    if not thread.is_alive():
-                        thread = threading.Thread(target=get_response, daemon=True)
-                        thread.start()
-                else:
-                    # 绘制棋盘
-                    draw_board(board)
-                    pygame.display.flip()
-                    CLOCK.tick(FPS)
+    # 将 prompt 写入日志文件
+    log_prompt(log_files, player_color, messages, attempt, max_attempts)
 
-        if response is None:
-            return None, False
+    # 查询走法缓存，命中时不发送请求
+    cache_key = MOVE_CACHE.make_key(settings, board, messages) if MOVE_CACHE is not None else None
+    cached_reply = MOVE_CACHE.get(cache_key) if cache_key else None
+    if cached_reply is not None:
+        print("命中走法缓存，不发送请求。")
 
-        # 获取并显示 ChatGPT 的回复
-        reply = response.choices[0].message.content.strip()
-        print(f"\n{current_player} 的回复：")
-        print(reply)
+    # 发送请求到 OpenAI API（命中缓存时使用缓存的回答），挑选合法的候选走法
+    if cached_reply is not None:
+        candidates = move_cache.cached_candidates(cached_reply)
+    else:
+        candidates = request_candidates(
+            settings, messages, interactive,
+            on_unused=lambda late: record_unused_usage(log_files, player_color, settings["model"], messages, late)
+        )
+    reply, move_str, response, candidate_log = choose_legal_candidate(
+        board, candidates, current_player, settings.get("fuzzy_match_moves", False), messages, settings["model"]
+    )
 
-        # 将回复写入日志文件
-        if log_files and log_files[player_color]:
-            with open(log_files[player_color], 'a', encoding='utf-8') as f:
-                f.write(f"\n===== Response =====\n")
-                f.write(str(response) + '\n')
+    if response is None:
+        return None
+    if cache_key and cached_reply is None:
+        MOVE_CACHE.put(cache_key, settings["model"], reply, candidate_log[-1]["legal"])
+
+    # 显示 ChatGPT 的回复
+    print(f"\n{current_player} 的回复：")
+    print(reply)
+
+    # 将回复写入日志文件
+    log_response(log_files, player_color, response, reply, candidate_log)
+    record_usage(log_files, player_color, settings["model"], messages, candidate_log)
+    if len(candidate_log) > 1:
+        log_candidates(log_files, player_color, candidate_log)
+        # 其余非法候选也计入已尝试的走法
+        for candidate in candidate_log:
+            if candidate["move"] and not candidate["legal"] and candidate["move"] != move_str:
+                tried_moves.append(candidate["move"])
+    if candidate_log and candidate_log[-1]["fuzzy_from"]:
+        note_fuzzy_match(log_files, player_color, candidate_log[-1]["fuzzy_from"], move_str)
+
+    # 更新聊天记录
+    if settings["provide_chat_history"]:
+        CHAT_HISTORY[player_color].append({"role": "user", "content": prompt_text})
+        CHAT_HISTORY[player_color].append({"role": "assistant", "content": reply})
+
+    return move_str
+
+@players.register_player("Human")
+class HumanPlayer(players.MovePlayer):
+    """人类玩家：启用界面时用鼠标拖动棋子，否则在终端输入走法"""
+    interactive = True
+
+    def __init__(self, color, gui=False, **options):
+        super().__init__(color)
+        self.gui = gui
+
+    async def choose_move(self, position, clock=None):
+        self.attempts = 1
+        print(f"\n===== {self.color.capitalize()} 的回合 =====")
+        return human_player_move_gui(position) if self.gui else human_player_move_cli(position)
+
+@players.register_player("ChatGPT")
+class ChatGPTPlayer(players.MovePlayer):
+    """ChatGPT 玩家：每步最多尝试 max_attempts 次，把不合法的回答作为已尝试的走法写入下一次提示。
+
+    provider 为 async_selfplay.AsyncMoveProvider 时通过共享的异步客户端请求，并使用传入的聊天记录、对局记录和统计；
+    否则在线程中用同步客户端请求，使用全局的聊天记录和统计。prompt_on_failure 为 True 时，请求达到最大重试次数后
+    在终端等待按 Enter 继续重试，否则这次尝试按失败处理。
+    """
+
+    def __init__(self, color, settings=None, log_files=None, max_attempts=10, prompt_on_failure=True, provider=None,
+                 chat_history=None, record=None, stats=None, **options):
+        super().__init__(color)
+        self.settings = settings if settings is not None else PLAYER_SETTINGS[color]
+        self.log_files = log_files
+        self.max_attempts = max_attempts
+        self.prompt_on_failure = prompt_on_failure
+        self.provider = provider
+        self.chat_history = chat_history
+        self.record = record
+        self.stats = stats
+        self.tried_moves = []
+        # 用完尝试次数后由调用方设置附加提示，再次调用 choose_move 时在同一步继续尝试
+        self.additional_prompt = None
+
+    async def request_move(self, position, attempt):
+        if self.provider is None:
+            return await asyncio.to_thread(
+                request_chatgpt_move, position, self.color, attempt, self.tried_moves, self.log_files,
+                self.additional_prompt, self.max_attempts, self.prompt_on_failure, self.book_hint
+            )
+        import async_selfplay
+        return await async_selfplay.chatgpt_move(
+            self.provider, position, self.color, self.settings, attempt, self.tried_moves, self.chat_history,
+            self.record, self.log_files, self.max_attempts, self.stats, self.book_hint
+        )
 
-        # 更新聊天记录
-        if settings["provide_chat_history"]:
-            CHAT_HISTORY[player_color].append({"role": "user", "content": prompt_text})
-            CHAT_HISTORY[player_color].append({"role": "assistant", "content": reply})
+    async def choose_move(self, position, clock=None):
+        if self.additional_prompt is None:
+            self.attempts, self.tried_moves = 0, []
+        for _ in range(self.max_attempts):
+            self.attempts += 1
+            move_str = await self.request_move(position, self.attempts)
+            if not move_str:
+                self.tried_moves.append("No valid move provided")
+                continue
+            try:
+                move = position.parse_san(move_str)
+            except ValueError as e:
+                print(f"错误：{e}")
+                self.tried_moves.append(move_str)
+                continue
+            log_round_trips(self.log_files, self.color, self.attempts, self.stats)
+            self.additional_prompt = None
+            return move
+        return None
 
-        # 从回复中提取走法
-        move_str = extract_move_from_reply(reply, current_player)
-        return move_str, False  # is_uci=False
+@players.register_player("Stockfish")
+class StockfishPlayer(players.MovePlayer):
+    """Stockfish 玩家：stockfish 为从引擎池借出的引擎，search 为该方的搜索设置（默认为 STOCKFISH_SETTINGS）"""
 
-    elif current_player_type == 'Stockfish':
+    def __init__(self, color, stockfish=None, search=None, **options):
+        super().__init__(color)
         if stockfish is None:
             raise ValueError("Stockfish 引擎未初始化。")
-        print(f"\n===== {current_player} 的回合 =====")
-
-        # 使用线程来获取 Stockfish 的最佳走法
-        move_str = None
-
-        def get_stockfish_move():
-            nonlocal move_str
-            stockfish.set_fen_position(board.fen())
-            move_str = stockfish.get_best_move()
-
-        thread = threading.Thread(target=get_stockfish_move, daemon=True)
-        thread.start()
-
-        # 在等待 Stockfish 计算时，保持 GUI 响应
-        while thread.is_alive():
-            thread.join(timeout=0.1)
-            if gui_enabled:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                    elif event.type == pygame.MOUSEBUTTONDOWN:
-                        x, y = event.pos
-                        if restart_button.is_clicked((x, y)):
-                            restart_game(board)
-                        elif pause_button.is_clicked((x, y)):
-                            is_paused = not is_paused
-                            pause_button.update_text("Resume" if is_paused else "Pause")
-                        elif stop_button.is_clicked((x, y)):
-                            save_game(board, game_over_message='stopped')
-                            pygame.quit()
-                            sys.exit()
-                        elif flip_button.is_clicked((x, y)):  # 检测Flip按钮点击
-                            board_flipped = not board_flipped
-                            print("棋盘已翻转。")
-                    elif event.type == pygame.MOUSEWHEEL:
-                        handle_mouse_wheel(event)
-
-                # 如果游戏暂停，则暂停线程
-                if is_paused:
-                    thread.join(timeout=0)  # 不再等待线程
-                    while is_paused:
-                        # 绘制棋盘并处理事件
-                        draw_board(board)
-                        pygame.display.flip()
-                        CLOCK.tick(FPS)
-                        for event in pygame.event.get():
-                            if event.type == pygame.QUIT:
-                                pygame.quit()
-                                sys.exit()
-                            elif event.type == pygame.MOUSEBUTTONDOWN:
-                                x, y = event.pos
-                                if pause_button.is_clicked((x, y)):
-                                    is_paused = not is_paused
-                                    pause_button.update_text("Resume" if is_paused else "Pause")
-                                elif restart_button.is_clicked((x, y)):
-                                    restart_game(board)
-                                elif stop_button.is_clicked((x, y)):
-                                    save_game(board, game_over_message='stopped')
-                                    pygame.quit()
-                                    sys.exit()
-                                elif flip_button.is_clicked((x, y)):
-                                    board_flipped = not board_flipped
-                                    print("棋盘已翻转。")
-                            elif event.type == pygame.MOUSEWHEEL:
-                                handle_mouse_wheel(event)
-                    # 重新启动线程
-                    if not thread.is_alive():
-                        thread = threading.Thread(target=get_stockfish_move, daemon=True)
-                        thread.start()
-                else:
-                    draw_board(board)
-                    pygame.display.flip()
-                    CLOCK.tick(FPS)
-
-        if move_str is None:
+        self.stockfish = stockfish
+        self.search = search
+
+    async def choose_move(self, position, clock=None):
+        self.attempts = 1
+        print(f"\n===== {self.color.capitalize()} 的回合 =====")
+        move = await asyncio.to_thread(get_stockfish_move, self.stockfish, position, self.color, self.search, clock)
+        if move is None:
             print("无法从 Stockfish 获取走法。")
-            return None, True  # is_uci=True
-
-        print(f"Stockfish ({current_player}) 走: {move_str}")
-        return move_str, True  # is_uci=True
-
-    else:
-        raise ValueError(f"未知的玩家类型：{current_player_type}")
+        else:
+            print(f"Stockfish ({self.color.capitalize()}) 走: {move.uci()}")
+        return move
+
+def create_players(player_types, stockfish=None, engines=None, settings=None, search_settings=None, **options):
+    """按 {颜色: 玩家类型} 创建双方的玩家。settings / search_settings 为每方的玩家设置和搜索设置，默认为全局设置；
+    engines 为每方本地 UCI 引擎的路径，默认为 UCI_ENGINE_PATH；其余选项原样传给每个玩家"""
+    settings = settings or PLAYER_SETTINGS
+    search_settings = search_settings or STOCKFISH_SETTINGS
+    seats = {}
+    for color, player_type in player_types.items():
+        search = search_settings[color]
+        limit = make_search_limit(search, search.get("clock")) if player_type == 'UCI' else None
+        seats[color] = players.create_player(
+            player_type, color, settings=settings[color], stockfish=stockfish, search=search,
+            engine_path=(engines or {}).get(color) or UCI_ENGINE_PATH, limit=limit, **options
+        )
+    return seats
+
+def get_opening_book():
+    """返回按 OPENING_BOOK_SETTINGS 打开的开局库，未设置 path 时返回 None；path 改变时重新打开"""
+    global OPENING_BOOK
+    path = OPENING_BOOK_SETTINGS["path"]
+    if OPENING_BOOK is not None and OPENING_BOOK.path != path:
+        OPENING_BOOK.close()
+        OPENING_BOOK = None
+    if OPENING_BOOK is None and path:
+        OPENING_BOOK = opening_book.OpeningBook(
+            path, OPENING_BOOK_SETTINGS["max_plies"], OPENING_BOOK_SETTINGS["selection"]
+        )
+    return OPENING_BOOK
+
+def book_move(player, board):
+    """在询问玩家之前按该方的开局库设置查询开局库，返回库内走法（此时不必询问玩家），否则返回 None"""
+    move = opening_book.book_move(get_opening_book(), OPENING_BOOK_SETTINGS[player.color], player, board)
+    if move is not None:
+        player.attempts = 1
+        metrics.incr("book_moves", player=player.name)
+        print(f"开局库 ({player.color.capitalize()}) 走: {move.uci()}")
+    return move
+
+def choose_move_gui(player, board, clocks=None):
+    """在界面中等待玩家走子：人类玩家在主线程中处理鼠标事件，其他玩家在后台线程中运行，完成后发送事件唤醒事件循环；
+    暂停时走法保留到继续为止"""
+    if player.interactive:
+        return asyncio.run(player.choose_move(board, clocks))
+    result = {}
+
+    def run():
+        try:
+            result["move"] = asyncio.run(player.choose_move(board, clocks))
+        except Exception as e:
+            result["error"] = e
+
+    done = run_in_background(run)
+    run_event_loop(board, until=lambda: done.is_set() and not is_paused)
+    if "error" in result:
+        raise result["error"]
+    return result.get("move")
+
+def create_stockfish(path=None):
+    """启动 Stockfish 引擎（chess.engine 的 UCI 连接）"""
+    return engine_pool.UciEngine(path or STOCKFISH_PATH, {"Hash": 32, "Threads": 2})
+
+def make_search_limit(settings, clock=None):
+    """根据一方的搜索设置生成 chess.engine.Limit；多个限制同时设置时以先达到的为准，clock 为该方棋钟的剩余秒数"""
+    limit = chess.engine.Limit()
+    if settings.get("depth"):
+        limit.depth = settings["depth"]
+    if settings.get("nodes"):
+        limit.nodes = settings["nodes"]
+    if settings.get("movetime"):
+        limit.time = settings["movetime"] / 1000
+    if clock is None and limit == chess.engine.Limit():
+        raise ValueError("Stockfish 的搜索设置中至少需要 depth、nodes、movetime 或 clock 之一。")
+    if clock is not None:
+        # 引擎只根据己方的剩余时间分配用时，对方的棋钟按相同时间填写
+        increment = settings.get("increment") or 0
+        limit.white_clock = limit.black_clock = clock
+        limit.white_inc = limit.black_inc = increment
+    return limit
+
+def get_stockfish_move(stockfish, board, player_color=None, settings=None, clocks=None):
+    """让 Stockfish 按该方的搜索设置在当前局面搜索并返回走法（chess.Move），没有走法时返回 None。
+
+    同一对局内每步只发送 position startpos moves ...，引擎保留置换表和重复局面历史。
+    设置了棋钟时，clocks 记录该方的剩余时间，每步扣除实际用时并加上加秒；
+    开启 ponder 时引擎在返回走法后继续在对方的时间里思考，对方走出预测的着法时直接命中。
+    """
+    player_color = player_color or ('white' if board.turn else 'black')
+    settings = settings if settings is not None else STOCKFISH_SETTINGS[player_color]
+    clocks = clocks if clocks is not None else STOCKFISH_CLOCKS
+    clock = None
+    if settings.get("clock"):
+        clock = clocks.setdefault(player_color, settings["clock"])
+    start_time = time.perf_counter()
+    with metrics.timer("engine_search_seconds"):
+        result = stockfish.play(board.copy(), make_search_limit(settings, clock), ponder=settings.get("ponder", False))
+    if clock is not None:
+        clocks[player_color] = max(clock - (time.perf_counter() - start_time), 0.0) + (settings.get("increment") or 0)
+    return result.move
+
+# 进程内共用的 Stockfish 引擎池，首次需要引擎时创建
+ENGINE_POOL = None
+
+def get_engine_pool(path=None):
+    """返回进程内的引擎池，引擎在多盘棋和重新开始之间复用，进程退出时自动关闭"""
+    global ENGINE_POOL
+    if ENGINE_POOL is None:
+        ENGINE_POOL = engine_pool.EnginePool(lambda: create_stockfish(path=path))
+    return ENGINE_POOL
+
+def start_analysis(board, settings=None, path=None):
+    """从引擎池借出一个引擎，启动后台分析服务并提交 board 的当前局面"""
+    settings = settings or ANALYSIS_SETTINGS
+    service = analysis.AnalysisService(
+        get_engine_pool(path).acquire(), settings["depth"], settings["movetime"], settings["multipv"],
+        notify=lambda: post_event(ANALYSIS_EVENT)
+    )
+    service.submit(board)
+    return service
+
+def stop_analysis(service):
+    """停止分析服务并把引擎归还引擎池"""
+    service.close()
+    get_engine_pool().release(service.engine)
+
+def restart_analysis(board):
+    """新对局开始时结束上一盘的分析，启用分析时重新开始"""
+    global ANALYSIS
+    if ANALYSIS is not None:
+        stop_analysis(ANALYSIS)
+        ANALYSIS = None
+    if ANALYSIS_SETTINGS["enabled"]:
+        ANALYSIS = start_analysis(board)
 
 def check_game_over(board):
     """检查游戏是否结束，并返回相应的消息"""
@@ -620,7 +1223,7 @@ def check_game_over(board):
         return None
 
 def human_player_move_cli(board):
-    """处理人类玩家的命令行输入，返回标准代数记谱法的走法"""
+    """处理人类玩家的命令行输入，返回合法的走法（chess.Move）"""
     while True:
         move_input = input("请输入你的走法（例如 e2e4 或 Nf3）： ").strip()
         try:
@@ -629,97 +1232,58 @@ def human_player_move_cli(board):
             else:
                 move = board.parse_san(move_input)
             if move in board.legal_moves:
-                return board.san(move)
+                return move
             else:
                 print("非法走法，请重新输入。")
         except ValueError:
             print("输入格式错误，请重新输入。")
 
 def human_player_move_gui(board):
-    """处理人类玩家的鼠标事件，返回标准代数记谱法的走法（使用GUI）"""
-    move_made = False
-    dragging = False
-    drag_piece = None
-    from_square = None
-    mouse_x, mouse_y = 0, 0
-
-    global is_paused, board_flipped  # 引入全局变量 is_paused 和 board_flipped
-
-    while not move_made:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                x, y = event.pos
-                if restart_button.is_clicked((x, y)):
-                    restart_game(board)
-                elif pause_button.is_clicked((x, y)):
-                    is_paused = not is_paused
-                    pause_button.update_text("Resume" if is_paused else "Pause")
-                elif stop_button.is_clicked((x, y)):
-                    save_game(board, game_over_message='stopped')
-                    pygame.quit()
-                    sys.exit()
-                elif flip_button.is_clicked((x, y)):  # 检测Flip按钮点击
-                    board_flipped = not board_flipped
-                    print("棋盘已翻转。")
-                else:
-                    if not is_paused:
-                        if x >= board_x and x < board_x + SQUARE_SIZE*8 and y >= board_y and y < board_y + SQUARE_SIZE*8:
-                            adjusted_x = x - board_x
-                            adjusted_y = y - board_y
-                            if board_flipped:
-                                col = 7 - (adjusted_x // SQUARE_SIZE)
-                                row = 7 - (adjusted_y // SQUARE_SIZE)
-                            else:
-                                col = adjusted_x // SQUARE_SIZE
-                                row = adjusted_y // SQUARE_SIZE
-                            from_square = chess.square(col, 7 - row)
-                            piece = board.piece_at(from_square)
-                            if piece and (
-                                (piece.color == chess.WHITE and board.turn) or
-                                (piece.color == chess.BLACK and not board.turn)
-                            ):
-                                dragging = True
-                                drag_piece = piece
-                                mouse_x, mouse_y = event.pos
-            elif event.type == pygame.MOUSEMOTION and dragging and not is_paused:
-                mouse_x, mouse_y = event.pos
-            elif event.type == pygame.MOUSEBUTTONUP and dragging and not is_paused:
-                x, y = event.pos
-                if x >= board_x and x < board_x + SQUARE_SIZE*8 and y >= board_y and y < board_y + SQUARE_SIZE*8:
-                    adjusted_x = x - board_x
-                    adjusted_y = y - board_y
-                    if board_flipped:
-                        col = 7 - (adjusted_x // SQUARE_SIZE)
-                        row = 7 - (adjusted_y // SQUARE_SIZE)
-                    else:
-                        col = adjusted_x // SQUARE_SIZE
-                        row = adjusted_y // SQUARE_SIZE
-                    to_square = chess.square(col, 7 - row)
-                    move = chess.Move(from_square, to_square)
-                    if chess.Move(from_square, to_square, promotion=chess.QUEEN) in board.legal_moves:
-                        # 处理兵的升变
-                        promotion = 'q'  # 为简化，直接升变为皇后
-                        move = chess.Move(from_square, to_square, promotion=chess.QUEEN)
-                    if move in board.legal_moves:
-                        san_move = board.san(move)
-                        move_made = True
-                        return san_move
-                    else:
-                        print("非法走法，请重新选择。")
+    """处理人类玩家的鼠标事件，返回合法的走法（chess.Move，使用GUI）"""
+    state = {"dragging": False, "drag_piece": None, "from_square": None, "mouse": (0, 0), "move": None}
+
+    def square_at(x, y):
+        """鼠标位置对应的格子，不在棋盘内时返回 None"""
+        if not (board_x <= x < board_x + SQUARE_SIZE*8 and board_y <= y < board_y + SQUARE_SIZE*8):
+            return None
+        col = (x - board_x) // SQUARE_SIZE
+        row = (y - board_y) // SQUARE_SIZE
+        if board_flipped:
+            col, row = 7 - col, 7 - row
+        return chess.square(col, 7 - row)
+
+    def on_event(event):
+        if is_paused:
+            return
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            from_square = square_at(*event.pos)
+            piece = board.piece_at(from_square) if from_square is not None else None
+            if piece and piece.color == board.turn:
+                state.update(dragging=True, drag_piece=piece, from_square=from_square, mouse=event.pos)
+        elif event.type == pygame.MOUSEMOTION and state["dragging"]:
+            state["mouse"] = event.pos
+        elif event.type == pygame.MOUSEBUTTONUP and state["dragging"]:
+            to_square = square_at(*event.pos)
+            if to_square is not None:
+                move = chess.Move(state["from_square"], to_square)
+                if chess.Move(state["from_square"], to_square, promotion=chess.QUEEN) in board.legal_moves:
+                    # 处理兵的升变，为简化，直接升变为皇后
+                    move = chess.Move(state["from_square"], to_square, promotion=chess.QUEEN)
+                if move in board.legal_moves:
+                    state["move"] = move
                 else:
-                    print("移动超出范围。")
-                dragging = False
-                drag_piece = None
-            elif event.type == pygame.MOUSEWHEEL:
-                handle_mouse_wheel(event)
-
-        draw_board(board, dragging, drag_piece, mouse_x, mouse_y, from_square)
-        pygame.display.flip()
-        CLOCK.tick(FPS)
-    return None
+                    print("非法走法，请重新选择。")
+            else:
+                print("移动超出范围。")
+            state.update(dragging=False, drag_piece=None)
+
+    run_event_loop(
+        board,
+        until=lambda: state["move"] is not None,
+        on_event=on_event,
+        draw_args=lambda: (state["dragging"], state["drag_piece"], *state["mouse"], state["from_square"]),
+    )
+    return state["move"]
 
 # 定义一个变量来跟踪游戏历史滚动位置
 history_scroll = 0
@@ -732,76 +1296,301 @@ def handle_mouse_wheel(event):
     # 限制滚动范围
     history_scroll = max(min(history_scroll, 0), -max(0, history_content_height - history_view_height))
 
-def draw_board(board, dragging=False, drag_piece=None, mouse_x=0, mouse_y=0, from_square=None, game_over_message=None):
-    """绘制棋盘和棋子（仅在启用GUI时调用）"""
-    SCREEN.fill(BG_COLOR)
-    # 绘制棋盘背景
-    board_rect = pygame.Rect(board_x, board_y, SQUARE_SIZE*8, SQUARE_SIZE*8)
-    pygame.draw.rect(SCREEN, PANEL_COLOR, board_rect)
-
-    # 绘制棋盘格子
-    for rank in range(8):
-        for file in range(8):
-            # 根据board_flipped状态调整绘制顺序
+class BoardRenderer:
+    """分层缓存的渲染器：静态背景、棋子层和历史记录层只在内容变化时重建，每帧只返回需要刷新的脏矩形"""
+
+    def __init__(self, screen):
+        self.screen = screen
+        width, height = screen.get_size()
+        # 三个刷新区域：左侧棋盘区、右侧按钮/历史栏、底部状态栏
+        self.board_area = pygame.Rect(0, 0, 800, height - 40)
+        self.sidebar_rect = pygame.Rect(800, 0, width - 800, height - 40)
+        self.status_bar_rect = pygame.Rect(0, height - 40, width, 40)
+        self.background = self._build_background()
+        self.piece_layer = pygame.Surface((SQUARE_SIZE*8, SQUARE_SIZE*8), pygame.SRCALPHA)
+        self._piece_key = None
+        self.history_surface = None
+        self._history_key = None
+        self._overlay_cache = (None, None, None)
+        self.analysis_rect = pygame.Rect(975, 400, width - 985, 260)
+        self.invalidate()
+
+    def invalidate(self):
+        """强制下一帧整屏重绘（例如其他界面覆盖过屏幕之后）"""
+        self._region_keys = {}
+
+    def _build_background(self):
+        """绘制不随对局变化的部分：背景、棋盘格子、边框、侧栏和状态栏底色"""
+        background = pygame.Surface(self.screen.get_size())
+        background.fill(BG_COLOR)
+        board_rect = pygame.Rect(board_x, board_y, SQUARE_SIZE*8, SQUARE_SIZE*8)
+        pygame.draw.rect(background, PANEL_COLOR, board_rect)
+        # 翻转不改变格子颜色的排列，因此背景与翻转状态无关
+        for rank in range(8):
+            for file in range(8):
+                color = LIGHT_SQUARE_COLOR if (rank + file) % 2 == 0 else DARK_SQUARE_COLOR
+                rect = pygame.Rect(board_x + file*SQUARE_SIZE, board_y + rank*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                pygame.draw.rect(background, color, rect)
+        pygame.draw.rect(background, HIGHLIGHT_COLOR, board_rect, 2)
+        pygame.draw.rect(background, PANEL_COLOR, pygame.Rect(800, 0, 300, background.get_height()))
+        pygame.draw.rect(background, PANEL_COLOR, self.status_bar_rect)
+        return background
+
+    def _update_piece_layer(self, board, hidden_square):
+        """仅在局面、翻转状态或被拖动的棋子变化时重建棋子层"""
+        key = (board.board_fen(), board_flipped, hidden_square)
+        if key == self._piece_key:
+            return key
+        self._piece_key = key
+        self.piece_layer.fill((0, 0, 0, 0))
+        for square, piece in board.piece_map().items():
+            if square == hidden_square:
+                continue
+            file, rank = chess.square_file(square), 7 - chess.square_rank(square)
             if board_flipped:
-                display_rank = 7 - rank
-                display_file = 7 - file
+                file, rank = 7 - file, 7 - rank
+            self.piece_layer.blit(PIECE_IMAGES[piece.symbol()], (file*SQUARE_SIZE, rank*SQUARE_SIZE))
+        return key
+
+    def _update_history_surface(self, board):
+        """仅在有新走法（或撤销）时重建历史记录层"""
+        global history_content_height
+        record = GAME_RECORD.sync(board)
+        key = record.version
+        if key == self._history_key:
+            return key
+        self._history_key = key
+
+        font = get_font("Consolas", 20)
+        max_width = self.screen.get_width() - 820 - 30  # 留出一些边距
+        # 先按宽度把游戏历史分割为多行，再按内容高度创建表面
+        wrapped_lines = []
+        for line in record.text.split('\n') if record.text else []:
+            rendered_line = ''
+            for word in line.split(' '):
+                test_line = rendered_line + word + ' '
+                if font.size(test_line)[0] > max_width and rendered_line:
+                    wrapped_lines.append(rendered_line)
+                    rendered_line = word + ' '
+                else:
+                    rendered_line = test_line
+            if rendered_line:
+                wrapped_lines.append(rendered_line)
+
+        history_content_height = len(wrapped_lines) * 25  # 更新内容总高度
+        self.history_surface = pygame.Surface((max_width, max(history_content_height, 1)), pygame.SRCALPHA)
+        self.history_surface.fill((0, 0, 0, 0))  # 全透明背景
+        for i, line in enumerate(wrapped_lines):
+            self.history_surface.blit(render_text(line, "Consolas", 20), (0, i * 25))
+        return key
+
+    def _overlay(self, game_over_message):
+        """游戏结束时覆盖在屏幕中央的提示"""
+        if self._overlay_cache[0] != game_over_message:
+            text_surface = render_text(game_over_message, "Arial", 60)
+            text_rect = text_surface.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2))
+            overlay = pygame.Surface((text_rect.width + 40, text_rect.height + 40))
+            overlay.set_alpha(180)
+            overlay.fill(BLACK_COLOR)
+            overlay.blit(text_surface, (20, 20))
+            self._overlay_cache = (game_over_message, overlay, overlay.get_rect(center=text_rect.center))
+        return self._overlay_cache[1], self._overlay_cache[2]
+
+    def draw(self, board, dragging=False, drag_piece=None, mouse_x=0, mouse_y=0, from_square=None, game_over_message=None):
+        """绘制有变化的区域，返回需要传给 pygame.display.update 的脏矩形列表"""
+        piece_key = self._update_piece_layer(board, from_square if dragging else None)
+        history_key = self._update_history_surface(board)
+        analysis_key = None
+        if ANALYSIS is not None:
+            ANALYSIS.poll()
+            analysis_key = ANALYSIS.latest
+
+        mouse_pos = pygame.mouse.get_pos()
+        buttons = [restart_button, pause_button, stop_button, flip_button]
+        for button in buttons:
+            button.check_hover(mouse_pos)
+
+        if game_over_message:
+            status_text = game_over_message
+        else:
+            current_player = "White" if board.turn else "Black"
+            status_text = f"{current_player}'s turn"
+
+        region_keys = {
+            'board': (piece_key, (mouse_x, mouse_y, drag_piece) if dragging else None, game_over_message),
+            'sidebar': (history_key, history_scroll, tuple((b.text, b.hovered) for b in buttons), analysis_key,
+                        game_over_message),
+            'status': (status_text, game_over_message),
+        }
+        regions = {'board': self.board_area, 'sidebar': self.sidebar_rect, 'status': self.status_bar_rect}
+        dirty_rects = []
+        for name, key in region_keys.items():
+            if self._region_keys.get(name) == key:
+                continue
+            self._region_keys[name] = key
+            rect = regions[name]
+            self.screen.set_clip(rect)
+            self.screen.blit(self.background, rect, area=rect)
+            if name == 'board':
+                self.screen.blit(self.piece_layer, (board_x, board_y))
+                if dragging and drag_piece:
+                    img = PIECE_IMAGES[drag_piece.symbol()]
+                    self.screen.blit(img, img.get_rect(center=(mouse_x, mouse_y)))
+            elif name == 'sidebar':
+                for button in buttons:
+                    button.draw(self.screen)
+                self._draw_history()
+                if analysis_key is not None:
+                    self._draw_analysis(analysis_key)
             else:
-                display_rank = rank
-                display_file = file
-            color = LIGHT_SQUARE_COLOR if (display_rank + display_file) % 2 == 0 else DARK_SQUARE_COLOR
-            rect = pygame.Rect(board_x + display_file*SQUARE_SIZE, board_y + display_rank*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-            pygame.draw.rect(SCREEN, color, rect)
-            square = chess.square(file, 7 - rank)
-            piece = board.piece_at(square)
-            if piece:
-                if dragging and square == from_square:
-                    continue
-                SCREEN.blit(PIECE_IMAGES[piece.symbol()], rect)
-    if dragging and drag_piece:
-        img = PIECE_IMAGES[drag_piece.symbol()]
-        img_rect = img.get_rect(center=(mouse_x, mouse_y))
-        SCREEN.blit(img, img_rect)
-
-    # 绘制边框
-    pygame.draw.rect(SCREEN, HIGHLIGHT_COLOR, board_rect, 2)
-
-    # 绘制按钮区域背景
-    sidebar_rect = pygame.Rect(800, 0, 300, SCREEN.get_height())
-    pygame.draw.rect(SCREEN, PANEL_COLOR, sidebar_rect)
-
-    # 绘制按钮
-    mouse_pos = pygame.mouse.get_pos()
-    for button in [restart_button, pause_button, stop_button, flip_button]:
-        button.check_hover(mouse_pos)
-        button.draw(SCREEN)
-
-    # 绘制游戏历史记录
-    draw_game_history(board)
-
-    # 绘制状态栏
-    status_bar_rect = pygame.Rect(0, SCREEN.get_height() - 40, SCREEN.get_width(), 40)
-    pygame.draw.rect(SCREEN, PANEL_COLOR, status_bar_rect)
-    font = pygame.font.SysFont("Arial", 24)
-    if game_over_message:
-        status_text = game_over_message
-    else:
-        current_player = "White" if board.turn else "Black"
-        status_text = f"{current_player}'s turn"
-    text_surface = font.render(status_text, True, TEXT_COLOR)
-    text_rect = text_surface.get_rect(center=status_bar_rect.center)
-    SCREEN.blit(text_surface, text_rect)
-
-    if game_over_message:
-        font = pygame.font.SysFont("Arial", 60)
-        text_surface = font.render(game_over_message, True, TEXT_COLOR)
-        text_rect = text_surface.get_rect(center=(SCREEN.get_width() // 2, SCREEN.get_height() // 2))
-        overlay = pygame.Surface((text_rect.width + 40, text_rect.height + 40))
-        overlay.set_alpha(180)
-        overlay.fill(BLACK_COLOR)
-        overlay_rect = overlay.get_rect(center=text_rect.center)
-        SCREEN.blit(overlay, overlay_rect)
-        SCREEN.blit(text_surface, text_rect)
+                text_surface = render_text(status_text, "Arial", 24)
+                self.screen.blit(text_surface, text_surface.get_rect(center=rect.center))
+            if game_over_message:
+                overlay, overlay_rect = self._overlay(game_over_message)
+                self.screen.blit(overlay, overlay_rect)
+            self.screen.set_clip(None)
+            dirty_rects.append(rect)
+        return dirty_rects
+
+    def _draw_history(self):
+        """将缓存的历史记录层按滚动位置绘制到侧栏，并绘制滚动条"""
+        x = 820  # 游戏历史记录的起始 x 坐标
+        y = 50   # 游戏历史记录的起始 y 坐标
+        max_width = self.history_surface.get_width()
+        clip_rect = pygame.Rect(0, -history_scroll, max_width, history_view_height)
+        self.screen.blit(self.history_surface, (x + 10, y), area=clip_rect)
+
+        if history_content_height > history_view_height:
+            scrollbar_height = history_view_height * history_view_height / history_content_height
+            scrollbar_y = y + (-history_scroll) * history_view_height / history_content_height
+            scrollbar_rect = pygame.Rect(x + max_width + 15, scrollbar_y, 10, scrollbar_height)
+            pygame.draw.rect(self.screen, HIGHLIGHT_COLOR, scrollbar_rect)
+
+    def _draw_analysis(self, evaluation):
+        """在按钮右侧绘制最新的分析：评估、深度和每条 PV 的前几步"""
+        font = get_font("Consolas", 14)
+        x, y = self.analysis_rect.topleft
+        lines = [f"Eval {analysis.format_score(evaluation)}", f"Depth {evaluation['depth']}"]
+        for line in evaluation["lines"]:
+            lines.append(f"{line['multipv']}) {analysis.format_score(line)}")
+            text = ''
+            for word in line["pv"].split(' '):
+                if font.size(text + word)[0] > self.analysis_rect.width:
+                    break
+                text += word + ' '
+            lines.append(text)
+        for i, text in enumerate(lines):
+            if (i + 1) * 18 > self.analysis_rect.height:
+                break
+            self.screen.blit(render_text(text, "Consolas", 14), (x, y + i * 18))
+
+# 当前屏幕对应的渲染器，在 initialize_gui 中重置
+RENDERER = None
+
+def invalidate_display():
+    """窗口被遮挡或重新显示后，下一帧整屏重绘"""
+    if RENDERER is not None:
+        RENDERER.invalidate()
+
+def draw_board(board, dragging=False, drag_piece=None, mouse_x=0, mouse_y=0, from_square=None, game_over_message=None):
+    """绘制棋盘和棋子（仅在启用GUI时调用），返回需要刷新的脏矩形，配合 pygame.display.update 使用"""
+    global RENDERER
+    start_time = time.perf_counter()
+    if RENDERER is None or RENDERER.screen is not SCREEN:
+        RENDERER = BoardRenderer(SCREEN)
+    dirty_rects = RENDERER.draw(board, dragging, drag_piece, mouse_x, mouse_y, from_square, game_over_message)
+    elapsed = time.perf_counter() - start_time
+    FRAME_STATS.record(elapsed)
+    metrics.observe("frame_render_seconds", elapsed)
+    return dirty_rects
+
+def post_event(event_type):
+    """从任意线程发送自定义事件；窗口已关闭（例如重新开始之后）时忽略"""
+    if ENABLE_GUI and event_type is not None and pygame.get_init():
+        try:
+            pygame.event.post(pygame.event.Event(event_type))
+        except pygame.error:
+            pass
+
+def run_in_background(target):
+    """在守护线程中运行 target，结束后发送 MOVE_READY_EVENT；返回 target 结束时被设置的 threading.Event"""
+    done = threading.Event()
+
+    def worker():
+        try:
+            target()
+        finally:
+            done.set()
+            post_event(MOVE_READY_EVENT)
+
+    threading.Thread(target=worker, daemon=True).start()
+    return done
+
+def handle_common_event(board, event, game_over=False):
+    """处理所有界面共用的事件：关闭窗口、Restart / Pause / Stop / Flip 按钮、滚轮和窗口重绘，返回事件是否已被处理。
+    game_over 为 True 时重新开始不再保存棋局（已经保存过），暂停按钮无效"""
+    global is_paused, board_flipped, timestamp
+    if event.type == pygame.QUIT:
+        pygame.quit()
+        sys.exit()
+    elif event.type == pygame.MOUSEBUTTONDOWN:
+        pos = event.pos
+        if restart_button.is_clicked(pos):
+            if not game_over:
+                restart_game(board)
+            # 游戏结束后重启，生成新的时间戳
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            pygame.quit()
+            raise RestartGameException()
+        elif stop_button.is_clicked(pos):
+            if not game_over:
+                save_game(board, game_over_message='stopped')
+            pygame.quit()
+            sys.exit()
+        elif flip_button.is_clicked(pos):
+            board_flipped = not board_flipped
+            print("棋盘已翻转。")
+        elif pause_button.is_clicked(pos) and not game_over:
+            is_paused = not is_paused
+            pause_button.update_text("Resume" if is_paused else "Pause")
+        else:
+            return False
+        return True
+    elif event.type == pygame.MOUSEWHEEL:
+        handle_mouse_wheel(event)
+        return True
+    elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+        invalidate_display()
+        return True
+    return False
+
+def run_event_loop(board, until=lambda: False, on_event=None, draw_args=None, game_over_message=None):
+    """中心事件循环：重绘有变化的区域后阻塞在 pygame.event.wait 上，直到 until() 返回 True。
+
+    后台任务结束和分析更新都通过自定义事件唤醒循环，没有事件时不占用 CPU；共用事件由 handle_common_event 处理，
+    其余事件交给 on_event；draw_args() 返回传给 draw_board 的拖动参数。
+    """
+    woke = None
+    while True:
+        pygame.display.update(draw_board(board, *(draw_args() if draw_args else ()), game_over_message=game_over_message))
+        if woke is not None:
+            # 从被唤醒到处理完事件、画完这一帧超过一帧的时间，说明界面没有及时响应
+            dropped = int((time.perf_counter() - woke) * FPS)
+            if dropped:
+                metrics.incr("frames_dropped", dropped)
+        if until():
+            return
+        events = [pygame.event.wait()]
+        woke = time.perf_counter()
+        events.extend(pygame.event.get())
+        for event in events:
+            if not handle_common_event(board, event, game_over_message is not None) and on_event is not None:
+                on_event(event)
+
+def dispatch_pending_events(board):
+    """不阻塞地处理已到达的事件，用于两步之间（例如随机玩家立即走子时）保持窗口响应"""
+    for event in pygame.event.get():
+        handle_common_event(board, event)
 
 # 定义棋盘的位置（调整y坐标，避免被状态栏遮挡）
 board_x = 50
@@ -811,66 +1600,16 @@ board_y = 30
 history_view_height = 350
 history_content_height = 0  # 游戏历史内容的总高度
 
-def draw_game_history(board):
-    """在屏幕右侧绘制游戏历史记录，并处理文本换行和滚动。"""
-    global history_content_height
-    game_history = generate_game_record(board)
-    x = 820  # 游戏历史记录的起始 x 坐标
-    y = 50   # 游戏历史记录的起始 y 坐标
-
-    # 定义字体
-    font = pygame.font.SysFont("Consolas", 20)
-    max_width = SCREEN.get_width() - x - 30  # 留出一些边距
-
-    # 创建一个新的表面来绘制游戏历史
-    history_surface = pygame.Surface((max_width, 1000), pygame.SRCALPHA)
-    history_surface.fill((0, 0, 0, 0))  # 全透明背景
-
-    # 将游戏历史分割为多行
-    lines = game_history.split('\n')
-    content_y = 0
-    for line in lines:
-        # 检查文本宽度，处理换行
-        words = line.split(' ')
-        rendered_line = ''
-        for word in words:
-            test_line = rendered_line + word + ' '
-            text_surface = font.render(test_line, True, TEXT_COLOR)
-            if text_surface.get_width() > max_width:
-                # 绘制当前行，并开始新行
-                text_surface = font.render(rendered_line, True, TEXT_COLOR)
-                history_surface.blit(text_surface, (0, content_y))
-                content_y += 25
-                rendered_line = word + ' '
-            else:
-                rendered_line = test_line
-        # 绘制剩余的文本
-        if rendered_line:
-            text_surface = font.render(rendered_line, True, TEXT_COLOR)
-            history_surface.blit(text_surface, (0, content_y))
-            content_y += 25
-
-    history_content_height = content_y  # 更新内容总高度
-
-    # 定义显示区域的矩形
-    clip_rect = pygame.Rect(0, -history_scroll, max_width, history_view_height)
-    # 将历史记录表面绘制到屏幕上，应用剪辑
-    SCREEN.blit(history_surface, (x + 10, y), area=clip_rect)
-
-    # 绘制滚动条（可选）
-    if history_content_height > history_view_height:
-        scrollbar_height = history_view_height * history_view_height / history_content_height
-        scrollbar_y = y + (-history_scroll) * history_view_height / history_content_height
-        scrollbar_rect = pygame.Rect(x + max_width + 15, scrollbar_y, 10, scrollbar_height)
-        pygame.draw.rect(SCREEN, HIGHLIGHT_COLOR, scrollbar_rect)
+def menu_player_types():
+    """界面和命令行菜单中可选的玩家类型；只有设置了 UCI_ENGINE_PATH 时才提供 UCI 玩家"""
+    return [name for name in ('Human', 'ChatGPT', 'Stockfish', 'Random', 'Greedy', 'AlphaBeta', 'UCI')
+            if name != 'UCI' or UCI_ENGINE_PATH]
 
 def select_player_types_gui():
     """使用GUI界面让用户选择白方和黑方的玩家类型"""
     global white_player_type, black_player_type
 
-    player_types = ['Human', 'ChatGPT', 'Stockfish']
-    font = pygame.font.SysFont("Arial", 30)
-    big_font = pygame.font.SysFont("Arial", 50)
+    player_types = menu_player_types()
 
     button_width = 200
     button_height = 50
@@ -880,40 +1619,26 @@ def select_player_types_gui():
     screen_center_x = SCREEN.get_width() // 2
 
     for i, player_type in enumerate(player_types):
-        white_rect = pygame.Rect(screen_center_x - 250, 200 + i * (button_height + 20), button_width, button_height)
+        white_rect = pygame.Rect(screen_center_x - 250, 200 + i * (button_height + 10), button_width, button_height)
         white_buttons.append((white_rect, player_type))
-        black_rect = pygame.Rect(screen_center_x + 50, 200 + i * (button_height + 20), button_width, button_height)
+        black_rect = pygame.Rect(screen_center_x + 50, 200 + i * (button_height + 10), button_width, button_height)
         black_buttons.append((black_rect, player_type))
 
-    start_button_rect = pygame.Rect(screen_center_x - 100, 450, 200, 60)
+    start_button_rect = pygame.Rect(screen_center_x - 100, 220 + len(player_types) * (button_height + 10), 200, 60)
     selecting = True
 
     while selecting:
         SCREEN.fill(BG_COLOR)
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                x, y = event.pos
-                for rect, player_type in white_buttons:
-                    if rect.collidepoint(x, y):
-                        white_player_type = player_type
-                for rect, player_type in black_buttons:
-                    if rect.collidepoint(x, y):
-                        black_player_type = player_type
-                if white_player_type and black_player_type and start_button_rect.collidepoint(x, y):
-                    selecting = False
 
-        title_text = big_font.render("Select Player Types", True, TEXT_COLOR)
+        title_text = render_text("Select Player Types", "Arial", 50)
         title_rect = title_text.get_rect(center=(screen_center_x, 80))
         SCREEN.blit(title_text, title_rect)
 
-        white_title = font.render("White", True, TEXT_COLOR)
+        white_title = render_text("White", "Arial", 30)
         white_title_rect = white_title.get_rect(center=(screen_center_x - 150, 160))
         SCREEN.blit(white_title, white_title_rect)
 
-        black_title = font.render("Black", True, TEXT_COLOR)
+        black_title = render_text("Black", "Arial", 30)
         black_title_rect = black_title.get_rect(center=(screen_center_x + 150, 160))
         SCREEN.blit(black_title, black_title_rect)
 
@@ -922,7 +1647,7 @@ def select_player_types_gui():
             is_selected = white_player_type == player_type
             color = BUTTON_HOVER_COLOR if rect.collidepoint(mouse_pos) else BUTTON_COLOR
             pygame.draw.rect(SCREEN, color if not is_selected else HIGHLIGHT_COLOR, rect, border_radius=10)
-            text_surface = font.render(player_type, True, TEXT_COLOR)
+            text_surface = render_text(player_type, "Arial", 30)
             text_rect = text_surface.get_rect(center=rect.center)
             SCREEN.blit(text_surface, text_rect)
 
@@ -930,19 +1655,34 @@ def select_player_types_gui():
             is_selected = black_player_type == player_type
             color = BUTTON_HOVER_COLOR if rect.collidepoint(mouse_pos) else BUTTON_COLOR
             pygame.draw.rect(SCREEN, color if not is_selected else HIGHLIGHT_COLOR, rect, border_radius=10)
-            text_surface = font.render(player_type, True, TEXT_COLOR)
+            text_surface = render_text(player_type, "Arial", 30)
             text_rect = text_surface.get_rect(center=rect.center)
             SCREEN.blit(text_surface, text_rect)
 
         if white_player_type and black_player_type:
             color = BUTTON_HOVER_COLOR if start_button_rect.collidepoint(mouse_pos) else BUTTON_COLOR
             pygame.draw.rect(SCREEN, color, start_button_rect, border_radius=10)
-            start_text = font.render("Start Game", True, TEXT_COLOR)
+            start_text = render_text("Start Game", "Arial", 30)
             start_text_rect = start_text.get_rect(center=start_button_rect.center)
             SCREEN.blit(start_text, start_text_rect)
 
         pygame.display.flip()
-        CLOCK.tick(FPS)
+
+        # 画面只在鼠标移动或点击后变化，没有事件时阻塞等待
+        for event in [pygame.event.wait()] + pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                x, y = event.pos
+                for rect, player_type in white_buttons:
+                    if rect.collidepoint(x, y):
+                        white_player_type = player_type
+                for rect, player_type in black_buttons:
+                    if rect.collidepoint(x, y):
+                        black_player_type = player_type
+                if white_player_type and black_player_type and start_button_rect.collidepoint(x, y):
+                    selecting = False
 
 def restart_game(board):
     """保存当前游戏记录并重启游戏"""
@@ -956,16 +1696,25 @@ def restart_game(board):
     pygame.quit()
     raise RestartGameException()
 
-def save_game(board, game_over_message):
-    """保存当前棋局到文件"""
-    white_player_name = white_player_type
-    black_player_name = black_player_type
+def save_game(board, game_over_message, white_player_name=None, black_player_name=None, game_timestamp=None,
+              evaluations=None, result=None, models=None, record=None):
+    """保存当前棋局到文本文件和同名的 PGN 文件，未指定玩家名和时间戳时使用当前对局的全局设置；
+    evaluations 为各局面的分析结果，未指定时使用当前分析服务的结果（对局正常结束时等待分析完成）；
+    result、models（双方模型名）和 record（含每步用时的对局记录）写入 PGN"""
+    white_player_name = white_player_name or white_player_type
+    black_player_name = black_player_name or black_player_type
+    game_timestamp = game_timestamp or timestamp
     # 将 game_over_message 中的空格和特殊字符替换为下划线
     sanitized_message = re.sub(r'\s+', '_', game_over_message)
     sanitized_message = re.sub(r'[^\w\-]', '', sanitized_message)
-    game_record_file = f'{white_player_name}_vs_{black_player_name}_{sanitized_message}_{timestamp}.txt'
+    game_record_file = f'{white_player_name}_vs_{black_player_name}_{sanitized_message}_{game_timestamp}.txt'
     final_board_diagram = generate_board_diagram(board)
-    game_record = generate_game_record(board)
+    record = (record if record is not None else GAME_RECORD).sync(board)
+    game_record = record.text
+    if evaluations is None and ANALYSIS is not None:
+        if game_over_message not in ('stopped', 'restart'):
+            ANALYSIS.wait()
+        evaluations = dict(ANALYSIS.evaluations)
     with open(game_record_file, 'w', encoding='utf-8') as f:
         if game_over_message == 'restart':
             f.write("当前棋局（重新开始前）：\n")
@@ -974,11 +1723,37 @@ def save_game(board, game_over_message):
         f.write(final_board_diagram + '\n')
         f.write("\n对局记录：\n")
         f.write(game_record + '\n')
+        if evaluations:
+            f.write("\n分析（Stockfish）：\n")
+            f.write(analysis.format_analysis(board, evaluations) + '\n')
+    if models is None:
+        models = {color: PLAYER_SETTINGS[color]["model"]
+                  for color, name in (('white', white_player_name), ('black', black_player_name)) if name == 'ChatGPT'}
+    pgn_game = pgn_io.build_game(
+        board, white_player_name, black_player_name, result,
+        None if game_over_message in ('stopped', 'restart') else game_over_message,
+        models, record.move_times, evaluations,
+    )
+    pgn_io.write_pgn(game_record_file[:-len('.txt')] + '.pgn', pgn_game)
     print(f"游戏记录已保存到 {game_record_file}")
+    if ENABLE_GUI:
+        print(FRAME_STATS.summary())
+    return game_record_file
+
+def load_start_board():
+    """第一盘棋的棋盘：设置了 RESUME_SETTINGS["path"] 时从 PGN 中指定的半回合继续，否则为初始局面"""
+    if not RESUME_SETTINGS["path"]:
+        return chess.Board()
+    board, pgn_game = pgn_io.load_game(RESUME_SETTINGS["path"], RESUME_SETTINGS["index"], RESUME_SETTINGS["ply"])
+    print(f"从 {RESUME_SETTINGS['path']} 继续对局：{pgn_game.headers.get('White', '?')} vs "
+          f"{pgn_game.headers.get('Black', '?')}，第 {len(board.move_stack)} 个半回合")
+    return board
 
 def get_additional_prompt():
     """使用 tkinter simpledialog 获取附加提示"""
     global additional_prompt
+    import tkinter as tk
+    from tkinter import simpledialog
     
     # 创建隐藏的 root 窗口
     root = tk.Tk()
@@ -1004,22 +1779,31 @@ def get_additional_prompt():
 
 def main():
     """主函数，负责游戏流程控制"""
-    global ENABLE_GUI, SQUARE_SIZE, white_player_type, black_player_type, timestamp, is_paused, board_flipped, additional_prompt
+    global ENABLE_GUI, SQUARE_SIZE, white_player_type, black_player_type, timestamp, is_paused, board_flipped, additional_prompt, MOVE_CACHE
     first_game = True
+    stockfish = None  # 从引擎池借出的引擎，重新开始时归还
+    log_files = None
+    seats = {}  # 双方的玩家，重新开始时关闭（归还本地 UCI 引擎）
+
+    if MOVE_CACHE_SETTINGS["enabled"] and MOVE_CACHE is None:
+        MOVE_CACHE = move_cache.MoveCache(
+            path=MOVE_CACHE_SETTINGS["path"],
+            key=MOVE_CACHE_SETTINGS["key"],
+            max_entries=MOVE_CACHE_SETTINGS["max_entries"],
+            eviction=MOVE_CACHE_SETTINGS["eviction"],
+            replay=MOVE_CACHE_SETTINGS["replay"],
+        )
 
     while True:
         try:
             if first_game:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                game_log.close(log_files)
                 log_files = {
-                    'white': f'white_{timestamp}.txt',
-                    'black': f'black_{timestamp}.txt'
-                }
-                player_types_dict = {
-                    '1': 'Human',
-                    '2': 'ChatGPT',
-                    '3': 'Stockfish',
+                    'white': game_log.log_path(f'white_{timestamp}', LOG_COMPRESSION),
+                    'black': game_log.log_path(f'black_{timestamp}', LOG_COMPRESSION)
                 }
+                player_types_dict = {str(i): name for i, name in enumerate(menu_player_types(), 1)}
                 while True:
                     gui_choice = input("是否启用GUI？(y/n): ").strip().lower()
                     if gui_choice in ['y', 'yes']:
@@ -1051,23 +1835,26 @@ def main():
                         black_choice = input("无效选择，请重新输入：").strip()
                     black_player_type = player_types_dict[black_choice]
 
-                stockfish = None
+                if stockfish is not None:
+                    get_engine_pool().release(stockfish)
+                    stockfish = None
                 if 'Stockfish' in (white_player_type, black_player_type):
-                    stockfish = Stockfish(
-                        path=STOCKFISH_PATH,
-                        parameters={"Hash": 32, "Threads": 2, "Minimum Thinking Time": 500}
-                    )
-                    stockfish.set_depth(20)
-                board = chess.Board()
-                game_over = False
+                    stockfish = get_engine_pool().acquire()
+                board = load_start_board()
+                game_over_message = check_game_over(board)
+                game_over = bool(game_over_message)
+                ROUND_TRIP_STATS.update(new_round_trip_stats())
+                STOCKFISH_CLOCKS.clear()
+                restart_analysis(board)
                 first_game = False
 
             else:
                 # 重启游戏时，生成新的时间戳
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                game_log.close(log_files)
                 log_files = {
-                    'white': f'white_{timestamp}.txt',
-                    'black': f'black_{timestamp}.txt'
+                    'white': game_log.log_path(f'white_{timestamp}', LOG_COMPRESSION),
+                    'black': game_log.log_path(f'black_{timestamp}', LOG_COMPRESSION)
                 }
                 if ENABLE_GUI:
                     initialize_gui()
@@ -1076,152 +1863,84 @@ def main():
                     # 命令行模式下重新选择玩家类型（可选）
                     pass
 
-                stockfish = None
+                if stockfish is not None:
+                    get_engine_pool().release(stockfish)
+                    stockfish = None
                 if 'Stockfish' in (white_player_type, black_player_type):
-                    stockfish = Stockfish(
-                        path=STOCKFISH_PATH,
-                        parameters={"Hash": 32, "Threads": 2, "Minimum Thinking Time": 300}
-                    )
-                    stockfish.set_depth(20)
+                    stockfish = get_engine_pool().acquire()
                 board = chess.Board()
                 game_over = False
+                ROUND_TRIP_STATS.update(new_round_trip_stats())
+                STOCKFISH_CLOCKS.clear()
+                restart_analysis(board)
                 is_paused = False  # 重置暂停状态
 
+            for player in seats.values():
+                player.close()
+            seats = create_players(
+                {'white': white_player_type, 'black': black_player_type}, stockfish, log_files=log_files, gui=ENABLE_GUI
+            )
             while not game_over:
                 player_color = 'white' if board.turn else 'black'
-                attempt = 1
-                max_attempts = 10
-                tried_moves = []
-                additional_prompt = None
-                current_player_type = white_player_type if board.turn else black_player_type
-                move_made = False
-
-                while not move_made:
-                    move_str, is_uci = prompt_output(
-                        board,
-                        player_color,
-                        attempt,
-                        tried_moves,
-                        current_player_type,
-                        stockfish,
-                        log_files,
-                        additional_prompt,
-                        ENABLE_GUI,
-                        max_attempts
-                    )
-                    if move_str:
-                        try:
-                            if is_uci:
-                                move = chess.Move.from_uci(move_str)
-                                if move in board.legal_moves:
-                                    board.push(move)
-                                    move_made = True
-                                else:
-                                    raise ValueError(f"非法走法：{move_str}")
-                            else:
-                                move = board.parse_san(move_str)
-                                board.push(move)
-                                move_made = True
-                            print(f"\n{player_color.capitalize()} 走: {move_str}\n")
-                        except ValueError as e:
-                            print(f"错误：{e}")
-                            tried_moves.append(move_str)
+                player = seats[player_color]
+                turn_start = time.perf_counter()
+                move = book_move(player, board)
+                source = "Book" if move is not None else player.name
+                if move is None and ENABLE_GUI:
+                    move = choose_move_gui(player, board, STOCKFISH_CLOCKS)
+                elif move is None:
+                    move = asyncio.run(player.choose_move(board, STOCKFISH_CLOCKS))
+                while move is None and isinstance(player, ChatGPTPlayer):
+                    print(f"{player_color.capitalize()} 已连续 {player.attempts} 次未能提供合法走法。")
+                    if ENABLE_GUI:
+                        additional_prompt = None
+                        # 在后台线程中弹出输入框，输入完成后发送事件唤醒界面
+                        done = run_in_background(get_additional_prompt)
+                        run_event_loop(board, until=done.is_set)
+                        player.additional_prompt = additional_prompt
+                        print(f"已发送附加提示给 {player_color.capitalize()}。继续尝试提供合法走法。")
+                        move = choose_move_gui(player, board, STOCKFISH_CLOCKS)
                     else:
-                        tried_moves.append("No valid move provided")
-
-                    if move_made:
-                        break
-
-                    attempt += 1
-                    if attempt > max_attempts:
-                        print(f"{player_color.capitalize()} 已连续 {max_attempts} 次未能提供合法走法。")
-                        if current_player_type == 'ChatGPT':
-                            if ENABLE_GUI:
-                                # 创建获取输入的线程
-                                
-                                additional_prompt = None
-                                input_thread = threading.Thread(target=get_additional_prompt, daemon=True)
-                                input_thread.start()
-                                
-                                # 等待输入的同时保持GUI响应
-                                while input_thread.is_alive():
-                                    for event in pygame.event.get():
-                                        if event.type == pygame.QUIT:
-                                            pygame.quit()
-                                            sys.exit()
-                                        elif event.type == pygame.MOUSEBUTTONDOWN:
-                                            x, y = event.pos
-                                            if restart_button.is_clicked((x, y)):
-                                                restart_game(board)
-                                            elif pause_button.is_clicked((x, y)):
-                                                is_paused = not is_paused
-                                                pause_button.update_text("Resume" if is_paused else "Pause")
-                                            elif stop_button.is_clicked((x, y)):
-                                                save_game(board, game_over_message='stopped')
-                                                pygame.quit()
-                                                sys.exit()
-                                            elif flip_button.is_clicked((x, y)):
-                                                board_flipped = not board_flipped
-                                                print("棋盘已翻转。")
-                                        elif event.type == pygame.MOUSEWHEEL:
-                                            handle_mouse_wheel(event)
-                                    
-                                    # 绘制棋盘
-                                    draw_board(board)                                    
-                                    pygame.display.flip()
-                                    CLOCK.tick(FPS)
-                                
-                                print(f"已发送附加提示给 {player_color.capitalize()}。继续尝试提供合法走法。")
-                            else:
-                                # 命令行模式下直接获取输入
-                                additional_prompt = input("请输入附加的提示信息以继续游戏：").strip()
-                                print(f"已发送附加提示给 {player_color.capitalize()}。继续尝试提供合法走法。")
-                        else:
-                            print(f"游戏终止。")
-                            game_over = True
-                            break
-
-                if not move_made:
+                        # 命令行模式下直接获取输入
+                        player.additional_prompt = input("请输入附加的提示信息以继续游戏：").strip()
+                        print(f"已发送附加提示给 {player_color.capitalize()}。继续尝试提供合法走法。")
+                        move = asyncio.run(player.choose_move(board, STOCKFISH_CLOCKS))
+                if move is None:
+                    print(f"游戏终止。")
+                    game_over = True
                     break
 
+                print(f"\n{player_color.capitalize()} 走: {board.san(move)}\n")
+                GAME_RECORD.push(board, move, time.perf_counter() - turn_start)
+                if ANALYSIS is not None:
+                    ANALYSIS.submit(board)
+                record_move_metrics(source, time.perf_counter() - turn_start, player.attempts)
+
                 game_over_message = check_game_over(board)
                 if game_over_message:
                     print(game_over_message)
                     game_over = True
 
                 if ENABLE_GUI:
-                    draw_board(board)
-                    pygame.display.flip()
+                    dispatch_pending_events(board)
+                    pygame.display.update(draw_board(board))
                     CLOCK.tick(FPS)
 
             if game_over:
                 print("\n游戏结束。")
                 # 游戏正常结束后，保存棋局
                 save_game(board, game_over_message=game_over_message or 'Game Over')
+                log_usage_totals(log_files, {'white': white_player_type, 'black': black_player_type})
+                game_log.close(log_files)
+                game_log.flush()
+                print(metrics.METRICS.summary_table())
+                if METRICS_PATH:
+                    metrics.METRICS.write_prometheus(METRICS_PATH)
+                if MOVE_CACHE is not None:
+                    print(MOVE_CACHE.summary())
                 if ENABLE_GUI:
-                    while True:
-                        for event in pygame.event.get():
-                            if event.type == pygame.QUIT:
-                                pygame.quit()
-                                sys.exit()
-                            elif event.type == pygame.MOUSEBUTTONDOWN:
-                                x, y = event.pos
-                                if restart_button.is_clicked((x, y)):
-                                    # 游戏结束后重启，生成新的时间戳
-                                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                                    pygame.quit()
-                                    raise RestartGameException()
-                                elif stop_button.is_clicked((x, y)):
-                                    pygame.quit()
-                                    sys.exit()
-                                elif flip_button.is_clicked((x, y)):
-                                    board_flipped = not board_flipped
-                                    print("棋盘已翻转。")
-                            elif event.type == pygame.MOUSEWHEEL:
-                                handle_mouse_wheel(event)
-                        draw_board(board, game_over_message=game_over_message)
-                        pygame.display.flip()
-                        CLOCK.tick(FPS)
+                    # 等待重新开始或退出（由 handle_common_event 处理）
+                    run_event_loop(board, game_over_message=game_over_message)
                 else:
                     input("按 Enter 键退出...")
                     break
@@ -0,0 +1,176 @@
+"""轻量的计时和计数：上下文管理器计时器、计数器，对局结束时输出汇总表，长时间运行时导出 Prometheus 文本格式。
+
+指标按 (名称, 标签) 区分，例如 move_latency_seconds{player="ChatGPT"}；计时和其他取值（例如每步的尝试次数）
+保存最近的样本用于计算 p50 / p95，同时精确累计次数和总和。所有操作都是线程安全的，可以在分析线程和日志线程中使用。
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 每个指标保留用于计算分位数的样本数量上限
+MAX_SAMPLES = 10000
+
+# 导出 Prometheus 指标时的名称前缀
+PROMETHEUS_PREFIX = "gptchess_"
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法计算分位数，sorted_values 须已排序"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Metrics:
+    """计数器和取值分布的集合"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}       # (名称, 标签) -> 累计值
+            self.distributions = {}  # (名称, 标签) -> [次数, 总和, 最近的样本]
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def incr(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            distribution = self.distributions.get(key)
+            if distribution is None:
+                distribution = self.distributions[key] = [0, 0.0, deque(maxlen=MAX_SAMPLES)]
+            distribution[0] += 1
+            distribution[1] += value
+            distribution[2].append(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """计时 with 语句块的耗时（秒），块内抛出异常时也会记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """可序列化的当前状态，用于从工作进程传回主进程"""
+        with self.lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                "distributions": [[name, list(labels), count, total, list(samples)]
+                                  for (name, labels), (count, total, samples) in self.distributions.items()],
+            }
+
+    def drain(self):
+        """返回当前状态并清零"""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        """合并另一个进程的 snapshot()"""
+        with self.lock:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, count, total, samples in snapshot["distributions"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                distribution = self.distributions.get(key)
+                if distribution is None:
+                    distribution = self.distributions[key] = [0, 0.0, deque(maxlen=MAX_SAMPLES)]
+                distribution[0] += count
+                distribution[1] += total
+                distribution[2].extend(samples)
+
+    def summary_table(self):
+        """格式化为文本表格：取值分布显示次数、平均、p50、p95 和最大值，计数器显示累计值"""
+        with self.lock:
+            distributions = sorted((key, count, total, sorted(samples))
+                                   for key, (count, total, samples) in self.distributions.items())
+            counters = sorted(self.counters.items())
+        if not distributions and not counters:
+            return "尚未记录任何指标。"
+        rows = [(format_key(key), str(count), format_value(key[0], total / count),
+                 format_value(key[0], percentile(samples, 0.5)), format_value(key[0], percentile(samples, 0.95)),
+                 format_value(key[0], samples[-1] if samples else None))
+                for key, count, total, samples in distributions]
+        rows += [(format_key(key), format_value(key[0], value), "", "", "", "") for key, value in counters]
+        header = ("Metric", "Count", "Mean", "p50", "p95", "Max")
+        widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+        lines = ["  ".join(cell.ljust(widths[0]) if i == 0 else cell.rjust(widths[i]) for i, cell in enumerate(row))
+                 for row in [header] + rows]
+        return "\n".join(lines)
+
+    def prometheus_text(self):
+        """导出为 Prometheus 文本格式：计数器为 counter，取值分布为带 0.5 / 0.95 分位数的 summary"""
+        with self.lock:
+            distributions = sorted((key, count, total, sorted(samples))
+                                   for key, (count, total, samples) in self.distributions.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{PROMETHEUS_PREFIX}{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{format_labels(labels)} {value}")
+        for (name, labels), count, total, samples in distributions:
+            metric = f"{PROMETHEUS_PREFIX}{name}"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for quantile in (0.5, 0.95):
+                lines.append(f"{metric}{format_labels(labels + (('quantile', str(quantile)),))} "
+                             f"{percentile(samples, quantile)}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """写入 Prometheus 文本文件（例如供 node_exporter 的 textfile collector 读取），先写临时文件再替换，读取方不会看到写了一半的文件"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+
+def format_key(key):
+    name, labels = key
+    return name + (format_labels(labels) if labels else "")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def format_value(name, value):
+    """秒显示为毫秒，字节显示为 KB，其余原样显示"""
+    if value is None:
+        return "-"
+    if name.endswith("_seconds"):
+        return f"{value * 1000:.1f} ms"
+    if name.endswith("_bytes"):
+        return f"{value / 1024:.1f} KB"
+    return f"{value:g}"
+
+
+# 进程内共用的指标
+METRICS = Metrics()
+timer = METRICS.timer
+incr = METRICS.incr
+observe = METRICS.observe
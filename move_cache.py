@@ -0,0 +1,124 @@
+"""LLM 走法的持久化缓存：相同的局面（或相同的提示）直接复用之前的回复，不再调用 send_openai_request。
+
+缓存保存在 SQLite 文件中，可被多个进程（例如锦标赛的工作进程）共用。
+键由模型、系统提示和局面组成，有两种方式：
+    "position"：局面的 FEN 加上完整的走法历史，只缓存合法的走法；
+    "prompt"：发送的完整消息（含聊天记录）的哈希，每个回复都会缓存，可以完整复现一盘棋的对话。
+回放模式下缓存未命中会抛出 MoveCacheMissError，用于不联网地重跑对局做回归测试。
+"""
+import hashlib
+import json
+import sqlite3
+import time
+
+# 淘汰策略对应的排序方式：排在前面的先被淘汰
+EVICTION_ORDER = {
+    "lru": "last_used",
+    "lfu": "hits, last_used",
+    "fifo": "created",
+}
+
+
+class MoveCacheMissError(Exception):
+    """回放模式下缓存未命中"""
+    pass
+
+
+class CachedResponse:
+    """缓存命中时代替 API 响应，用于日志输出"""
+
+    cached = True  # 不计入 token 用量
+
+    def __init__(self, reply):
+        self.reply = reply
+
+    def __str__(self):
+        return f"CachedResponse(reply={self.reply!r})"
+
+
+def cached_candidates(reply):
+    """把缓存的回复包装成与 request_candidates 相同形式的候选"""
+    yield reply, 0.0, CachedResponse(reply)
+
+
+class MoveCache:
+    """基于 SQLite 的走法缓存，带容量上限、淘汰策略和命中率统计"""
+
+    def __init__(self, path="move_cache.sqlite3", key="position", max_entries=100000, eviction="lru", replay=False):
+        if key not in ("position", "prompt"):
+            raise ValueError(f"未知的缓存键类型：{key}")
+        if eviction not in EVICTION_ORDER:
+            raise ValueError(f"未知的淘汰策略：{eviction}")
+        self.path = path
+        self.key = key
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS moves ("
+            "key TEXT PRIMARY KEY, model TEXT, reply TEXT, legal INTEGER, "
+            "created REAL, last_used REAL, hits INTEGER DEFAULT 0)"
+        )
+        self.connection.commit()
+
+    def make_key(self, settings, board, messages):
+        """根据模型、系统提示和局面（或完整消息）生成缓存键"""
+        if self.key == "position":
+            material = [settings["system_prompt"], board.fen(), " ".join(move.uci() for move in board.move_stack)]
+        else:
+            material = [json.dumps(messages, ensure_ascii=False, sort_keys=True)]
+        digest = hashlib.sha256("\0".join([self.key, settings["model"], *material]).encode('utf-8')).hexdigest()
+        return digest
+
+    def get(self, key):
+        """查询缓存的回复；回放模式下未命中时抛出 MoveCacheMissError"""
+        row = self.connection.execute("SELECT reply FROM moves WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            if self.replay:
+                raise MoveCacheMissError(f"回放模式下缓存未命中：{key}")
+            return None
+        self.hits += 1
+        self.connection.execute(
+            "UPDATE moves SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+        )
+        self.connection.commit()
+        return row[0]
+
+    def put(self, key, model, reply, legal):
+        """保存回复；按局面缓存时只保存合法的走法"""
+        if self.replay or (self.key == "position" and not legal):
+            return
+        now = time.time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO moves (key, model, reply, legal, created, last_used, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (key, model, reply, int(legal), now, now),
+        )
+        self._evict(key)
+        self.connection.commit()
+
+    def _evict(self, new_key):
+        """超过容量上限时按淘汰策略删除多余的条目；刚写入的 new_key 不参与淘汰，
+        否则 LFU 下新条目的命中次数为 0，缓存满后每个新条目都会立即淘汰自己"""
+        excess = self.connection.execute("SELECT COUNT(*) FROM moves").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                f"DELETE FROM moves WHERE key IN (SELECT key FROM moves WHERE key != ? "
+                f"ORDER BY {EVICTION_ORDER[self.eviction]} LIMIT ?)",
+                (new_key, excess),
+            )
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def summary(self):
+        return f"走法缓存：命中 {self.hits}/{self.hits + self.misses} 次（命中率 {self.hit_rate():.1%}）"
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,79 @@
+"""Polyglot 开局库：在询问玩家（LLM 请求或引擎搜索）之前先查询开局库，开局阶段的走法不必付出 API 调用或深度搜索的开销。
+
+.bin 文件通过 python-chess 的 chess.polyglot.open_reader 以内存映射方式打开，条目按 Zobrist 键排序，
+每次查询在映射的文件上二分查找，不把整个开局库读入内存；多个线程可以同时查询，多进程的每个工作进程各自打开。
+
+每方可以设置不同的使用方式（MODES）：
+    off     不使用开局库
+    always  库内有走法时直接走，不询问玩家
+    engine  只替引擎玩家（ENGINE_PLAYERS）直接走，LLM 和人类玩家照常思考
+    hint    不直接走子，把库内走法写入玩家的 book_hint，由 LLM 玩家附在提示中
+"""
+import random
+
+import chess
+import chess.polyglot
+
+MODES = ("off", "always", "engine", "hint")
+
+# engine 模式下由开局库代替搜索的玩家类型
+ENGINE_PLAYERS = ("Stockfish", "UCI", "AlphaBeta")
+
+# 选择库内走法的方式：按权重随机（对局更多样），或总是选权重最高的走法（结果可复现）
+SELECTIONS = ("weighted", "best")
+
+
+class OpeningBook:
+    """一个 Polyglot 开局库文件；只在前 max_plies 个半回合内查询（None 表示不限制）"""
+
+    def __init__(self, path, max_plies=20, selection="weighted", seed=None):
+        if selection not in SELECTIONS:
+            raise ValueError(f"未知的开局库选择方式：{selection}")
+        self.path = path
+        self.max_plies = max_plies
+        self.selection = selection
+        self.rng = random.Random(seed)
+        self.reader = chess.polyglot.open_reader(path)
+
+    def entries(self, board):
+        """当前局面的库内走法 [(chess.Move, 权重)]，按权重从高到低排列；超出 max_plies 或不在库中时为空列表"""
+        if self.max_plies is not None and board.ply() >= self.max_plies:
+            return []
+        entries = sorted(self.reader.find_all(board), key=lambda entry: entry.weight, reverse=True)
+        return [(entry.move, entry.weight) for entry in entries]
+
+    def choose(self, board):
+        """为当前局面选择一步库内走法，不在库中时返回 None"""
+        entries = self.entries(board)
+        if not entries:
+            return None
+        if self.selection == "best":
+            return entries[0][0]
+        return self.rng.choices([move for move, _ in entries], weights=[weight for _, weight in entries])[0]
+
+    def hint(self, board, limit=5):
+        """写入 LLM 提示的库内走法说明（SAN 和相对频率），不在库中时返回 None"""
+        entries = self.entries(board)[:limit]
+        total = sum(weight for _, weight in entries)
+        if not entries or not total:
+            return None
+        moves = ", ".join(f"{board.san(move)} ({weight * 100 / total:.0f}%)" for move, weight in entries)
+        return f"Moves played from this position in the opening book, by popularity: {moves}"
+
+    def close(self):
+        self.reader.close()
+
+
+def book_move(book, mode, player, board):
+    """按该方的 mode 在询问 player 之前查询开局库，返回应直接走的库内走法，否则返回 None；
+    hint 模式下只更新 player.book_hint（不在库中时清空）"""
+    if book is None or mode in (None, "off"):
+        return None
+    if mode not in MODES:
+        raise ValueError(f"未知的开局库模式：{mode}")
+    if mode == "hint":
+        player.book_hint = book.hint(board)
+        return None
+    if mode == "engine" and player.name not in ENGINE_PLAYERS:
+        return None
+    return book.choose(board)
@@ -0,0 +1,117 @@
+"""PGN 的导出和导入：对局记录带七项标准标签（Seven Tag Roster）、模型名称、每步用时和评估注释，
+可以从任意半回合继续对局；PgnWriter 把多盘对局依次追加到同一个 PGN 文件。
+"""
+import threading
+from datetime import datetime
+
+import chess
+import chess.engine
+import chess.pgn
+
+import analysis
+
+
+def build_game(board, white, black, result=None, termination=None, models=None, move_times=None,
+               evaluations=None, event="GPTChessmate", round_number="-", date=None):
+    """由 board 的走法历史生成 chess.pgn.Game。
+
+    models 为 {"white"/"black": 模型名}，写入 WhiteModel / BlackModel 标签；move_times 为每步用时（秒），
+    写成 [%emt] 注释；evaluations 为分析结果（半回合数 -> 评估），写成走子后局面的 [%eval] 注释。
+    """
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = event
+    game.headers["Site"] = "?"
+    game.headers["Date"] = (date or datetime.now()).strftime("%Y.%m.%d")
+    game.headers["Round"] = str(round_number)
+    game.headers["White"] = white
+    game.headers["Black"] = black
+    game.headers["Result"] = result or (board.result(claim_draw=True) if board.is_game_over(claim_draw=True) else "*")
+    for color in ("white", "black"):
+        if models and models.get(color):
+            game.headers[f"{color.capitalize()}Model"] = models[color]
+    if termination:
+        game.headers["Termination"] = termination
+    game.headers["PlyCount"] = str(len(board.move_stack))
+
+    node, ply = game, 0
+    while node.variations:
+        node = node.variations[0]
+        ply += 1
+        if move_times and ply <= len(move_times) and move_times[ply - 1] is not None:
+            node.set_emt(move_times[ply - 1])
+        evaluation = evaluations.get(ply) if evaluations else None
+        if evaluation:
+            if evaluation["mate"] is not None:
+                score = chess.engine.Mate(evaluation["mate"])
+            else:
+                score = chess.engine.Cp(evaluation["cp"])
+            node.set_eval(chess.engine.PovScore(score, chess.WHITE), evaluation["depth"] or None)
+    return game
+
+
+def write_pgn(path, game):
+    """把一盘对局写入单独的 PGN 文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        print(game, file=f, end="\n\n")
+
+
+class PgnWriter:
+    """线程安全的多盘 PGN 写入器：每盘对局追加到同一个文件并立即刷新，中断时已写入的对局不会丢失"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+        self.games = 0
+
+    def write(self, game):
+        """写入一盘对局；game 可以是 chess.pgn.Game 或已经导出的 PGN 文本"""
+        with self.lock:
+            self.file.write(str(game).strip() + "\n\n")
+            self.file.flush()
+            self.games += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_game(path, index=0, ply=None):
+    """读取 PGN 文件中的第 index 盘（从 0 开始），返回 (board, game)。
+
+    board 从该盘的起始局面走到第 ply 个半回合（None 表示走完全部走法），保留走法历史，可直接继续对局；
+    game 为 chess.pgn.Game，可以从中读取标签、每步用时（node.emt()）和评估（node.eval()）。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for _ in range(index):
+            if chess.pgn.skip_game(f) is False:
+                raise ValueError(f"{path} 中没有第 {index + 1} 盘对局。")
+        game = chess.pgn.read_game(f)
+    if game is None:
+        raise ValueError(f"{path} 中没有第 {index + 1} 盘对局。")
+    board = game.board()
+    moves = list(game.mainline_moves())
+    if ply is not None and not 0 <= ply <= len(moves):
+        raise ValueError(f"半回合数应在 0 到 {len(moves)} 之间：{ply}")
+    for move in moves[:ply]:
+        board.push(move)
+    return board, game
+
+
+def load_evaluations(game):
+    """从 PGN 的 [%eval] 注释还原分析结果（半回合数 -> 评估），格式与 analysis.AnalysisService.evaluations 相同"""
+    evaluations = {}
+    for ply, node in enumerate(game.mainline(), 1):
+        score = node.eval()
+        if score is None:
+            continue
+        white = score.white()
+        evaluations[ply] = {"ply": ply, "depth": node.eval_depth() or 0,
+                            "cp": white.score(mate_score=analysis.MATE_SCORE), "mate": white.mate(), "lines": []}
+    return evaluations
@@ -0,0 +1,191 @@
+"""走子玩家接口和注册表：每种玩家实现 async choose_move(position, clock)，直接返回 chess.Move。
+
+对局的驱动代码（界面、批量对局、异步对局、锦标赛）只通过 create_player 按名称创建玩家并调用 choose_move，
+不再按玩家类型分支，也不再在 SAN / UCI 字符串之间来回转换。这里实现不依赖界面和网络的玩家：
+随机走子（Random）、只看一步子力得失的贪心玩家（Greedy）、内置的 alpha-beta 引擎（AlphaBeta）和本地 UCI 引擎（UCI）；
+人类、ChatGPT 和 Stockfish 玩家在 gpt_chess_gui.py 中注册。
+"""
+import asyncio
+import random
+import threading
+
+import chess
+import chess.engine
+
+import alphabeta
+import engine_pool
+import metrics
+
+# 玩家类型名称 -> MovePlayer 子类，按注册顺序排列
+PLAYERS = {}
+
+# 贪心玩家使用的子力价值（厘兵）
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+MATE_VALUE = 100000
+
+
+def register_player(name):
+    """类装饰器：以 name 注册玩家类型"""
+    def decorator(cls):
+        cls.name = name
+        PLAYERS[name] = cls
+        return cls
+    return decorator
+
+
+def player_types(interactive=True):
+    """已注册的玩家类型；interactive 为 False 时不包括需要人类操作的玩家"""
+    return tuple(name for name, cls in PLAYERS.items() if interactive or not cls.interactive)
+
+
+def create_player(name, color, **options):
+    """按名称创建玩家；options 传给玩家的构造函数，玩家不用的选项被忽略"""
+    if name not in PLAYERS:
+        raise ValueError(f"未知的玩家类型：{name}")
+    return PLAYERS[name](color, **options)
+
+
+class MovePlayer:
+    """走子玩家接口：choose_move 返回当前局面的一步合法走法（chess.Move），无法给出合法走法时返回 None。
+
+    attempts 为上一步用了几次尝试（只有 LLM 玩家会多于一次），用于统计。
+    """
+    name = None
+    interactive = False  # 需要人类在界面或终端中操作
+    book_hint = None     # 开局库 hint 模式下库内走法的说明，只有向 LLM 发送提示的玩家使用
+
+    def __init__(self, color, **options):
+        self.color = color
+        self.attempts = 0
+
+    async def choose_move(self, position, clock=None):
+        """position 为当前棋盘（不会被修改），clock 为对局的棋钟 {颜色: 剩余秒数}，不使用棋钟的玩家忽略"""
+        raise NotImplementedError
+
+    def close(self):
+        """对局结束时释放玩家占用的资源（例如借出的引擎）"""
+
+
+@register_player("Random")
+class RandomPlayer(MovePlayer):
+    """随机选择一步合法走法，用作无需 API 和引擎的基准对手；指定 seed 时走法可以复现"""
+
+    def __init__(self, color, seed=None, **options):
+        super().__init__(color)
+        self.rng = random.Random(seed)
+
+    async def choose_move(self, position, clock=None):
+        self.attempts = 1
+        move = self.rng.choice(list(position.legal_moves))
+        print(f"Random ({self.color.capitalize()}) 走: {move.uci()}")
+        return move
+
+
+def material_gain(board, move):
+    """走法的即时子力得失（厘兵）：吃子和升变的收益，减去走到被对方攻击的格子上可能损失的子力；将杀返回 MATE_VALUE"""
+    if board.is_en_passant(move):
+        gain = PIECE_VALUES[chess.PAWN]
+    else:
+        captured = board.piece_type_at(move.to_square)
+        gain = PIECE_VALUES[captured] if captured else 0
+    if move.promotion:
+        gain += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+    moved = PIECE_VALUES[move.promotion or board.piece_type_at(move.from_square)]
+    board.push(move)
+    try:
+        if board.is_checkmate():
+            return MATE_VALUE
+        # 走子后轮到对方：对方能吃掉走到的棋子时，无保护按全部损失计，有保护按与对方最便宜攻击者的差价计
+        attackers = board.attackers(board.turn, move.to_square)
+        if attackers:
+            if board.is_attacked_by(not board.turn, move.to_square):
+                cheapest = min(PIECE_VALUES[board.piece_type_at(square)] or MATE_VALUE for square in attackers)
+                gain -= max(0, moved - cheapest)
+            else:
+                gain -= moved
+        return gain
+    finally:
+        board.pop()
+
+
+@register_player("Greedy")
+class MaterialGreedyPlayer(MovePlayer):
+    """只看一步的子力贪心玩家：优先将杀，其次选即时子力得失最大的走法，相同时随机选择"""
+
+    def __init__(self, color, seed=None, **options):
+        super().__init__(color)
+        self.rng = random.Random(seed)
+
+    async def choose_move(self, position, clock=None):
+        self.attempts = 1
+        board = position.copy(stack=False)
+        scored = [(material_gain(board, move), move) for move in board.legal_moves]
+        best = max(score for score, _ in scored)
+        move = self.rng.choice([move for score, move in scored if score == best])
+        print(f"Greedy ({self.color.capitalize()}) 走: {move.uci()}")
+        return move
+
+
+@register_player("AlphaBeta")
+class AlphaBetaPlayer(MovePlayer):
+    """内置的纯 Python alpha-beta 引擎（alphabeta.py），不需要外部引擎；search 为该方的搜索设置，使用其中的 nodes、depth 和 movetime，
+    没有设置 nodes 时每步搜索 alphabeta.DEFAULT_NODES 个节点。只限制节点数和深度时走法可以复现"""
+
+    def __init__(self, color, search=None, **options):
+        super().__init__(color)
+        search = search or {}
+        self.nodes = search.get("nodes") or alphabeta.DEFAULT_NODES
+        self.depth = search.get("depth") or alphabeta.MAX_DEPTH
+        self.movetime = search.get("movetime")
+        self.searcher = alphabeta.Searcher()
+
+    async def choose_move(self, position, clock=None):
+        self.attempts = 1
+        with metrics.timer("engine_search_seconds"):
+            result = await asyncio.to_thread(self.searcher.search, position, self.nodes, self.depth, self.movetime)
+        metrics.observe("alphabeta_nps", result["nps"])
+        if result["move"] is not None:
+            print(f"AlphaBeta ({self.color.capitalize()}) 走: {result['move'].uci()}")
+        return result["move"]
+
+
+# 本地 UCI 引擎的引擎池：可执行文件路径 -> EnginePool，引擎在多盘棋之间复用
+UCI_POOLS = {}
+_uci_pools_lock = threading.Lock()
+
+
+def uci_engine_pool(path):
+    """返回 path 对应的引擎池，首次使用时创建"""
+    with _uci_pools_lock:
+        if path not in UCI_POOLS:
+            UCI_POOLS[path] = engine_pool.EnginePool(lambda: engine_pool.UciEngine(path))
+        return UCI_POOLS[path]
+
+
+@register_player("UCI")
+class UciPlayer(MovePlayer):
+    """本地 UCI 引擎（例如 Lc0 或其他 Stockfish 版本）：engine_path 为可执行文件，limit 为每步的搜索限制（chess.engine.Limit）；
+    第一步时从引擎池借出引擎，对局结束时归还"""
+
+    def __init__(self, color, engine_path=None, limit=None, **options):
+        super().__init__(color)
+        if not engine_path:
+            raise ValueError("UCI 玩家需要设置引擎的路径。")
+        self.pool = uci_engine_pool(engine_path)
+        self.limit = limit or chess.engine.Limit(time=0.1)
+        self.engine = None
+
+    async def choose_move(self, position, clock=None):
+        self.attempts = 1
+        if self.engine is None:
+            self.engine = await asyncio.to_thread(self.pool.acquire)
+        with metrics.timer("engine_search_seconds"):
+            result = await asyncio.to_thread(self.engine.play, position.copy(), self.limit)
+        if result.move is not None:
+            print(f"UCI ({self.color.capitalize()}) 走: {result.move.uci()}")
+        return result.move
+
+    def close(self):
+        if self.engine is not None:
+            self.pool.release(self.engine)
+            self.engine = None
@@ -0,0 +1,356 @@
+"""对局评分：用多进程的 Stockfish 引擎重新分析保存的对局，输出每步的厘兵损失，并按玩家统计失误和准确度。
+
+输入为 save_game 保存的对局记录（.txt）或 PGN 文件（可包含多盘棋），也可以指定目录，目录下的 .txt 和 .pgn 都会被读取。
+每盘棋在一个工作进程中分析，每个工作进程拥有自己的引擎池；每盘分析完成后立即把该盘所有走法写入结果文件（CSV，
+或 Parquet 目录中的分片文件），中途中断后用同样的命令再次运行会跳过结果文件中已有的对局。
+
+用法示例：
+    python score_games.py games/ --output scores.csv --depth 14 --workers 16
+    python score_games.py archive.pgn --output scores.parquet --summary players.json
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.pgn
+
+import analysis
+import gpt_chess_gui as game
+
+# pyarrow 只在输出 Parquet 时由 load_pyarrow 导入，工作进程和 CSV 输出不必付出导入时间；
+# None 表示尚未尝试导入，False 表示没有安装
+pyarrow = None
+
+
+def load_pyarrow():
+    """导入 pyarrow 和 pyarrow.parquet，没有安装时返回 False"""
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow as module
+            import pyarrow.parquet
+        except ImportError:
+            module = False
+        pyarrow = module
+    return pyarrow
+
+DEFAULT_CONFIG = {
+    "inputs": [],
+    "output": "scores.csv",
+    "format": None,
+    "stockfish_path": None,
+    "depth": 14,
+    "movetime": None,
+    "workers": os.cpu_count() or 1,
+    "threads": 1,
+    "hash": 32,
+    "flush_every": 20,
+    "summary": None,
+}
+
+# 结果文件的列：评估为白方视角的厘兵数（限制在 ±analysis.MAX_EVAL），准确度为 0-100
+COLUMNS = ("game", "white", "black", "player", "ply", "color", "san", "uci",
+           "eval_before", "eval_after", "cpl", "judgement", "accuracy")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="用多进程 Stockfish 重新分析保存的对局并统计厘兵损失")
+    parser.add_argument("inputs", nargs="*", default=None, help="对局记录（.txt）、PGN 文件或目录，支持通配符")
+    parser.add_argument("--config", help="JSON 配置文件路径")
+    parser.add_argument("--output", help="结果文件：.csv，或 .parquet（目录，每批对局写入一个分片）")
+    parser.add_argument("--format", choices=("csv", "parquet"), help="结果格式，默认按输出文件的扩展名判断")
+    parser.add_argument("--stockfish-path", dest="stockfish_path", help="Stockfish 可执行文件路径")
+    parser.add_argument("--depth", type=int, help="分析每个局面的深度")
+    parser.add_argument("--movetime", type=int, help="分析每个局面的时间（毫秒），与 --depth 以先达到的为准")
+    parser.add_argument("--workers", type=int, help="工作进程数量（同时分析的对局数）")
+    parser.add_argument("--threads", type=int, help="每个引擎的 Threads 选项")
+    parser.add_argument("--hash", type=int, help="每个引擎的 Hash 选项（MB）")
+    parser.add_argument("--flush-every", dest="flush_every", type=int, help="Parquet 输出每多少盘写入一个分片")
+    parser.add_argument("--summary", help="将每位玩家的统计另存为 JSON")
+    return parser.parse_args(argv)
+
+
+def load_config(args):
+    """合并默认配置、配置文件和命令行参数"""
+    config = dict(DEFAULT_CONFIG)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"配置文件中有未知的选项：{', '.join(sorted(unknown))}")
+        config.update(file_config)
+    for key in DEFAULT_CONFIG:
+        value = getattr(args, key, None)
+        if value is not None:
+            config[key] = value
+
+    if not config["inputs"]:
+        raise ValueError("请指定要分析的对局文件或目录。")
+    if not config["depth"] and not config["movetime"]:
+        raise ValueError("需要设置 depth 或 movetime。")
+    if config["format"] is None:
+        config["format"] = "parquet" if config["output"].endswith(".parquet") else "csv"
+    if config["format"] == "parquet" and not load_pyarrow():
+        raise ValueError("输出 Parquet 需要安装 pyarrow。")
+    return config
+
+
+def find_input_files(inputs):
+    """展开输入路径中的通配符和目录，返回排序后的文件列表。
+
+    save_game 在对局记录（.txt）旁边写入同名的 .pgn，两者是同一盘棋：列表中有同名 .pgn 时跳过 .txt，避免重复计数。
+    """
+    files = []
+    for pattern in inputs:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.endswith(('.txt', '.pgn')):
+                        files.append(os.path.join(path, name))
+            else:
+                files.append(path)
+    pgn_files = {path for path in files if path.endswith('.pgn')}
+    return [path for path in files if not (path.endswith('.txt') and path[:-len('.txt')] + '.pgn' in pgn_files)]
+
+
+def read_saved_game(path):
+    """读取 save_game 保存的对局记录，返回 (白方, 黑方, 走法列表)；不是对局记录的文件（例如提示日志）返回 None"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    match = re.search(r'对局记录：\n(.*?)(?:\n\n|\Z)', text, re.S)
+    if not match:
+        return None
+    board = chess.Board()
+    for token in match.group(1).split():
+        if not re.fullmatch(r'\d+\.+', token):
+            board.push_san(token)
+    names = re.match(r'(.+?)_vs_(.+?)_', os.path.basename(path))
+    white, black = names.groups() if names else ("?", "?")
+    return white, black, board
+
+
+def iter_games(path):
+    """逐盘产出文件中的对局：(对局编号, 白方, 黑方, 起始 FEN, UCI 走法列表)"""
+    if path.endswith('.pgn'):
+        with open(path, 'r', encoding='utf-8') as f:
+            index = 0
+            while True:
+                pgn_game = chess.pgn.read_game(f)
+                if pgn_game is None:
+                    return
+                index += 1
+                moves = [move.uci() for move in pgn_game.mainline_moves()]
+                yield (f"{path}#{index}", pgn_game.headers.get("White", "?"), pgn_game.headers.get("Black", "?"),
+                       pgn_game.board().fen(), moves)
+    else:
+        saved = read_saved_game(path)
+        if saved is not None:
+            white, black, board = saved
+            yield path, white, black, chess.STARTING_FEN, [move.uci() for move in board.move_stack]
+
+
+def score_game(game_id, white, black, fen, moves, config):
+    """在工作进程中分析一盘棋的所有局面，返回每步一行的结果"""
+    board = chess.Board(fen)
+    for uci in moves:
+        board.push_uci(uci)
+    pool = game.get_engine_pool(config["stockfish_path"])
+    service = analysis.AnalysisService(
+        pool.acquire({"Threads": config["threads"], "Hash": config["hash"]}),
+        config["depth"], config["movetime"], multipv=1,
+    )
+    try:
+        service.analyse_game(board)
+        service.wait()
+        evaluations = dict(service.evaluations)
+    finally:
+        game.stop_analysis(service)
+
+    rows = []
+    for ply, color, san, loss in analysis.centipawn_losses(board, evaluations):
+        before, after = evaluations.get(ply), evaluations.get(ply + 1)
+        before_cp = analysis.clamp_eval(before["cp"]) if before else None
+        after_cp = analysis.clamp_eval(after["cp"]) if after else None
+        accuracy = None
+        if before and after:
+            sign = 1 if color == 'white' else -1
+            accuracy = round(analysis.move_accuracy(sign * before_cp, sign * after_cp), 1)
+        rows.append({
+            "game": game_id,
+            "white": white,
+            "black": black,
+            "player": white if color == 'white' else black,
+            "ply": ply + 1,
+            "color": color,
+            "san": san,
+            "uci": board.move_stack[ply].uci(),
+            "eval_before": before_cp,
+            "eval_after": after_cp,
+            "cpl": loss,
+            "judgement": analysis.judge_loss(loss),
+            "accuracy": accuracy,
+        })
+    return game_id, rows
+
+
+def read_results(config):
+    """读取结果文件中已有的行，用于断点续跑和最终统计"""
+    output = config["output"]
+    if config["format"] == "parquet":
+        parts = sorted(glob.glob(os.path.join(output, "part-*.parquet")))
+        return [row for part in parts for row in pyarrow.parquet.read_table(part).to_pylist()]
+    if not os.path.exists(output):
+        return []
+    with open(output, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+class CsvResultWriter:
+    """逐盘追加写入 CSV，每盘写完后立即刷新"""
+
+    def __init__(self, path):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        if new_file:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+    """把结果缓存起来，每 flush_every 盘写入 Parquet 目录中的一个新分片；中断时只丢失尚未写入分片的对局"""
+
+    def __init__(self, path, flush_every):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self.pending = []
+        self.games = 0
+        self.part = len(glob.glob(os.path.join(path, "part-*.parquet")))
+
+    def write(self, rows):
+        self.pending.extend(rows)
+        self.games += 1
+        if self.games >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.part += 1
+            table = pyarrow.Table.from_pylist(self.pending)
+            pyarrow.parquet.write_table(table, os.path.join(self.path, f"part-{self.part:05d}.parquet"))
+        self.pending = []
+        self.games = 0
+
+    def close(self):
+        self.flush()
+
+
+def summarize_players(rows):
+    """按玩家统计对局数、走法数、平均厘兵损失、各类失误次数和平均准确度"""
+    players = {}
+    for row in rows:
+        stats = players.setdefault(row["player"], {
+            "games": set(), "moves": 0, "cpl_total": 0.0, "accuracy_total": 0.0,
+            "inaccuracy": 0, "mistake": 0, "blunder": 0,
+        })
+        stats["games"].add(row["game"])
+        if row["cpl"] in (None, ""):
+            continue
+        stats["moves"] += 1
+        stats["cpl_total"] += float(row["cpl"])
+        stats["accuracy_total"] += float(row["accuracy"])
+        if row["judgement"]:
+            stats[row["judgement"]] += 1
+    return {
+        player: {
+            "games": len(stats["games"]),
+            "moves": stats["moves"],
+            "acpl": round(stats["cpl_total"] / stats["moves"], 1) if stats["moves"] else None,
+            "accuracy": round(stats["accuracy_total"] / stats["moves"], 1) if stats["moves"] else None,
+            "inaccuracies": stats["inaccuracy"],
+            "mistakes": stats["mistake"],
+            "blunders": stats["blunder"],
+        }
+        for player, stats in players.items()
+    }
+
+
+def format_summary(summary):
+    """将玩家统计格式化为文本表格，按平均厘兵损失从低到高排列"""
+    names = sorted(summary, key=lambda name: (summary[name]["acpl"] is None, summary[name]["acpl"] or 0))
+    width = max([len(name) for name in names] + [6]) + 2
+    lines = ["Player".ljust(width) + "   Games   Moves    ACPL  Accuracy  Inacc.  Mistakes  Blunders"]
+    for name in names:
+        stats = summary[name]
+        acpl = f"{stats['acpl']:.1f}" if stats["acpl"] is not None else "-"
+        accuracy = f"{stats['accuracy']:.1f}" if stats["accuracy"] is not None else "-"
+        lines.append(name.ljust(width) + f"{stats['games']:8d}{stats['moves']:8d}{acpl:>8}{accuracy:>10}"
+                     f"{stats['inaccuracies']:8d}{stats['mistakes']:10d}{stats['blunders']:10d}")
+    return "\n".join(lines)
+
+
+def score_games(config):
+    """把未评分的对局分配到进程池中分析，按完成顺序写入结果，返回本次评分的对局数"""
+    done = {row["game"] for row in read_results(config)}
+    files = find_input_files(config["inputs"])
+    jobs = (job for path in files for job in iter_games(path) if job[0] not in done)
+    if done:
+        print(f"结果文件中已有 {len(done)} 盘，跳过这些对局。")
+
+    writer = (ParquetResultWriter(config["output"], config["flush_every"]) if config["format"] == "parquet"
+              else CsvResultWriter(config["output"]))
+    scored = 0
+    try:
+        with ProcessPoolExecutor(max_workers=config["workers"]) as executor:
+            # 只保持有限数量的任务在途，大量对局也不会一次读入内存
+            pending = set()
+            for job in jobs:
+                pending.add(executor.submit(score_game, *job, config))
+                if len(pending) < config["workers"] * 2:
+                    continue
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                scored += write_finished(writer, finished, scored)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                scored += write_finished(writer, finished, scored)
+    finally:
+        writer.close()
+    return scored
+
+
+def write_finished(writer, finished, scored):
+    """写入已完成的对局，返回写入的盘数"""
+    for future in finished:
+        game_id, rows = future.result()
+        writer.write(rows)
+        scored += 1
+        print(f"[{scored}] {game_id}：{len(rows)} 步")
+    return len(finished)
+
+
+def main(argv=None):
+    config = load_config(parse_args(argv))
+    scored = score_games(config)
+    summary = summarize_players(read_results(config))
+    print(f"\n本次评分 {scored} 盘，结果已写入 {config['output']}\n")
+    print(format_summary(summary))
+    if config["summary"]:
+        with open(config["summary"], 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""启动时间基准：在新的解释器中用 python -X importtime 导入各入口模块，统计导入耗时和最慢的模块，
+并检查只在特定代码路径中使用的重量级依赖（openai、pygame、tkinter 等）没有在启动时被导入。
+
+批量对局和评分的工作进程会启动成千上万次，启动时间会累积成可观的总耗时，修改导入后运行此脚本对比。
+
+用法：
+    python startup_benchmark.py                 # 每个入口模块运行 5 次，输出中位数和最慢的模块
+    python startup_benchmark.py --runs 10 --top 15
+    python startup_benchmark.py --check         # 有延迟导入的模块在启动时被导入则返回非零退出码
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# 需要测量的入口模块
+ENTRY_MODULES = ["gpt_chess_gui", "batch_selfplay", "async_selfplay", "tournament", "score_games"]
+
+# 启动时不应导入的模块：只有启用 GUI、使用 ChatGPT 玩家、--async、输出 Parquet 等路径才会导入
+DEFERRED_MODULES = ["openai", "httpx", "pygame", "tkinter", "pandas", "stockfish", "tiktoken", "pyarrow"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="测量各入口模块的导入时间")
+    parser.add_argument("modules", nargs="*", default=ENTRY_MODULES, help="要测量的模块，默认为全部入口模块")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块运行的次数，取中位数")
+    parser.add_argument("--top", type=int, default=10, help="显示最慢的模块数量（按累计耗时）")
+    parser.add_argument("--check", action="store_true", help="检查延迟导入的模块，在启动时被导入则返回 1")
+    return parser.parse_args(argv)
+
+
+def import_times(module):
+    """在新的解释器中导入 module，返回 {模块名: (自身耗时, 累计耗时)}，单位为微秒"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败：\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        # 格式：import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def benchmark(module, runs):
+    """运行 runs 次，返回 (累计耗时中位数（秒）, 最后一次的各模块耗时)"""
+    totals, times = [], {}
+    for _ in range(runs):
+        times = import_times(module)
+        totals.append(times[module][1] / 1e6)
+    return statistics.median(totals), times
+
+
+def deferred_imports(times):
+    """启动时被导入的延迟模块"""
+    return [name for name in DEFERRED_MODULES if name in times]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    failed = False
+    for module in args.modules:
+        total, times = benchmark(module, args.runs)
+        print(f"\n{module}: {total * 1000:.1f} ms（{args.runs} 次的中位数）")
+        slowest = sorted(((cumulative, name) for name, (_, cumulative) in times.items() if name != module),
+                         reverse=True)[:args.top]
+        for cumulative, name in slowest:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        loaded = deferred_imports(times)
+        if loaded:
+            print(f"  启动时导入了应延迟导入的模块：{', '.join(loaded)}")
+            failed = True
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import random
+
+import chess
+import chess.polyglot
+import pytest
+
+import alphabeta
+
+
+def assert_keys_match(board, moves):
+    key = chess.polyglot.zobrist_hash(board)
+    for move in moves:
+        key = alphabeta.push_with_key(board, key, board.parse_san(move) if isinstance(move, str) else move)
+        assert key == chess.polyglot.zobrist_hash(board), board.fen()
+
+
+def test_push_with_key_castling_en_passant_and_promotion():
+    assert_keys_match(chess.Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"), ["O-O", "O-O-O", "Rfe1", "Kb8"])
+    assert_keys_match(chess.Board("4k3/8/8/8/3p4/8/4P3/4K3 w - - 0 1"), ["e4", "dxe3", "Kd1", "e2+", "Kc2", "e1=N"])
+    # 白方双步推进后没有可以吃过路兵的黑兵，键中不含过路兵格
+    assert_keys_match(chess.Board("4k3/8/8/8/8/8/P7/4K3 w - - 0 1"), ["a4", "Kd7"])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_push_with_key_matches_polyglot_in_random_games(seed):
+    rng = random.Random(seed)
+    board = chess.Board()
+    moves = []
+    probe = board.copy()
+    while len(moves) < 120 and not probe.is_game_over():
+        move = rng.choice(list(probe.legal_moves))
+        moves.append(move)
+        probe.push(move)
+    assert_keys_match(board, moves)
+
+
+def test_search_finds_mate_in_one():
+    board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    result = alphabeta.Searcher().search(board, nodes=5000, depth=3)
+    assert result["move"] == chess.Move.from_uci("a1a8")
+    assert result["score"] >= alphabeta.MATE_VALUE - alphabeta.MAX_PLY
+    assert board.move_stack == []  # 搜索不改动传入的局面
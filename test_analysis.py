@@ -0,0 +1,82 @@
+import threading
+import time
+
+import chess
+import chess.engine
+
+import analysis
+
+
+class FakeAnalysis:
+    """模拟 chess.engine.SimpleAnalysisResult：先产出 infos，然后阻塞到 stop() 或超时"""
+
+    def __init__(self, infos, timeout=5):
+        self.infos = infos
+        self.timeout = timeout
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __iter__(self):
+        yield from self.infos
+        self.stopped.wait(self.timeout)
+
+    def stop(self):
+        self.stopped.set()
+
+
+class FakeEngine:
+    def __init__(self, infos=(), before_analysis=None):
+        self.infos = list(infos)
+        self.before_analysis = before_analysis
+
+    def analysis(self, board, limit, multipv=1):
+        if self.before_analysis is not None:
+            self.before_analysis()
+        return FakeAnalysis(self.infos)
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def info(depth):
+    return {"depth": depth, "score": chess.engine.PovScore(chess.engine.Cp(depth), chess.WHITE),
+            "pv": [chess.Move.from_uci("e2e4")]}
+
+
+def test_updates_are_bounded_without_a_consumer():
+    service = analysis.AnalysisService(FakeEngine([info(d) for d in range(1, 1001)]), depth=20, multipv=1)
+    service.submit(chess.Board())
+    # 等分析线程产出全部 info 后再关闭
+    wait_until(lambda: service.latest is not None and service.latest["depth"] == 1000)
+    service.close()
+    updates = service.poll()
+    assert len(updates) == analysis.MAX_PENDING_UPDATES
+    assert updates[-1]["depth"] == 1000
+
+
+def test_close_stops_analysis_that_starts_during_close():
+    started, proceed = threading.Event(), threading.Event()
+
+    def before_analysis():
+        started.set()
+        proceed.wait(5)
+
+    service = analysis.AnalysisService(FakeEngine([info(1)], before_analysis), depth=20, multipv=1)
+    service.submit(chess.Board())
+    assert started.wait(5)
+    # close() 在分析线程设置 _current 之前读取它
+    closer = threading.Thread(target=service.close)
+    closer.start()
+    wait_until(lambda: service._closed)
+    proceed.set()
+    closer.join(2)
+    assert not closer.is_alive()
@@ -0,0 +1,31 @@
+import chess
+import numpy as np
+
+import alphabeta
+import batch_eval
+
+
+def evaluate(*fens):
+    return batch_eval.evaluate_batch(np.array([batch_eval.board_bitboards(chess.Board(fen)) for fen in fens]))
+
+
+def test_material_is_from_whites_point_of_view():
+    scores = evaluate(chess.STARTING_FEN, "4k3/8/8/8/8/8/8/3QK3 w - - 0 1", "3qk3/8/8/8/8/8/8/4K3 w - - 0 1")
+    assert scores[0].tolist() == [0, 0, 0]
+    assert scores[1, 0] == alphabeta.PIECE_VALUES[chess.QUEEN]
+    assert scores[2, 0] == -alphabeta.PIECE_VALUES[chess.QUEEN]
+    assert scores[1, 2] > 0 > scores[2, 2]
+
+
+def test_material_and_position_match_alphabeta():
+    board = chess.Board("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+    material, position, _ = evaluate(board.fen())[0]
+    assert material + position == alphabeta.evaluate(board)
+
+
+def test_hanging_queen_is_flagged_as_blunder():
+    # 白后走到 c8 象可以吃到的格子，黑方吃后
+    rows = batch_eval.evaluate_games([(chess.STARTING_FEN, ["e2e4", "d7d5", "d1g4", "c8g4"])])
+    assert rows["color"].tolist() == [0, 1, 0, 1]
+    assert rows["blunder"].tolist()[2]
+    assert not rows["blunder"].tolist()[0]
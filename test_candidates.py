@@ -0,0 +1,64 @@
+import threading
+from types import SimpleNamespace
+
+import gpt_chess_gui as game
+
+
+def fake_response(content, prompt_tokens=10, completion_tokens=5):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+def test_concurrent_workers_never_prompt(monkeypatch):
+    calls = []
+
+    def send(settings, messages, interactive=True, n=1):
+        calls.append(interactive)
+        return fake_response("###\ne4\n###")
+
+    monkeypatch.setattr(game, "send_openai_request", send)
+    settings = {"model": "gpt-4o", "num_candidates": 3, "candidate_mode": "concurrent"}
+    replies = list(game.request_candidates(settings, [], interactive=True))
+    assert len(replies) == 3
+    assert calls == [False, False, False]
+
+
+def test_unused_concurrent_responses_are_billed(monkeypatch):
+    release = threading.Event()
+    finished = threading.Event()
+    slow = fake_response("###\nd4\n###", prompt_tokens=100, completion_tokens=7)
+
+    first = threading.Lock()
+    started = threading.Barrier(2)
+
+    def send(settings, messages, interactive=True, n=1):
+        # 两个请求都已发出后，第一个先返回合法走法，第二个在走法选定之后才完成
+        started.wait(5)
+        if first.acquire(blocking=False):
+            return fake_response("###\ne4\n###")
+        release.wait(5)
+        return slow
+
+    monkeypatch.setattr(game, "send_openai_request", send)
+    settings = {"model": "gpt-4o", "num_candidates": 2, "candidate_mode": "concurrent"}
+    stats = game.new_round_trip_stats()
+    unused = []
+
+    def on_unused(response):
+        game.record_unused_usage(None, "white", "gpt-4o", [], response, stats)
+        unused.append(response)
+        finished.set()
+
+    candidates = game.request_candidates(settings, [], on_unused=on_unused)
+    reply, move_str, response, candidate_log = game.choose_legal_candidate(
+        game.chess.Board(), candidates, "White", messages=[], model="gpt-4o"
+    )
+    assert move_str == "e4" and len(candidate_log) == 1
+    release.set()
+    assert finished.wait(5)
+    assert unused == [slow]
+    assert stats["white"]["prompt_tokens"] == 100
+    assert stats["white"]["completion_tokens"] == 7
+    assert stats["white"]["cost"] > 0 and stats["white"]["cost_known"]
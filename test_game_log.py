@@ -0,0 +1,47 @@
+import threading
+
+import game_log
+
+
+def flush_within(writer, timeout=5):
+    """在后台线程中调用 flush()，返回它是否在 timeout 秒内结束"""
+    thread = threading.Thread(target=writer.flush, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_unwritable_path_does_not_stop_writer(tmp_path, capsys):
+    writer = game_log.LogWriter()
+    bad = str(tmp_path / "missing" / "white.jsonl")
+    good = str(tmp_path / "black.jsonl")
+    writer.write(bad, {"event": "move"})
+    writer.write(bad, {"event": "move"})
+    assert flush_within(writer)
+    assert capsys.readouterr().out.count("失败") == 1
+    writer.write(good, {"event": "move"})
+    writer.close_file(good)
+    assert flush_within(writer)
+    assert [record["event"] for record in game_log.read_log(good)] == ["move"]
+
+
+def test_zstd_without_zstandard_does_not_stop_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_log, "zstandard", None)
+    writer = game_log.LogWriter()
+    writer.write(str(tmp_path / "white.jsonl.zst"), {"event": "move"})
+    assert flush_within(writer)
+    writer.write(str(tmp_path / "white.jsonl"), {"event": "move"})
+    assert flush_within(writer)
+
+
+def test_prompt_log_restores_messages(tmp_path):
+    path = str(tmp_path / "white.jsonl.gz")
+    first = [{"role": "system", "content": "You are a chess player."}, {"role": "user", "content": "e4"}]
+    second = first + [{"role": "assistant", "content": "e5"}]
+    game_log.write_prompt(path, first)
+    game_log.write_prompt(path, second)
+    game_log.close({"white": path})
+    game_log.flush()
+    prompts = [record for record in game_log.read_log(path) if record["event"] == "prompt"]
+    assert [record["messages"] for record in prompts] == [first, second]
+    assert len(prompts[1]["new_messages"]) == 1
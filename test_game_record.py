@@ -0,0 +1,69 @@
+import chess
+
+import gpt_chess_gui as game
+
+
+def play(board, record, *sans):
+    for san in sans:
+        record.push(board, board.parse_san(san))
+
+
+def test_push_and_pop_keep_text_in_step():
+    board, record = chess.Board(), game.GameRecord()
+    play(board, record, "e4", "e5", "Nf3")
+    assert record.text == "1. e4 e5\n2. Nf3"
+    assert record.pop(board) == chess.Move.from_uci("g1f3")
+    assert record.text == "1. e4 e5"
+    assert record.san_moves == ["e4", "e5"]
+
+
+def test_sync_replays_moves_pushed_outside_the_record():
+    board, record = chess.Board(), game.GameRecord()
+    play(board, record, "e4")
+    board.push_san("c5")
+    board.push_san("Nf3")
+    assert record.sync(board).san_moves == ["e4", "c5", "Nf3"]
+    assert len(record) == 3
+
+
+def test_sync_rebuilds_from_earliest_difference():
+    # 两条历史的末尾一步相同，但第一步不同：必须从第一处不同开始重建
+    board, record = chess.Board(), game.GameRecord()
+    play(board, record, "e4", "e5", "Nf3")
+    for _ in range(3):
+        board.pop()
+    for san in ("d4", "e5", "Nf3", "Nc6"):
+        board.push_san(san)
+    record.sync(board)
+    assert record.san_moves == ["d4", "e5", "Nf3", "Nc6"]
+    assert record.text == "1. d4 e5\n2. Nf3 Nc6"
+
+
+def test_sync_with_new_board_starts_over():
+    board, record = chess.Board(), game.GameRecord()
+    play(board, record, "e4", "e5")
+    other = chess.Board()
+    other.push_san("d4")
+    assert record.sync(other).san_moves == ["d4"]
+
+
+def test_sync_notices_rewritten_history_of_same_length():
+    # 长度和最后一步都相同，只有第一步不同
+    board, record = chess.Board(), game.GameRecord()
+    play(board, record, "e4", "e5", "Nf3")
+    version = record.version
+    for _ in range(3):
+        board.pop()
+    for san in ("d4", "e5", "Nf3"):
+        board.push_san(san)
+    assert record.sync(board).text == "1. d4 e5\n2. Nf3"
+    assert record.version != version
+
+
+def test_version_changes_only_with_the_record():
+    board, record = chess.Board(), game.GameRecord()
+    play(board, record, "e4")
+    version = record.sync(board).version
+    assert record.sync(board).version == version
+    board.push_san("e5")
+    assert record.sync(board).version != version
@@ -0,0 +1,71 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+import move_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """让每次取时间都比上一次晚一秒，淘汰顺序不受计时精度影响"""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(move_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def filled_cache(tmp_path, eviction):
+    cache = move_cache.MoveCache(str(tmp_path / "cache.sqlite3"), max_entries=2, eviction=eviction)
+    cache.put("a", "gpt-4o", "###\ne4\n###", True)
+    cache.put("b", "gpt-4o", "###\nd4\n###", True)
+    return cache
+
+
+def keys(cache):
+    return sorted(row[0] for row in cache.connection.execute("SELECT key FROM moves"))
+
+
+def test_lru_evicts_least_recently_used(tmp_path, clock):
+    cache = filled_cache(tmp_path, "lru")
+    cache.get("a")
+    cache.put("c", "gpt-4o", "###\nc4\n###", True)
+    assert keys(cache) == ["a", "c"]
+
+
+def test_lfu_admits_new_entry_and_evicts_coldest_old_one(tmp_path, clock):
+    cache = filled_cache(tmp_path, "lfu")
+    cache.get("a")
+    cache.get("b")
+    cache.get("b")
+    cache.put("c", "gpt-4o", "###\nc4\n###", True)
+    # 新条目的命中次数为 0，但不会淘汰自己，被淘汰的是命中最少的旧条目 a
+    assert keys(cache) == ["b", "c"]
+    assert cache.get("c") == "###\nc4\n###"
+
+
+def test_fifo_evicts_oldest_entry(tmp_path, clock):
+    cache = filled_cache(tmp_path, "fifo")
+    cache.get("a")
+    cache.put("c", "gpt-4o", "###\nc4\n###", True)
+    assert keys(cache) == ["b", "c"]
+
+
+def test_position_key_skips_illegal_replies(tmp_path):
+    cache = move_cache.MoveCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("a", "gpt-4o", "###\nKe9\n###", False)
+    assert cache.get("a") is None
+    assert cache.hit_rate() == 0.0
+
+
+def test_replay_miss_raises(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = move_cache.MoveCache(path)
+    cache.put("a", "gpt-4o", "###\ne4\n###", True)
+    cache.close()
+    replay = move_cache.MoveCache(path, replay=True)
+    assert replay.get("a") == "###\ne4\n###"
+    with pytest.raises(move_cache.MoveCacheMissError):
+        replay.get("b")
+    # 回放模式不写入新的回复
+    replay.put("b", "gpt-4o", "###\nd4\n###", True)
+    assert keys(replay) == ["a"]
+    assert replay.hits == 1 and replay.misses == 1
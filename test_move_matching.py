@@ -0,0 +1,32 @@
+import chess
+
+import gpt_chess_gui as game
+
+
+def test_normalize_move_text():
+    assert game.normalize_move_text("Nxf3+") == "Nf3"
+    assert game.normalize_move_text("0-0-0") == "O-O-O"
+    assert game.normalize_move_text("e8=Q#") == "e8Q"
+    assert game.normalize_move_text("Pe4") == "e4"
+    assert game.normalize_move_text("nf3") == "Nf3"
+    assert game.normalize_move_text("bxc3") == "bc3"
+
+
+def test_match_legal_move_accepts_near_misses():
+    board = chess.Board()
+    assert game.match_legal_move(board, "Nf3+") == "Nf3"
+    assert game.match_legal_move(board, "e2-e4") == "e4"
+    board = chess.Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    assert game.match_legal_move(board, "0-0") == "O-O"
+    assert game.match_legal_move(board, "o-o-o") == "O-O-O"
+
+
+def test_match_legal_move_needs_a_unique_destination():
+    # d5 上的兵可以被 c4 和 e4 的兵吃掉，只给目标格时不能唯一确定
+    board = chess.Board("4k3/8/8/3p4/2P1P3/8/8/4K3 w - - 0 1")
+    assert game.match_legal_move(board, "xd5") is None
+    assert game.match_legal_move(board, "cxd5") == "cxd5"
+    board = chess.Board("4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1")
+    assert game.match_legal_move(board, "xd5") == "exd5"
+    # 声称吃子但目标格上没有棋子
+    assert game.match_legal_move(board, "xe5") is None
@@ -0,0 +1,74 @@
+import struct
+from collections import Counter
+from types import SimpleNamespace
+
+import chess
+import chess.polyglot
+import pytest
+
+import opening_book
+
+
+def write_book(path, lines):
+    """由 [(SAN 走法序列, 权重)] 生成 Polyglot .bin 文件（不含王车易位和升变）"""
+    entries = Counter()
+    for line, weight in lines:
+        board = chess.Board()
+        for san in line.split():
+            move = board.parse_san(san)
+            raw = move.to_square | move.from_square << 6
+            entries[chess.polyglot.zobrist_hash(board), raw] += weight
+            board.push(move)
+    with open(path, "wb") as f:
+        for (key, raw), weight in sorted(entries.items()):
+            f.write(struct.pack(">QHHI", key, raw, weight, 0))
+    return str(path)
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    return write_book(tmp_path / "book.bin", [("e4 e5 Nf3", 10), ("e4 c5", 6), ("d4 d5", 5)])
+
+
+def test_best_picks_highest_weight(book_path):
+    book = opening_book.OpeningBook(book_path, selection="best")
+    board = chess.Board()
+    assert book.entries(board) == [(chess.Move.from_uci("e2e4"), 16), (chess.Move.from_uci("d2d4"), 5)]
+    assert book.choose(board) == chess.Move.from_uci("e2e4")
+    board.push_san("e4")
+    assert book.choose(board) == chess.Move.from_uci("e7e5")
+    board.push_san("a6")
+    assert book.choose(board) is None
+    book.close()
+
+
+def test_weighted_follows_weights_and_seed(book_path):
+    book = opening_book.OpeningBook(book_path, seed=3)
+    picks = Counter(book.choose(chess.Board()).uci() for _ in range(2000))
+    assert set(picks) == {"e2e4", "d2d4"}
+    assert 0.7 < picks["e2e4"] / 2000 < 0.82  # 16 / 21 ≈ 0.76
+    first, second = (opening_book.OpeningBook(book_path, seed=5) for _ in range(2))
+    assert [first.choose(chess.Board()) for _ in range(10)] == [second.choose(chess.Board()) for _ in range(10)]
+
+
+def test_max_plies_and_hint(book_path):
+    board = chess.Board()
+    board.push_san("e4")
+    assert opening_book.OpeningBook(book_path, max_plies=1).choose(board) is None
+    hint = opening_book.OpeningBook(book_path).hint(chess.Board())
+    assert "e4 (76%)" in hint and "d4 (24%)" in hint
+
+
+def test_book_move_modes(book_path):
+    book = opening_book.OpeningBook(book_path, selection="best")
+    llm = SimpleNamespace(name="ChatGPT", book_hint=None)
+    engine = SimpleNamespace(name="AlphaBeta", book_hint=None)
+    board = chess.Board()
+    assert opening_book.book_move(book, "off", llm, board) is None
+    assert opening_book.book_move(book, "always", llm, board) == chess.Move.from_uci("e2e4")
+    assert opening_book.book_move(book, "engine", llm, board) is None
+    assert opening_book.book_move(book, "engine", engine, board) == chess.Move.from_uci("e2e4")
+    assert opening_book.book_move(book, "hint", llm, board) is None
+    assert llm.book_hint.startswith("Moves played from this position")
+    with pytest.raises(ValueError):
+        opening_book.book_move(book, "sometimes", llm, board)
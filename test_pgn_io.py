@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import chess
+import pytest
+
+import pgn_io
+
+
+def played(*sans):
+    board = chess.Board()
+    for san in sans:
+        board.push_san(san)
+    return board
+
+
+def test_round_trip_keeps_tags_times_and_evaluations(tmp_path):
+    board = played("e4", "e5", "Qh5", "Nc6", "Bc4", "Nf6", "Qxf7#")
+    evaluations = {1: {"cp": 30, "mate": None, "depth": 12}, 6: {"cp": None, "mate": 1, "depth": 8}}
+    game = pgn_io.build_game(board, "Alice", "Bob", termination="checkmate", models={"white": "gpt-4o"},
+                             move_times=[1.5, 2.0, None, 0.5, 3.0, 1.0, 0.25], evaluations=evaluations,
+                             date=datetime(2024, 1, 1))
+    path = str(tmp_path / "game.pgn")
+    pgn_io.write_pgn(path, game)
+
+    loaded_board, loaded = pgn_io.load_game(path)
+    assert loaded_board.move_stack == board.move_stack
+    expected = {"White": "Alice", "Black": "Bob", "Result": "1-0", "Date": "2024.01.01", "WhiteModel": "gpt-4o",
+                "Termination": "checkmate", "PlyCount": "7"}
+    assert {tag: loaded.headers.get(tag) for tag in expected} == expected
+    assert "BlackModel" not in loaded.headers
+    assert [node.emt() for node in loaded.mainline()] == [1.5, 2.0, None, 0.5, 3.0, 1.0, 0.25]
+    restored = pgn_io.load_evaluations(loaded)
+    assert sorted(restored) == [1, 6]
+    assert restored[1]["cp"] == 30 and restored[1]["depth"] == 12
+    assert restored[6]["mate"] == 1
+
+
+def test_writer_appends_games_and_load_picks_by_index(tmp_path):
+    path = str(tmp_path / "games.pgn")
+    with pgn_io.PgnWriter(path) as writer:
+        writer.write(pgn_io.build_game(played("e4"), "A", "B"))
+        writer.write(pgn_io.build_game(played("d4", "d5"), "C", "D"))
+    board, game = pgn_io.load_game(path, index=1, ply=1)
+    assert game.headers["White"] == "C"
+    assert board.move_stack == [chess.Move.from_uci("d2d4")]
+    with pytest.raises(ValueError):
+        pgn_io.load_game(path, index=2)
+    with pytest.raises(ValueError):
+        pgn_io.load_game(path, ply=5)
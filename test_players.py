@@ -0,0 +1,59 @@
+import asyncio
+import threading
+
+import chess
+
+import gpt_chess_gui as game
+import players
+
+
+def test_gui_chatgpt_seat_is_not_interactive():
+    seats = game.create_players({'white': 'ChatGPT', 'black': 'Human'}, gui=True)
+    assert not seats['white'].interactive
+    assert seats['black'].interactive
+
+
+def test_gui_chatgpt_seat_runs_in_background(monkeypatch):
+    calls = []
+
+    def run_in_background(target):
+        calls.append(threading.current_thread())
+        target()
+        done = threading.Event()
+        done.set()
+        return done
+
+    monkeypatch.setattr(game, "run_in_background", run_in_background)
+    monkeypatch.setattr(game, "run_event_loop", lambda board, until=None, **kwargs: None)
+    monkeypatch.setattr(game, "request_chatgpt_move", lambda *args, **kwargs: "e4")
+    monkeypatch.setattr(game, "log_round_trips", lambda *args, **kwargs: None)
+    player = game.create_players({'white': 'ChatGPT', 'black': 'Random'}, gui=True)['white']
+    move = game.choose_move_gui(player, chess.Board())
+    assert move == chess.Move.from_uci("e2e4")
+    assert len(calls) == 1
+
+
+def test_registry_filters_interactive_players():
+    assert 'Human' in players.player_types()
+    assert 'Human' not in players.player_types(interactive=False)
+    assert 'AlphaBeta' in players.player_types(interactive=False)
+
+
+def test_greedy_takes_hanging_queen():
+    board = chess.Board("4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1")
+    move = asyncio.run(players.create_player('Greedy', 'white', seed=1).choose_move(board))
+    assert move == chess.Move.from_uci("d1d5")
+
+
+def test_random_player_is_reproducible_with_seed():
+    board = chess.Board()
+    first = asyncio.run(players.create_player('Random', 'white', seed=7).choose_move(board))
+    second = asyncio.run(players.create_player('Random', 'white', seed=7).choose_move(board))
+    assert first == second
+
+
+def test_uci_offered_only_with_engine_path(monkeypatch):
+    monkeypatch.setattr(game, "UCI_ENGINE_PATH", None)
+    assert 'UCI' not in game.menu_player_types()
+    monkeypatch.setattr(game, "UCI_ENGINE_PATH", "/usr/local/bin/lc0")
+    assert game.menu_player_types()[-1] == 'UCI'
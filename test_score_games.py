@@ -0,0 +1,53 @@
+import chess
+
+import gpt_chess_gui as game
+import score_games
+
+
+def saved_game(directory, monkeypatch):
+    """用 save_game 在 directory 中保存一盘短对局（.txt 和同名的 .pgn）"""
+    monkeypatch.chdir(directory)
+    board = chess.Board()
+    record = game.GameRecord()
+    for san in ("e4", "e5", "Qh5", "Nc6", "Bc4", "Nf6", "Qxf7#"):
+        record.push(board, board.parse_san(san), 0.5)
+    game.save_game(board, "White wins by checkmate!", "Alice", "Bob", "20240101_120000", evaluations={},
+                   result="1-0", record=record)
+    return board
+
+
+def test_directory_with_pgn_sidecar_counts_game_once(tmp_path, monkeypatch):
+    saved_game(tmp_path, monkeypatch)
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == ['.pgn', '.txt']
+    files = score_games.find_input_files([str(tmp_path)])
+    assert [name[-4:] for name in files] == ['.pgn']
+    games = [job for path in files for job in score_games.iter_games(path)]
+    assert len(games) == 1
+    assert games[0][1:3] == ("Alice", "Bob")
+
+
+def test_glob_with_pgn_sidecar_counts_game_once(tmp_path, monkeypatch):
+    saved_game(tmp_path, monkeypatch)
+    assert len(score_games.find_input_files([str(tmp_path / "*")])) == 1
+
+
+def test_record_without_pgn_is_still_read(tmp_path, monkeypatch):
+    board = saved_game(tmp_path, monkeypatch)
+    for path in tmp_path.glob("*.pgn"):
+        path.unlink()
+    files = score_games.find_input_files([str(tmp_path)])
+    assert [name[-4:] for name in files] == ['.txt']
+    (_, _, _, fen, moves), = score_games.iter_games(files[0])
+    assert moves == [move.uci() for move in board.move_stack]
+
+
+def test_summarize_players_counts_judgements():
+    rows = [
+        {"game": "g1", "player": "Alice", "cpl": 20, "accuracy": 90.0, "judgement": ""},
+        {"game": "g1", "player": "Alice", "cpl": 400, "accuracy": 10.0, "judgement": "blunder"},
+        {"game": "g1", "player": "Bob", "cpl": None, "accuracy": None, "judgement": ""},
+    ]
+    summary = score_games.summarize_players(rows)
+    assert summary["Alice"] == {"games": 1, "moves": 2, "acpl": 210.0, "accuracy": 50.0,
+                                "inaccuracies": 0, "mistakes": 0, "blunders": 1}
+    assert summary["Bob"]["moves"] == 0 and summary["Bob"]["acpl"] is None
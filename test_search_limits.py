@@ -0,0 +1,36 @@
+import argparse
+
+import chess.engine
+import pytest
+
+import batch_selfplay
+import gpt_chess_gui as game
+
+
+def test_search_limit_combines_settings():
+    limit = game.make_search_limit({"depth": 12, "nodes": None, "movetime": 250})
+    assert limit == chess.engine.Limit(depth=12, time=0.25)
+
+
+def test_search_limit_uses_clock_for_both_sides():
+    limit = game.make_search_limit({"increment": 2}, clock=30.0)
+    assert limit.white_clock == limit.black_clock == 30.0
+    assert limit.white_inc == limit.black_inc == 2
+
+
+def test_search_limit_requires_a_limit():
+    with pytest.raises(ValueError):
+        game.make_search_limit({"depth": None, "nodes": None, "movetime": None})
+
+
+def test_parse_search_spec():
+    search = batch_selfplay.parse_search_spec("depth=12, movetime=100,ponder")
+    assert search == {"depth": 12, "nodes": None, "movetime": 100, "clock": None, "increment": None, "ponder": True}
+    search = batch_selfplay.parse_search_spec("clock=60,increment=0.5,ponder=no")
+    assert (search["clock"], search["increment"], search["ponder"]) == (60.0, 0.5, False)
+
+
+@pytest.mark.parametrize("spec", ["depth=deep", "speed=3", "depth"])
+def test_parse_search_spec_rejects_bad_items(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        batch_selfplay.parse_search_spec(spec)
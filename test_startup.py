@@ -0,0 +1,14 @@
+import subprocess
+import sys
+
+import pytest
+
+import startup_benchmark
+
+
+@pytest.mark.parametrize("module", startup_benchmark.ENTRY_MODULES)
+def test_entry_modules_defer_heavy_imports(module):
+    code = (f"import sys, {module}; "
+            f"print(','.join(name for name in {startup_benchmark.DEFERRED_MODULES!r} if name in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == ""
@@ -0,0 +1,55 @@
+import token_usage
+
+
+def turns(*moves):
+    """每步一问一答的聊天记录"""
+    history = []
+    for i, move in enumerate(moves, 1):
+        history.append({"role": "user", "content": f"Turn {i}: your move?"})
+        history.append({"role": "assistant", "content": f"I play\n###\n{move}\n###"})
+    return history
+
+
+def test_trim_keeps_last_messages():
+    history = turns("e4", "Nf3", "Bc4")
+    assert token_usage.trim_chat_history(history, max_messages=4) == history[2:]
+    assert token_usage.trim_chat_history(history, max_messages=None) == history
+
+
+def test_trim_drops_oldest_turns_over_budget():
+    history = turns("e4", "Nf3", "Bc4")
+    budget = token_usage.count_message_tokens(history[2:])
+    kept = token_usage.trim_chat_history(history, budget=budget)
+    assert kept == history[2:]
+    assert token_usage.trim_chat_history(history, budget=0) == []
+
+
+def test_trim_summarize_lists_dropped_moves():
+    history = turns("e4", "Nf3", "Bc4")
+    kept = token_usage.trim_chat_history(history, max_messages=2, mode="summarize")
+    assert kept[1:] == history[4:]
+    assert kept[0]["role"] == "user"
+    assert "e4, Nf3" in kept[0]["content"]
+
+
+def test_summarize_without_dropped_turns_adds_nothing():
+    history = turns("e4")
+    assert token_usage.trim_chat_history(history, mode="summarize") == history
+
+
+def test_estimate_cost():
+    assert token_usage.estimate_cost("no-such-model", 1000, 1000) is None
+    model = next(iter(token_usage.MODEL_PRICES))
+    price = token_usage.MODEL_PRICES[model]
+    assert token_usage.estimate_cost(model, 1_000_000, 0) == price[0]
+
+
+def test_summarize_stays_within_budget():
+    history = turns("e4", "Nf3", "Bc4", "O-O")
+    for budget in range(0, token_usage.count_message_tokens(history) + 1, 5):
+        kept = token_usage.trim_chat_history(history, budget=budget, mode="summarize")
+        assert token_usage.count_message_tokens(kept) <= budget
+        if kept and kept[0] not in history:
+            # 概括列出所有被裁掉的回合
+            dropped = (len(history) - len(kept) + 1) // 2
+            assert ", ".join(["e4", "Nf3", "Bc4", "O-O"][:dropped]) in kept[0]["content"]
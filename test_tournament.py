@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import tournament
+
+
+def test_round_robin_alternates_colors():
+    schedule = tournament.schedule_pairings(["A", "B", "C"], "round-robin", 2)
+    assert schedule == [("A", "B"), ("B", "A"), ("A", "C"), ("C", "A"), ("B", "C"), ("C", "B")]
+
+
+def test_gauntlet_pairs_first_player_with_everyone():
+    schedule = tournament.schedule_pairings(["A", "B", "C"], "gauntlet", 3)
+    assert schedule == [("A", "B"), ("B", "A"), ("A", "B"), ("A", "C"), ("C", "A"), ("A", "C")]
+
+
+def results(*games):
+    return [{"white_name": white, "black_name": black, "result": result} for white, black, result in games]
+
+
+def test_crosstable_skips_unfinished_games():
+    table = tournament.build_crosstable(["A", "B"], results(("A", "B", "1-0"), ("B", "A", "1/2-1/2"),
+                                                            ("A", "B", "*")))
+    assert table["A"]["B"] == [1.5, 2]
+    assert table["B"]["A"] == [0.5, 2]
+
+
+def test_elo_orders_players_and_is_centered():
+    table = tournament.build_crosstable(
+        ["A", "B", "C"],
+        results(("A", "B", "1-0"), ("B", "A", "0-1"), ("A", "C", "1-0"), ("C", "A", "1/2-1/2"),
+                ("B", "C", "1-0"), ("C", "B", "0-1")),
+    )
+    elo = tournament.estimate_elo(table)
+    assert elo["A"] > elo["B"] > elo["C"]
+    assert sum(elo.values()) == pytest.approx(0.0, abs=1e-6)
+
+
+def test_elo_of_even_match_is_equal():
+    table = tournament.build_crosstable(["A", "B"], results(("A", "B", "1-0"), ("B", "A", "1-0")))
+    elo = tournament.estimate_elo(table)
+    assert elo["A"] == pytest.approx(elo["B"])
+
+
+def test_failed_game_does_not_abort_tournament(tmp_path, monkeypatch):
+    def play(index, white, black, config):
+        if index == 2:
+            raise RuntimeError("engine crashed")
+        return {"game": index, "white_name": white["name"], "black_name": black["name"], "result": "1-0",
+                "termination": "checkmate"}
+
+    monkeypatch.setattr(tournament, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(tournament, "run_tournament_game", play)
+    config = {
+        "players": [{"name": "A", "type": "Random"}, {"name": "B", "type": "Greedy"}],
+        "format": "round-robin", "games_per_pair": 3, "workers": 2, "pgn": None, "metrics": None,
+        "output": str(tmp_path / "results.jsonl"), "crosstable": str(tmp_path / "crosstable.json"),
+    }
+    results, table, elo = tournament.run_tournament(config)
+    assert sorted(entry["game"] for entry in results) == [1, 2, 3]
+    failed, = [entry for entry in results if entry["game"] == 2]
+    assert failed["termination"] == "error" and "engine crashed" in failed["error"]
+    # 出错的对局不计分：A 执白两盘全胜
+    assert table["A"]["B"] == [2.0, 2]
+    assert len((tmp_path / "results.jsonl").read_text().splitlines()) == 3
+    assert (tmp_path / "crosstable.json").exists()
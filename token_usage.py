@@ -0,0 +1,147 @@
+"""提示词的 token 计数、聊天记录的 token 预算，以及每盘棋的 token / 费用 / 延迟统计。
+
+安装了 tiktoken 时按模型的编码计数，否则按字符数粗略估计（约 4 个字符一个 token）。
+API 响应带有 usage 时以 usage 为准，本地计数用于裁剪聊天记录和统计聊天记录所占的比例。
+"""
+import re
+from functools import lru_cache
+
+# tiktoken 在第一次计数时才导入（见 load_tiktoken），不需要计数的对局（Stockfish、随机玩家）不必付出导入时间；
+# None 表示尚未尝试导入，False 表示没有安装
+tiktoken = None
+
+# 每百万 token 的价格（美元）：(输入, 输出)；未列出的模型不计算费用
+MODEL_PRICES = {
+    "chatgpt-4o-latest": (5.00, 15.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "o1": (15.00, 60.00),
+    "o1-mini": (3.00, 12.00),
+}
+
+# 聊天格式中每条消息和每次回复的固定开销
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+_ENCODINGS = {}
+
+
+def load_tiktoken():
+    """导入 tiktoken，没有安装时返回 False"""
+    global tiktoken
+    if tiktoken is None:
+        try:
+            import tiktoken as module
+        except ImportError:
+            module = False
+        tiktoken = module
+    return tiktoken
+
+
+def get_encoding(model):
+    """返回模型对应的 tiktoken 编码，不可用时返回 None"""
+    if not load_tiktoken():
+        return None
+    if model not in _ENCODINGS:
+        try:
+            _ENCODINGS[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _ENCODINGS[model] = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _ENCODINGS[model] = None  # 编码文件无法下载时退回估计
+    return _ENCODINGS[model]
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text, model=None):
+    """计算一段文本的 token 数；聊天记录中的消息会被反复计数，因此按 (文本, 模型) 缓存"""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages, model=None):
+    """计算一组消息的 token 数（含每条消息的固定开销，不含回复开销）"""
+    return sum(TOKENS_PER_MESSAGE + count_tokens(message["content"], model) for message in messages)
+
+
+def summarize_turns(messages):
+    """把被裁掉的旧回合概括成一条消息，只保留当时给出的走法"""
+    moves = []
+    for message in messages:
+        if message["role"] == "assistant":
+            match = re.search(r'###\s*\n\s*([^\n#]+?)\s*\n\s*###', message["content"])
+            moves.append(match.group(1) if match else "?")
+    if not moves:
+        return None
+    return {
+        "role": "user",
+        "content": f"(Earlier turns omitted to save space. Your answers in those turns were: {', '.join(moves)}.)",
+    }
+
+
+def trim_chat_history(history, budget=None, max_messages=20, mode="drop", model=None):
+    """返回要发送的聊天记录：最多保留最近 max_messages 条，总 token 数不超过 budget。
+
+    以一问一答为单位从最旧的回合开始裁剪；mode 为 "summarize" 时，被裁掉的回合用一条消息概括，概括也计入 budget。
+    """
+    kept = list(history[-max_messages:]) if max_messages else list(history)
+    dropped = list(history[:len(history) - len(kept)])
+    while True:
+        # 概括消息本身也占预算，所以每裁掉一个回合都重新生成概括后再计数
+        summary = summarize_turns(dropped) if mode == "summarize" and dropped else None
+        result = [summary, *kept] if summary else kept
+        if budget is None or count_message_tokens(result, model) <= budget:
+            return result
+        if not kept:
+            return []  # 只剩概括也超出预算
+        dropped.extend(kept[:2])
+        kept = kept[2:]
+
+
+def response_usage(response, reply=None, messages=None, model=None):
+    """返回一次响应的 (输入 token, 输出 token)；响应没有 usage 时用本地计数估计"""
+    if getattr(response, "cached", False):
+        return 0, 0
+    usage = getattr(response, "usage", None)
+    if usage is not None and usage.prompt_tokens is not None:
+        return usage.prompt_tokens, usage.completion_tokens or 0
+    prompt_tokens = count_message_tokens(messages, model) + TOKENS_PER_REPLY if messages else 0
+    return prompt_tokens, count_tokens(reply, model)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """按 MODEL_PRICES 计算费用（美元），未知模型返回 None"""
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def format_usage_totals(player_color, stats):
+    """把一方整盘棋的用量统计格式化为一行文本"""
+    requests = stats["requests"] or 1
+    cost = f"${stats['cost']:.4f}" if stats["cost_known"] else "未知"
+    return (f"{player_color.capitalize()} 用量合计：请求 {stats['requests']} 次，"
+            f"输入 {stats['prompt_tokens']} tokens（其中聊天记录 {stats['history_tokens']}，"
+            f"占 {stats['history_tokens'] / max(stats['prompt_tokens'], 1):.0%}），"
+            f"输出 {stats['completion_tokens']} tokens，费用 {cost}，"
+            f"总延迟 {stats['latency']:.1f} s（平均 {stats['latency'] / requests:.2f} s/次）")
+
+
+def usage_totals(stats):
+    """提取每方的用量统计，写入结果文件；费用未知时为 None"""
+    return {
+        color: {
+            "requests": color_stats["requests"],
+            "prompt_tokens": color_stats["prompt_tokens"],
+            "completion_tokens": color_stats["completion_tokens"],
+            "history_tokens": color_stats["history_tokens"],
+            "latency": round(color_stats["latency"], 3),
+            "cost": round(color_stats["cost"], 6) if color_stats["cost_known"] else None,
+        }
+        for color, color_stats in stats.items()
+    }
@@ -0,0 +1,282 @@
+"""多进程锦标赛：把循环赛或挑战赛（gauntlet）的对局分配到进程池中并行运行，最后汇总交叉表和 Elo 估计。
+
+每个工作进程拥有独立的棋盘、聊天记录和 Stockfish 引擎池（首次需要时启动引擎，之后在该进程内复用，进程退出时关闭）。
+
+用法示例：
+    python tournament.py --player gpt4o=ChatGPT:gpt-4o --player sf=Stockfish --player rnd=Random \\
+        --format round-robin --games-per-pair 4 --workers 16 --output tournament.jsonl
+    python tournament.py --config tournament.json
+
+配置文件为 JSON，"players" 为 {"name", "type", "model", "search", "engine"} 的列表（"search" 为 Stockfish 或 AlphaBeta 的搜索限制，
+键名同 STOCKFISH_SETTINGS；"engine" 为 UCI 玩家的本地引擎路径），其余键名与命令行参数相同，命令行参数优先。
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import batch_selfplay
+import game_log
+import gpt_chess_gui as game
+import metrics
+import opening_book
+import pgn_io
+
+DEFAULT_CONFIG = {
+    "players": [],
+    "format": "round-robin",
+    "games_per_pair": 2,
+    "workers": os.cpu_count() or 1,
+    "stockfish_path": None,
+    "max_attempts": 10,
+    "max_plies": 300,
+    "output": "tournament_results.jsonl",
+    "crosstable": None,
+    "log_dir": None,
+    "log_compression": None,
+    "save_games": False,
+    "pgn": None,
+    "quiet": True,
+    "metrics": None,
+    "cache": None,
+    "cache_key": "position",
+    "cache_eviction": "lru",
+    "cache_max_entries": 100000,
+    "replay": False,
+    "book": None,
+    "book_plies": 20,
+    "book_selection": "weighted",
+    "book_mode": "always",
+}
+
+# 工作进程内的全局状态：每个进程一份默认模型设置（Stockfish 引擎由 gpt_chess_gui 的引擎池管理）
+_worker_default_models = {color: settings["model"] for color, settings in game.PLAYER_SETTINGS.items()}
+
+
+def parse_player(spec):
+    """解析 name=Type[:model] 形式的参赛者说明；Stockfish 和 AlphaBeta 冒号后为搜索限制，例如 sf=Stockfish:movetime=100；
+    UCI 冒号后为本地引擎的路径，例如 lc0=UCI:/usr/local/bin/lc0"""
+    name, _, rest = spec.partition('=')
+    player_type, _, option = rest.partition(':')
+    if not name or not player_type:
+        raise argparse.ArgumentTypeError(f"参赛者格式应为 name=Type[:model]：{spec}")
+    if player_type in ('Stockfish', 'AlphaBeta'):
+        search = batch_selfplay.parse_search_spec(option) if option else None
+        return {"name": name, "type": player_type, "model": None, "search": search}
+    if player_type == 'UCI':
+        return {"name": name, "type": player_type, "model": None, "engine": option or None}
+    return {"name": name, "type": player_type, "model": option or None}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="多进程并行运行锦标赛")
+    parser.add_argument("--config", help="JSON 配置文件路径")
+    parser.add_argument("--player", dest="players", type=parse_player, action="append",
+                        help="参赛者，格式为 name=Type[:model]，可重复指定")
+    parser.add_argument("--format", choices=("round-robin", "gauntlet"),
+                        help="赛制：循环赛，或第一位参赛者与其余每位对战的挑战赛")
+    parser.add_argument("--games-per-pair", dest="games_per_pair", type=int, help="每对参赛者的对局数（轮流执白）")
+    parser.add_argument("--workers", type=int, help="工作进程数量")
+    parser.add_argument("--stockfish-path", dest="stockfish_path", help="Stockfish 可执行文件路径")
+    parser.add_argument("--max-attempts", dest="max_attempts", type=int, help="每步允许的最大尝试次数，超过判负")
+    parser.add_argument("--max-plies", dest="max_plies", type=int, help="每盘棋的最大半回合数，超过记为未完成")
+    parser.add_argument("--output", help="结果文件（JSONL，每盘一行）")
+    parser.add_argument("--crosstable", help="将交叉表和 Elo 估计另存为 JSON")
+    parser.add_argument("--log-dir", dest="log_dir", help="保存 ChatGPT 提示日志（JSONL）的目录")
+    parser.add_argument("--log-compression", dest="log_compression", choices=("gzip", "zstd"), help="提示日志的压缩方式")
+    parser.add_argument("--save-games", dest="save_games", action="store_const", const=True,
+                        help="每盘棋结束后同时用 save_game 保存对局记录")
+    parser.add_argument("--pgn", help="把所有对局依次追加到这个 PGN 文件")
+    parser.add_argument("--metrics", help="每盘棋结束后把所有工作进程汇总的指标以 Prometheus 文本格式写入该文件")
+    parser.add_argument("--verbose", dest="quiet", action="store_const", const=False,
+                        help="输出工作进程中每步的详细信息")
+    parser.add_argument("--cache", help="LLM 走法缓存文件（SQLite），所有工作进程共用")
+    parser.add_argument("--cache-key", dest="cache_key", choices=("position", "prompt"),
+                        help="缓存键：按局面和走法历史，或按发送的完整消息")
+    parser.add_argument("--cache-eviction", dest="cache_eviction", choices=("lru", "lfu", "fifo"), help="缓存淘汰策略")
+    parser.add_argument("--cache-max-entries", dest="cache_max_entries", type=int, help="缓存条目数量上限")
+    parser.add_argument("--replay", action="store_const", const=True,
+                        help="确定性回放：只使用缓存，未命中时报错，不访问网络")
+    parser.add_argument("--book", help="Polyglot 开局库（.bin），在询问参赛者之前查询")
+    parser.add_argument("--book-plies", dest="book_plies", type=int, help="只在前多少个半回合查询开局库")
+    parser.add_argument("--book-selection", dest="book_selection", choices=opening_book.SELECTIONS,
+                        help="库内走法的选择方式：按权重随机，或总是选权重最高的走法")
+    parser.add_argument("--book-mode", dest="book_mode", choices=opening_book.MODES,
+                        help="双方使用开局库的方式，同 batch_selfplay.py 的 --white-book")
+    return parser.parse_args(argv)
+
+
+def load_config(args):
+    """合并默认配置、配置文件和命令行参数"""
+    config = dict(DEFAULT_CONFIG)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"配置文件中有未知的选项：{', '.join(sorted(unknown))}")
+        config.update(file_config)
+    for key in DEFAULT_CONFIG:
+        value = getattr(args, key, None)
+        if value is not None:
+            config[key] = value
+
+    names = [player["name"] for player in config["players"]]
+    if len(names) < 2:
+        raise ValueError("至少需要两位参赛者。")
+    if len(set(names)) != len(names):
+        raise ValueError("参赛者名称不能重复。")
+    for player in config["players"]:
+        if player["type"] not in batch_selfplay.PLAYER_TYPES:
+            raise ValueError(f"未知的玩家类型：{player['type']}")
+    return config
+
+
+def schedule_pairings(players, tournament_format, games_per_pair):
+    """生成 (白方, 黑方) 的对局列表，同一对参赛者轮流执白"""
+    if tournament_format == "gauntlet":
+        pairs = [(players[0], opponent) for opponent in players[1:]]
+    else:
+        pairs = [(a, b) for i, a in enumerate(players) for b in players[i + 1:]]
+    schedule = []
+    for a, b in pairs:
+        for n in range(games_per_pair):
+            schedule.append((a, b) if n % 2 == 0 else (b, a))
+    return schedule
+
+
+def run_tournament_game(index, white, black, config):
+    """在工作进程中运行一盘对局"""
+    batch_selfplay.setup_move_cache(config)
+    batch_selfplay.setup_opening_book(dict(config, white_book=config["book_mode"], black_book=config["book_mode"]))
+    entry = batch_selfplay.run_configured_game(
+        index,
+        (white["type"], white.get("model"), white.get("search"), white.get("engine")),
+        (black["type"], black.get("model"), black.get("search"), black.get("engine")),
+        config,
+        _worker_default_models,
+        {'white': white["name"], 'black': black["name"]},
+    )
+    entry["white_name"] = white["name"]
+    entry["black_name"] = black["name"]
+    # 本进程自上一盘以来的指标随结果传回主进程汇总
+    game_log.flush()
+    entry["metrics"] = metrics.METRICS.drain()
+    return entry
+
+
+def build_crosstable(names, results):
+    """根据对局结果统计每对参赛者之间的得分和对局数"""
+    table = {a: {b: [0.0, 0] for b in names if b != a} for a in names}
+    for entry in results:
+        if entry["result"] not in ("1-0", "0-1", "1/2-1/2"):
+            continue  # 未完成的对局不计分
+        white_score = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}[entry["result"]]
+        white, black = entry["white_name"], entry["black_name"]
+        table[white][black][0] += white_score
+        table[white][black][1] += 1
+        table[black][white][0] += 1.0 - white_score
+        table[black][white][1] += 1
+    return table
+
+
+def estimate_elo(table, iterations=1000):
+    """用 Bradley-Terry 模型的 MM 迭代估计 Elo，平局按半胜计；每人附加一盘与平均水平的虚拟和棋，避免全胜或全负时发散"""
+    names = list(table)
+    strength = {name: 1.0 for name in names}
+    for _ in range(iterations):
+        updated = {}
+        for name in names:
+            wins = 0.5 + sum(score for score, _ in table[name].values())
+            denominator = 1.0 / (strength[name] + 1.0)
+            for opponent, (_, games) in table[name].items():
+                if games:
+                    denominator += games / (strength[name] + strength[opponent])
+            updated[name] = wins / denominator
+        # 以几何平均为基准归一化
+        mean_log = sum(math.log(value) for value in updated.values()) / len(updated)
+        strength = {name: value / math.exp(mean_log) for name, value in updated.items()}
+    return {name: 400 * math.log10(value) for name, value in strength.items()}
+
+
+def format_crosstable(table, elo):
+    """将交叉表格式化为文本，按 Elo 从高到低排列"""
+    names = sorted(table, key=lambda name: -elo[name])
+    width = max(len(name) for name in names) + 2
+    lines = ["".ljust(width) + "".join(name[:8].rjust(10) for name in names) + "     Score     Elo"]
+    for name in names:
+        cells = []
+        total_score = total_games = 0
+        for opponent in names:
+            if opponent == name:
+                cells.append("-".rjust(10))
+                continue
+            score, games = table[name][opponent]
+            total_score += score
+            total_games += games
+            cells.append(f"{score:g}/{games}".rjust(10))
+        lines.append(name.ljust(width) + "".join(cells) + f"{total_score:g}/{total_games}".rjust(10) + f"{elo[name]:8.0f}")
+    return "\n".join(lines)
+
+
+def error_entry(index, white, black, error):
+    """一盘因异常（引擎崩溃、API 出错等）没有下完的对局：结果为 "*"，不计入交叉表和 Elo"""
+    return {
+        "game": index,
+        "white": white["type"],
+        "black": black["type"],
+        "white_name": white["name"],
+        "black_name": black["name"],
+        "result": "*",
+        "termination": "error",
+        "error": f"{type(error).__name__}: {error}",
+        "finished_at": datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def run_tournament(config):
+    """把所有对局提交到进程池，按完成顺序写入结果，最后返回 (结果列表, 交叉表, Elo)；
+    单盘对局出错时记录为 error，其余对局照常进行"""
+    players = config["players"]
+    schedule = schedule_pairings(players, config["format"], config["games_per_pair"])
+    results = []
+    pgn_writer = pgn_io.PgnWriter(config["pgn"]) if config["pgn"] else None
+    with open(config["output"], 'a', encoding='utf-8') as out, pgn_writer or contextlib.nullcontext(), \
+            ProcessPoolExecutor(max_workers=config["workers"]) as executor:
+        futures = {
+            executor.submit(run_tournament_game, index + 1, white, black, config): (index + 1, white, black)
+            for index, (white, black) in enumerate(schedule)
+        }
+        for future in as_completed(futures):
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = error_entry(*futures[future], e)
+                print(f"第 {entry['game']} 盘出错：{entry['error']}")
+            batch_selfplay.write_result(out, entry, pgn_writer, config["metrics"])
+            results.append(entry)
+            print(f"[{len(results)}/{len(schedule)}] {entry['white_name']} vs {entry['black_name']} "
+                  f"{entry['result']}（{entry['termination']}）")
+
+    table = build_crosstable([player["name"] for player in players], results)
+    elo = estimate_elo(table)
+    if config["crosstable"]:
+        with open(config["crosstable"], 'w', encoding='utf-8') as f:
+            json.dump({"crosstable": table, "elo": elo}, f, ensure_ascii=False, indent=2)
+    return results, table, elo
+
+
+def main(argv=None):
+    config = load_config(parse_args(argv))
+    results, table, elo = run_tournament(config)
+    print(f"\n共完成 {len(results)} 盘，结果已写入 {config['output']}\n")
+    print(format_crosstable(table, elo))
+    print()
+    print(metrics.METRICS.summary_table())
+
+
+if __name__ == "__main__":
+    main()